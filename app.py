@@ -2,8 +2,9 @@ import streamlit as st
 from utils.file_handler import save_uploaded_files
 from components.initialization import initialize_app_state, check_api_configuration
 from components.processor import initialize_processor, process_resumes
-from components.results import display_results
+from components.results import display_results, load_resumes
 from components.filter import filter_resumes_with_nlp
+from components.diagnostics import display_diagnostics
 import os
 
 # Initialize app state
@@ -364,8 +365,8 @@ with col1:
 st.markdown('</div>', unsafe_allow_html=True)
 
 # Clear filtered results if query is cleared
-if not query and 'filtered_matches' in st.session_state:
-    del st.session_state.filtered_matches
+if not query and 'filtered_ids' in st.session_state:
+    del st.session_state.filtered_ids
 
 # Process Files Logic
 if uploaded_files:
@@ -419,7 +420,10 @@ if filter_button and query:
         
         # Check if we need to process uploaded files
         if uploaded_files and 'pending_files' in st.session_state and st.session_state.pending_files:
-            file_paths.extend(save_uploaded_files(uploaded_files))
+            rejected_files = []
+            file_paths.extend(save_uploaded_files(uploaded_files, rejected=rejected_files))
+            for file_name, reason in rejected_files:
+                st.warning(f"Skipped {file_name}: file {reason}")
             files_to_process = True
         
         # Check if we need to process sample files
@@ -454,11 +458,11 @@ if filter_button and query:
                     st.session_state.processed_files.extend([file.name for file in uploaded_files])
         
         # Now apply filters if we have processed resumes
-        if 'matches' in st.session_state and st.session_state.matches:
+        if st.session_state.get('match_ids'):
             with st.spinner("Filtering resumes..."):
                 processor = st.session_state.gemini_processor
-                filtered_results = filter_resumes_with_nlp(query, processor, st.session_state.matches)
-                st.session_state.filtered_matches = filtered_results
+                filtered_results = filter_resumes_with_nlp(query, processor, load_resumes(st.session_state.match_ids))
+                st.session_state.filtered_ids = [resume['task_id'] for resume in filtered_results]
                 
                 if filtered_results:
                     st.success(f"Found {len(filtered_results)} matching resumes")
@@ -470,7 +474,7 @@ if filter_button and query:
         st.error(f"Error filtering resumes: {e}")
 
 # Results section with export button
-if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
+if st.session_state.get('filtered_ids'):
     # Results container
     st.markdown('<div class="results-container">', unsafe_allow_html=True)
     
@@ -482,13 +486,7 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
     # Data table in its own container
     st.markdown('<div class="data-table-container">', unsafe_allow_html=True)
     
-    # Temporarily swap the matches with filtered matches for display
-    original_matches = st.session_state.matches
-    st.session_state.matches = st.session_state.filtered_matches
-    display_results()
-    
-    # Restore original matches
-    st.session_state.matches = original_matches
+    display_results(st.session_state.filtered_ids)
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -501,7 +499,7 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
     
     # Export functionality
     if export_button:
-        data_to_export = st.session_state.filtered_matches if 'filtered_matches' in st.session_state else []
+        data_to_export = load_resumes(st.session_state.get('filtered_ids', []))
         
         if data_to_export:
             try:
@@ -526,11 +524,14 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
         else:
             st.warning("No resume data available to export. Please upload and filter resumes first.")
 
-elif query and filter_button and not st.session_state.get('filtered_matches', []):
+elif query and filter_button and not st.session_state.get('filtered_ids', []):
     # We tried filtering but didn't find any matches
     st.markdown('<div class="results-container">', unsafe_allow_html=True)
     st.warning(f"No resumes found matching '{query}'")
     st.markdown('</div>', unsafe_allow_html=True)
 
+# Per-stage timings for diagnosing slow batches
+display_diagnostics(st.session_state.get('gemini_processor'))
+
 # Close main container
 st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
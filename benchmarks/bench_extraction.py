@@ -0,0 +1,366 @@
+"""
+Text extraction benchmark for the Resume Parser engines.
+
+Runs every extraction engine over the bundled corpora:
+
+- samples:   data/samples/*.pdf
+- uploads:   data/uploads/*.docx
+- large:     a synthetic 60-page PDF and a synthetic DOCX with long tables
+- scanned:   a synthetic image-only PDF (exercises OCR routing)
+
+Each engine runs in its own subprocess so that peak RSS is attributable to it.
+The report lists per-file latency percentiles, throughput, peak RSS and extracted
+character counts, and is compared against a stored baseline so that a library
+upgrade that slows extraction down or loses text fails the run.
+
+Usage:
+    python benchmarks/bench_extraction.py
+    python benchmarks/bench_extraction.py --engines pymupdf docx-xml --rounds 10
+    python benchmarks/bench_extraction.py --save-baseline
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import resource
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "extraction.json")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+def _engine_pymupdf(path):
+    from utils.pdf_extractor import extract_with_pymupdf
+    return extract_with_pymupdf(path, None)
+
+def _engine_pdfplumber(path):
+    from utils.pdf_extractor import extract_with_pdfplumber
+    return extract_with_pdfplumber(path, None)
+
+def _engine_pypdf2(path):
+    from utils.pdf_extractor import extract_with_pypdf2
+    return extract_with_pypdf2(path, None)
+
+def _engine_pdf_auto(path):
+    from utils.pdf_extractor import MAX_TEXT_CHARS, extract_pdf_text
+    return extract_pdf_text(path, MAX_TEXT_CHARS)
+
+def _engine_ocr(path):
+    from pathlib import Path
+    from utils import ocr
+    # Cache inside the temporary corpus directory, cleared so OCR is never served from it
+    ocr.OCR_CACHE_DIR = Path(path).parent / "ocr_cache"
+    shutil.rmtree(ocr.OCR_CACHE_DIR, ignore_errors=True)
+    return ocr.ocr_pdf(path, None)
+
+def _engine_python_docx(path):
+    from utils.docx_extractor import extract_with_python_docx
+    return extract_with_python_docx(path)
+
+def _engine_docx_xml(path):
+    from utils.docx_extractor import extract_docx_text
+    return extract_docx_text(path)
+
+# name -> (extract function, file extension it handles, modules it needs)
+ENGINES = {
+    "pymupdf": (_engine_pymupdf, ".pdf", ["fitz"]),
+    "pdfplumber": (_engine_pdfplumber, ".pdf", ["pdfplumber"]),
+    "pypdf2": (_engine_pypdf2, ".pdf", ["PyPDF2"]),
+    "pdf-auto": (_engine_pdf_auto, ".pdf", ["fitz"]),
+    "ocr": (_engine_ocr, ".pdf", ["fitz", "pytesseract", "PIL"]),
+    "python-docx": (_engine_python_docx, ".docx", ["docx"]),
+    "docx-xml": (_engine_docx_xml, ".docx", []),
+}
+
+# OCR is far slower than everything else, so it only runs on the scanned corpus
+ENGINE_CORPORA = {"ocr": ["scanned"]}
+
+def _module_available(name):
+    import importlib.util
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+def engine_available(name):
+    """Check whether an engine's libraries (and binaries) are installed"""
+    _, _, modules = ENGINES[name]
+    if not all(_module_available(module) for module in modules):
+        return False
+    if name == "ocr":
+        from utils.ocr import is_ocr_available
+        return is_ocr_available()
+    return True
+
+# ---------------------------------------------------------------------------
+# Synthetic corpus
+# ---------------------------------------------------------------------------
+
+SAMPLE_PARAGRAPH = (
+    "Senior software engineer with experience in Python, Java, Kubernetes and "
+    "distributed systems. Led a team of six engineers building data pipelines. "
+)
+
+def make_large_pdf(path, pages=60):
+    """Text PDF long enough to exercise page-parallel extraction and early stopping"""
+    import fitz  # PyMuPDF
+    with fitz.open() as pdf:
+        for page_number in range(pages):
+            page = pdf.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 560, 806),
+                                f"Page {page_number + 1}. " + SAMPLE_PARAGRAPH * 14, fontsize=9)
+        pdf.save(path)
+
+def make_scanned_pdf(path, pages=3, dpi=150):
+    """Image-only PDF: text is rendered to a bitmap and only the bitmap is kept"""
+    import fitz  # PyMuPDF
+    with fitz.open() as source, fitz.open() as scan:
+        for page_number in range(pages):
+            page = source.new_page()
+            page.insert_textbox(fitz.Rect(36, 36, 560, 806),
+                                f"Page {page_number + 1}. " + SAMPLE_PARAGRAPH * 8, fontsize=11)
+            pixmap = page.get_pixmap(dpi=dpi)
+            scan_page = scan.new_page(width=page.rect.width, height=page.rect.height)
+            scan_page.insert_image(scan_page.rect, pixmap=pixmap)
+        scan.save(path)
+
+def make_large_docx(path, rows=400):
+    """Minimal DOCX with body paragraphs and a long table, written without python-docx"""
+    w = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = [f"<w:p><w:r><w:t>{SAMPLE_PARAGRAPH}</w:t></w:r></w:p>" for _ in range(50)]
+    table_rows = "".join(
+        f"<w:tr><w:tc><w:p><w:r><w:t>Skill {i}</w:t></w:r></w:p></w:tc>"
+        f"<w:tc><w:p><w:r><w:t>{SAMPLE_PARAGRAPH}</w:t></w:r></w:p></w:tc></w:tr>"
+        for i in range(rows)
+    )
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{w}"><w:body>{"".join(body)}<w:tbl>{table_rows}</w:tbl>'
+                f'</w:body></w:document>')
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", content_types)
+        archive.writestr("_rels/.rels", rels)
+        archive.writestr("word/document.xml", document)
+
+def build_corpora(work_dir):
+    """Collect the bundled files and generate the synthetic ones"""
+    corpora = {
+        "samples": sorted(glob.glob(os.path.join(REPO_ROOT, "data", "samples", "*.pdf"))),
+        "uploads": sorted(glob.glob(os.path.join(REPO_ROOT, "data", "uploads", "*.docx"))),
+        "large": [],
+        "scanned": [],
+    }
+
+    large_docx = os.path.join(work_dir, "large.docx")
+    make_large_docx(large_docx)
+    corpora["large"].append(large_docx)
+
+    if _module_available("fitz"):
+        large_pdf = os.path.join(work_dir, "large.pdf")
+        scanned_pdf = os.path.join(work_dir, "scanned.pdf")
+        make_large_pdf(large_pdf)
+        make_scanned_pdf(scanned_pdf)
+        corpora["large"].append(large_pdf)
+        corpora["scanned"].append(scanned_pdf)
+    else:
+        print("PyMuPDF not installed: synthetic PDFs skipped")
+
+    return corpora
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def _peak_rss_mb():
+    """
+    Peak resident set size of this process and its children, in MB
+
+    VmHWM is read from /proc where available: unlike ru_maxrss it is reset on exec,
+    so the worker does not inherit the parent's high-water mark.
+    """
+    own = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    own = int(line.split()[1]) / 1024
+                    break
+    except OSError:
+        pass
+
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    if own is None:
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return max(own, children)
+
+def run_worker(engine_name, files, rounds):
+    """Measure one engine over a list of files (runs inside a subprocess)"""
+    extract, _, _ = ENGINES[engine_name]
+
+    # Warm-up: first call pays for library import and pool start-up
+    extract(files[0])
+    rss_after_import = _peak_rss_mb()
+
+    latencies = []
+    chars = {}
+    total_bytes = 0
+    start_time = time.perf_counter()
+    for _ in range(rounds):
+        for path in files:
+            file_start = time.perf_counter()
+            text = extract(path)
+            latencies.append(time.perf_counter() - file_start)
+            chars[os.path.basename(path)] = len(text or "")
+            total_bytes += os.path.getsize(path)
+    elapsed = time.perf_counter() - start_time
+
+    return {
+        "files": len(files),
+        "rounds": rounds,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "files_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mb_per_s": round(total_bytes / elapsed / (1024 * 1024), 2) if elapsed else 0.0,
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "rss_after_import_mb": round(rss_after_import, 1),
+        "chars": sum(chars.values()),
+        "chars_by_file": chars,
+    }
+
+def measure(engine_name, files, rounds):
+    """Run one engine over one corpus in a fresh interpreter"""
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", engine_name,
+         "--rounds", str(rounds), "--files", *files],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip()[-2000:])
+    # Engines print progress; the JSON report is the last line
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return human-readable regressions: slower p95, lower throughput or lost text"""
+    regressions = []
+    for key, result in report.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p95 {result['p95_ms']:.1f} ms vs baseline {previous['p95_ms']:.1f} ms")
+        if result["files_per_s"] < previous["files_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: {result['files_per_s']:.1f} files/s vs baseline {previous['files_per_s']:.1f}")
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: peak RSS {result['peak_rss_mb']:.0f} MB vs baseline {previous['peak_rss_mb']:.0f} MB")
+        # Extracted text should never shrink noticeably after an upgrade
+        if result["chars"] < previous["chars"] * 0.99:
+            regressions.append(f"{key}: extracted {result['chars']} chars vs baseline {previous['chars']}")
+    return regressions
+
+def print_report(report):
+    header = f"{'engine/corpus':<24}{'files':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'files/s':>10}{'RSS MB':>9}{'chars':>10}"
+    print(header)
+    print("-" * len(header))
+    for key, result in report.items():
+        print(f"{key:<24}{result['files']:>6}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['files_per_s']:>10.1f}{result['peak_rss_mb']:>9.0f}{result['chars']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text extraction engines")
+    parser.add_argument("--engines", nargs="*", default=list(ENGINES), help="Engines to run")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over each corpus")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed slowdown vs baseline (0.3 = 30%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--json", help="Also write the full report to this file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.files, args.rounds)))
+        return 0
+
+    work_dir = tempfile.mkdtemp(prefix="bench_extraction_")
+    try:
+        corpora = build_corpora(work_dir)
+        report = {}
+        for engine_name in args.engines:
+            if not engine_available(engine_name):
+                print(f"Skipping {engine_name}: not installed")
+                continue
+            _, extension, _ = ENGINES[engine_name]
+            for corpus_name, files in corpora.items():
+                if corpus_name not in ENGINE_CORPORA.get(engine_name, corpora):
+                    continue
+                files = [path for path in files if path.endswith(extension)]
+                if not files:
+                    continue
+                try:
+                    report[f"{engine_name}/{corpus_name}"] = measure(engine_name, files, args.rounds)
+                except RuntimeError as e:
+                    print(f"{engine_name}/{corpus_name} failed: {e}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+End-to-end pipeline benchmark for the Resume Parser processing queue.
+
+Drives GeminiProcessor and its ProcessingQueue the same way process_resumes does
+(one batch, files spread over sessions), but with the simulated LLM backend from
+utils.simulated_backend, so no API quota is used. Latency, 429 (optionally with a
+Retry-After), 503 and malformed-response rates are configurable. With --http the simulator is served by
+utils.local_llm_server and reached through LocalHTTPBackend, which adds the HTTP
+round trip to every call. Responses are streamed unless --no-stream is given.
+With --max-concurrent the simulator refuses calls beyond that many in flight,
+which the processor's adaptive concurrency limit has to discover; the report
+shows where the limit ended up. With --large-latency-mean a second simulator, slower but never malformed, serves
+the large model tier, so resumes the fast tier gets wrong are escalated to it.
+With --interactive N, N single resumes are submitted in the interactive lane
+while the bulk batch runs, and their end-to-end latency is reported separately.
+With --cancel-after S the batch is cancelled S seconds in, as when its user
+leaves the page; the report counts the tasks that never reached the API.
+
+For each worker count the report lists end-to-end throughput, time spent waiting
+in the queue, time to the first streamed field, end-to-end latency percentiles and
+retry counts, which is what the
+rate-limit and worker settings are sized from.
+
+Usage:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --files 200 --workers 1 4 8 16 --latency-mean 2.0
+    python benchmarks/bench_pipeline.py --rate-limit-rate 0.2 --rate-limit-delay 0.5 --filters
+    python benchmarks/bench_pipeline.py --http
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import statistics
+import concurrent.futures
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils.gemini_processor import DEFAULT_MIN_CALL_GAP, GeminiProcessor, RateLimiter
+from utils.llm_backend import LocalHTTPBackend
+from utils.model_router import TIER_FAST, TIER_LARGE, ModelRouter
+from utils.scheduler import PRIORITY_INTERACTIVE
+from utils.local_llm_server import start_server
+from utils.simulated_backend import LATENCY_DISTRIBUTIONS, SimulatedGemini
+
+RESUME_TEMPLATE = """Candidate {index}
+candidate{index}@example.com | +1 555 {index:04d}
+Senior software engineer with {years} years of experience in Python, SQL and Docker.
+Built data pipelines and REST services for a team of {team} engineers.
+Education: B.Tech in Computer Science, State University ({year})
+"""
+
+BENCH_FILTERS = {
+    "skills": ["Python", "Docker"],
+    "min_experience": 3,
+    "education_level": "Any",
+    "location": "",
+}
+
+def make_corpus(work_dir, count):
+    """Write distinct plain-text resumes so that no two share a content-addressed task ID"""
+    paths = []
+    for index in range(count):
+        path = os.path.join(work_dir, f"candidate_{index:04d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(RESUME_TEMPLATE.format(index=index, years=index % 15, team=index % 9 + 2,
+                                           year=2000 + index % 24))
+        paths.append(path)
+    return paths
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a list (0.0 when empty)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def run_pipeline(files, workers, args):
+    """Push every file through a fresh processor with the given worker count"""
+    simulator = SimulatedGemini(
+        latency=args.latency,
+        latency_mean=args.latency_mean,
+        latency_sigma=args.latency_sigma,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed,
+        retry_after=args.retry_after,
+        server_error_rate=args.server_error_rate,
+        max_concurrent=args.max_concurrent,
+    )
+
+    server = None
+    backend = simulator
+    if args.http:
+        server = start_server(simulator, port=0)
+        backend = LocalHTTPBackend(f"http://127.0.0.1:{server.server_port}")
+
+    router = None
+    if args.large_latency_mean is not None:
+        large = SimulatedGemini(latency=args.latency, latency_mean=args.large_latency_mean,
+                                latency_sigma=args.latency_sigma, rate_limit_rate=args.rate_limit_rate,
+                                malformed_rate=0.0, seed=args.seed, retry_after=args.retry_after,
+                                server_error_rate=args.server_error_rate)
+        router = ModelRouter({TIER_FAST: backend, TIER_LARGE: large})
+
+    processor = GeminiProcessor("simulated", workers=workers, backend=backend, streaming=not args.no_stream,
+                                router=router)
+    processor.rate_limiter = RateLimiter(initial_delay=args.rate_limit_delay,
+                                         max_delay=args.max_delay,
+                                         backoff_factor=args.backoff_factor)
+
+    batch_id = f"bench-{workers}"
+    user_filters = BENCH_FILTERS if args.filters else None
+    start_time = time.perf_counter()
+    
+    if args.cancel_after is not None:
+        timer = threading.Timer(args.cancel_after, processor.cancel_batch, [batch_id])
+        timer.daemon = True
+        timer.start()
+
+    task_ids = []
+    for index, path in enumerate(files[:args.files]):
+        session_id = f"session-{index % args.sessions}"
+        task_ids.append(processor.queue_document_for_analysis(path, user_filters, batch_id=batch_id,
+                                                              session_id=session_id))
+    
+    # Single interactive uploads arriving while the bulk batch is being worked through
+    probe_ids = []
+    for path in files[args.files:]:
+        time.sleep(args.probe_interval)
+        probe_ids.append(processor.queue_document_for_analysis(path, user_filters, batch_id=batch_id,
+                                                               session_id="interactive",
+                                                               priority=PRIORITY_INTERACTIVE))
+    task_ids += probe_ids
+
+    futures = [processor.queue.get_future(task_id) for task_id in task_ids]
+    concurrent.futures.wait([future for future in futures if future is not None])
+    elapsed = time.perf_counter() - start_time
+    if server is not None:
+        server.shutdown()
+
+    queue_waits = []
+    first_fields = []
+    previews = []
+    end_to_end = []
+    interactive = []
+    unparsed = 0
+    errors = 0
+    cancelled = 0
+    for task_id in task_ids:
+        entry = processor.get_queued_result(task_id, batch_id)
+        if entry["status"] == "cancelled":
+            cancelled += 1
+            continue
+        if "started_at" in entry:
+            queue_waits.append(entry["started_at"] - entry["queued_at"])
+        if "first_field_at" in entry:
+            first_fields.append(entry["first_field_at"] - entry["queued_at"])
+        if "preview_at" in entry:
+            previews.append(entry["preview_at"] - entry["queued_at"])
+        if "finished_at" in entry:
+            (interactive if task_id in probe_ids else end_to_end).append(entry["finished_at"] - entry["queued_at"])
+        data = entry.get("data") or {}
+        if entry["status"] == "failed" or data.get("error"):
+            errors += 1
+        elif data.get("name") == "Unknown":
+            # _parse_response fell back to its empty record
+            unparsed += 1
+
+    return {
+        "workers": workers,
+        "files": len(task_ids),
+        "seconds": round(elapsed, 2),
+        "files_per_s": round(len(task_ids) / elapsed, 2) if elapsed else 0.0,
+        "queue_wait_p50_s": round(_percentile(queue_waits, 50), 3),
+        "queue_wait_p95_s": round(_percentile(queue_waits, 95), 3),
+        "first_field_p50_s": round(_percentile(first_fields, 50), 3),
+        "preview_p50_s": round(_percentile(previews, 50), 3),
+        "e2e_p50_s": round(_percentile(end_to_end, 50), 3),
+        "e2e_p95_s": round(_percentile(end_to_end, 95), 3),
+        "e2e_mean_s": round(statistics.mean(end_to_end), 3) if end_to_end else 0.0,
+        "interactive_p50_s": round(_percentile(interactive, 50), 3),
+        "interactive_p95_s": round(_percentile(interactive, 95), 3),
+        "api_calls": processor.stats["api_calls"],
+        "retries": processor.stats["retries"],
+        "follow_ups": processor.stats["follow_ups"],
+        "escalations": processor.stats["escalations"],
+        "rate_limited": simulator.stats["rate_limited"],
+        "server_errors": simulator.stats["server_errors"],
+        "malformed": simulator.stats["malformed"],
+        "circuit_open": processor.stats["circuit_open"],
+        "unparsed": unparsed,
+        "cancelled": cancelled,
+        "errors": errors,
+        "final_delay_s": round(processor.rate_limiter.current_delay, 3),
+        "final_concurrency": processor.concurrency.current_limit,
+        "max_in_flight": simulator.stats["max_in_flight"],
+    }
+
+def print_report(report):
+    header = (f"{'workers':>8}{'files/s':>9}{'wait p50':>10}{'wait p95':>10}{'1st field':>10}{'e2e p50':>9}{'e2e p95':>9}"
+              f"{'calls':>7}{'retries':>9}{'429s':>6}{'503s':>6}{'bad json':>10}{'errors':>8}{'limit':>7}")
+    print(header)
+    print("-" * len(header))
+    for result in report:
+        print(f"{result['workers']:>8}{result['files_per_s']:>9.2f}{result['queue_wait_p50_s']:>10.2f}"
+              f"{result['queue_wait_p95_s']:>10.2f}{result['first_field_p50_s']:>10.2f}{result['e2e_p50_s']:>9.2f}{result['e2e_p95_s']:>9.2f}"
+              f"{result['api_calls']:>7}{result['retries']:>9}{result['rate_limited']:>6}{result['server_errors']:>6}"
+              f"{result['malformed']:>10}{result['errors']:>8}{result['final_concurrency']:>7}")
+    for result in report:
+        if result['interactive_p50_s']:
+            print(f"{result['workers']} workers: interactive uploads e2e p50 {result['interactive_p50_s']:.2f} s, "
+                  f"p95 {result['interactive_p95_s']:.2f} s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the processing queue against a simulated Gemini backend")
+    parser.add_argument("--files", type=int, default=50, help="Number of synthetic resumes")
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8], help="Worker counts to compare")
+    parser.add_argument("--sessions", type=int, default=1, help="Spread the files over this many sessions")
+    parser.add_argument("--interactive", type=int, default=0,
+                        help="Single resumes submitted in the interactive lane during the run")
+    parser.add_argument("--probe-interval", type=float, default=1.0,
+                        help="Seconds between interactive submissions")
+    parser.add_argument("--cancel-after", type=float, default=None,
+                        help="Cancel the batch this many seconds after queueing it")
+    parser.add_argument("--filters", action="store_true", help="Analyse with job filters (match scoring prompt)")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Latency distribution")
+    parser.add_argument("--latency-mean", type=float, default=1.5, help="Mean simulated API latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the latency distribution")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05, help="Fraction of calls answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with each 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of calls answered with a 503")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Simulated quota on calls in flight; calls beyond it get a 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.02, help="Fraction of calls returning invalid JSON")
+    parser.add_argument("--rate-limit-delay", type=float, default=DEFAULT_MIN_CALL_GAP,
+                        help="RateLimiter minimum gap between call starts in seconds")
+    parser.add_argument("--max-delay", type=float, default=60.0, help="RateLimiter maximum delay in seconds")
+    parser.add_argument("--backoff-factor", type=float, default=1.5, help="RateLimiter backoff factor")
+    parser.add_argument("--large-latency-mean", type=float, default=None,
+                        help="Serve the large model tier from a second simulator with this mean latency")
+    parser.add_argument("--no-stream", action="store_true", help="Wait for whole responses instead of streaming")
+    parser.add_argument("--http", action="store_true", help="Call the simulator through the local HTTP server")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the simulator")
+    parser.add_argument("--json", help="Also write the full report to this file")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        files = make_corpus(work_dir, args.files + args.interactive)
+        report = [run_pipeline(files, workers, args) for workers in args.workers]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Memory benchmark for parsed resume records.
+
+Parses simulated Gemini responses (from utils.simulated_backend, with match
+scoring) into ResumeRecords and, for comparison, into the plain dicts the
+processor used to return, and reports the memory retained per candidate as
+measured by tracemalloc. This is what sizes how many results a server can hold
+(see RESUME_PARSER_MAX_RESULTS).
+
+Usage:
+    python benchmarks/bench_records.py
+    python benchmarks/bench_records.py --records 100000 --json records.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from utils.gemini_processor import GeminiProcessor
+from utils.simulated_backend import SimulatedGemini
+
+def make_responses(count):
+    """Validated-response dictionaries for distinct candidates, as the processor parses them"""
+    simulator = SimulatedGemini()
+    responses = []
+    for index in range(count):
+        prompt = f'"match_score" filters\nRESUME TEXT:\nCandidate {index}\ncandidate{index}@example.com\n'
+        text = simulator.build_response(prompt)
+        responses.append(text[text.index("{"):text.rindex("}") + 1])
+    return responses
+
+def measure(responses, build):
+    """
+    Build one record per response and measure the memory they keep
+
+    Returns:
+    - Bytes retained per record
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [build(json.loads(response)) for response in responses]
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del records
+    return retained / len(responses)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure memory retained per parsed resume")
+    parser.add_argument("--records", type=int, default=100000, help="Number of candidates to hold")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    processor = GeminiProcessor("simulated", backend=SimulatedGemini())
+    responses = make_responses(args.records)
+
+    report = {"records": args.records}
+    for label, build in (
+        # A JSON round trip gives each dict its own strings, as parsing every response used to
+        ("dict", lambda data: json.loads(json.dumps(processor._parse_response(data), default=dict))),
+        ("record", processor._parse_response),
+    ):
+        report[f"{label}_bytes"] = round(measure(responses, build))
+
+    print(f"{'form':>8}{'bytes/record':>14}{'MB total':>10}")
+    for label in ("dict", "record"):
+        print(f"{label:>8}{report[label + '_bytes']:>14}{report[label + '_bytes'] * args.records / 2**20:>10.1f}")
+    print(f"ResumeRecord holds {report['record_bytes'] / report['dict_bytes']:.0%} of the memory of the old dicts")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""
+Startup-time benchmark for the Resume Parser modules.
+
+Each target module is imported in a fresh interpreter with ``-X importtime`` so the
+numbers reflect a real cold start (CLI run or a freshly spawned worker process).
+The script reports the cumulative import time of every target, lists any heavy
+document/AI libraries that were pulled in eagerly, and compares against a stored
+baseline.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --save-baseline
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(REPO_ROOT, "benchmarks", "baselines", "startup.json")
+
+# Modules whose cold import cost we track
+TARGETS = [
+    "utils.file_handler",
+    "utils.gemini_processor",
+    "components.processor",
+]
+
+# Libraries that must only be loaded on first use of a format or backend
+HEAVY_MODULES = ["fitz", "pdfplumber", "PyPDF2", "docx", "google.generativeai", "pandas"]
+
+def measure_import(module, heavy_modules=HEAVY_MODULES):
+    """
+    Import a module in a fresh interpreter and measure its cost
+
+    Returns:
+    - Tuple of (cumulative import time in ms, list of heavy modules that got loaded)
+    """
+    probe = (
+        f"import sys, {module}; "
+        f"print(','.join(m for m in {heavy_modules!r} if m in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=REPO_ROOT, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+
+    cumulative_us = 0
+    for line in completed.stderr.splitlines():
+        # Format: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1])
+
+    # Libraries may print warnings on import; the probe's answer is the last line
+    output_lines = completed.stdout.strip().splitlines()
+    loaded = [name for name in (output_lines[-1] if output_lines else "").split(",") if name]
+    return cumulative_us / 1000.0, loaded
+
+def run_benchmark(targets, runs):
+    """Measure each target several times and return median timings"""
+    report = {}
+    for module in targets:
+        timings = []
+        loaded = []
+        for _ in range(runs):
+            elapsed_ms, loaded = measure_import(module)
+            timings.append(elapsed_ms)
+        report[module] = {
+            "median_ms": round(statistics.median(timings), 2),
+            "min_ms": round(min(timings), 2),
+            "heavy_modules": loaded
+        }
+    return report
+
+def compare_to_baseline(report, baseline, tolerance):
+    """Return a list of human-readable regressions against the baseline"""
+    regressions = []
+    for module, result in report.items():
+        previous = baseline.get(module)
+        if not previous:
+            continue
+        limit = previous["median_ms"] * (1 + tolerance)
+        if result["median_ms"] > limit:
+            regressions.append(
+                f"{module}: {result['median_ms']:.1f} ms vs baseline {previous['median_ms']:.1f} ms"
+            )
+        new_heavy = set(result["heavy_modules"]) - set(previous.get("heavy_modules", []))
+        if new_heavy:
+            regressions.append(f"{module}: now eagerly imports {', '.join(sorted(new_heavy))}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start import cost")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per target")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("targets", nargs="*", default=TARGETS, help="Modules to import")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.targets, args.runs)
+
+    print(f"{'module':<28}{'median ms':>12}{'min ms':>10}  heavy modules loaded")
+    for module, result in report.items():
+        heavy = ", ".join(result["heavy_modules"]) or "-"
+        print(f"{module:<28}{result['median_ms']:>12.1f}{result['min_ms']:>10.1f}  {heavy}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
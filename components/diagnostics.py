@@ -0,0 +1,116 @@
+import time
+import streamlit as st
+from utils.metrics import (API_CALLS, BUDGET_REFUSALS, CIRCUIT_OPEN, CONCURRENCY_LIMIT, ESCALATIONS, IN_FLIGHT_CALLS,
+                           RATE_LIMIT_DELAY, RETRIES, ROUTED_CALLS, TOKENS, UPLOADS, stage_summaries,
+                           start_metrics_server)
+from utils.memory import deep_sizeof, format_bytes
+from utils.model_router import ESCALATION_LOW_CONFIDENCE, ESCALATION_VALIDATION, TIER_FAST, TIER_LARGE
+from utils.scheduler import PRIORITIES
+from utils.token_ledger import SCOPE_BATCH, SCOPE_DAY, SCOPE_MONTH, SCOPE_SESSION
+
+@st.cache_resource(show_spinner=False)
+def ensure_metrics_server():
+    """
+    Start the process-wide Prometheus listener once per server process
+
+    Returns:
+        The metrics HTTP server, or None if its port was unavailable
+    """
+    return start_metrics_server()
+
+def display_token_usage(processor):
+    """
+    Display token usage against the configured budgets
+    
+    Args:
+        processor: GeminiProcessor instance whose ledger is shown
+    """
+    today = time.strftime("%Y-%m-%d")
+    usage = {
+        SCOPE_DAY: processor.get_token_usage(SCOPE_DAY, today),
+        SCOPE_MONTH: processor.get_token_usage(SCOPE_MONTH, today[:7]),
+    }
+    if st.session_state.get('batch_id'):
+        usage[SCOPE_BATCH] = processor.get_token_usage(SCOPE_BATCH, st.session_state.batch_id)
+    if st.session_state.get('session_id'):
+        usage[SCOPE_SESSION] = processor.get_token_usage(SCOPE_SESSION, st.session_state.session_id)
+    
+    limits = processor.budget.limits
+    columns = st.columns(len(usage))
+    for column, (scope, tokens) in zip(columns, usage.items()):
+        label = f"Tokens this {scope}" if scope in (SCOPE_DAY, SCOPE_MONTH) else f"Tokens in this {scope}"
+        limit = limits.get(scope)
+        column.metric(label, f"{tokens:,}", f"{limit - tokens:,} left" if limit else None)
+    
+    cached = TOKENS.total(direction="cached")
+    if cached:
+        st.caption(f"{cached:,} prompt tokens were served from the context cache.")
+    
+    refusals = BUDGET_REFUSALS.total()
+    if refusals:
+        st.warning(f"{refusals} calls were refused by a token budget "
+                   f"({'analysed with shortened resumes first' if processor.budget.action == 'degrade' else 'tasks paused'}).")
+
+def display_diagnostics(processor=None):
+    """Display per-stage timings, API call counts and token usage in a collapsible panel"""
+    server = ensure_metrics_server()
+
+    with st.expander("Diagnostics"):
+        if CIRCUIT_OPEN.get():
+            st.error("The LLM API is failing; calls are paused by the circuit breaker and will be retried shortly.")
+        
+        calls = API_CALLS.total()
+        rate_limited = API_CALLS.total(outcome="rate_limit")
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("API calls", calls)
+        col2.metric("Rate limited", rate_limited)
+        col3.metric("Retries", RETRIES.total())
+        col4.metric("Current API delay", f"{RATE_LIMIT_DELAY.get():.1f} s")
+        
+        st.caption(f"Adaptive concurrency limit: {CONCURRENCY_LIMIT.get():.0f} calls "
+                   f"({IN_FLIGHT_CALLS.get():.0f} in flight)")
+        if processor is not None:
+            depths = processor.queue.queue.depth_by_lane()
+            st.caption("Queued: " + ", ".join(f"{depths[lane]} {lane}" for lane in PRIORITIES))
+            
+            memory = processor.memory_by_session()
+            own = memory.get(st.session_state.get('session_id'), {"results": 0, "bytes": 0})
+            state_bytes = deep_sizeof(dict(st.session_state.items()))
+            st.caption(f"Memory for this session: {format_bytes(state_bytes)} of session state, "
+                       f"{own['results']} results ({format_bytes(own['bytes'])}) on the shared processor; "
+                       f"{sum(usage['results'] for usage in memory.values())} results retained in total")
+        
+        escalations = ESCALATIONS.total()
+        if ROUTED_CALLS.total():
+            st.caption(f"Calls on the fast model: {ROUTED_CALLS.total(tier=TIER_FAST)}, "
+                       f"on the large model: {ROUTED_CALLS.total(tier=TIER_LARGE)} "
+                       f"({escalations} escalations: {ESCALATIONS.total(reason=ESCALATION_VALIDATION)} failed validation, "
+                       f"{ESCALATIONS.total(reason=ESCALATION_LOW_CONFIDENCE)} low confidence)")
+
+        if processor is not None:
+            display_token_usage(processor)
+        
+        rows = stage_summaries()
+        if rows:
+            st.dataframe(
+                [{
+                    'Stage': row['stage'],
+                    'Runs': row['count'],
+                    'Errors': row['errors'],
+                    'Total (s)': round(row['sum'], 2),
+                    'Mean (ms)': round(row['mean'] * 1000, 1),
+                    'p50 (ms)': round(row['p50'] * 1000, 1),
+                    'p95 (ms)': round(row['p95'] * 1000, 1),
+                } for row in rows],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No resumes have been processed by this server yet.")
+
+        st.caption(f"Uploads saved: {UPLOADS.total(outcome='saved')}, "
+                   f"duplicates: {UPLOADS.total(outcome='duplicate')}, "
+                   f"rejected: {UPLOADS.total(outcome='rejected')}")
+        if server is not None:
+            st.caption(f"Prometheus metrics: http://{server.server_address[0]}:{server.server_port}/metrics")
@@ -1,5 +1,7 @@
 import streamlit as st
 import json
+from utils.metrics import STAGE_FILTERING, time_stage
+from utils.token_ledger import KIND_NLP_QUERY, accounting
 
 def filter_resumes_with_nlp(query, processor, resumes):
     """
@@ -15,7 +17,12 @@ def filter_resumes_with_nlp(query, processor, resumes):
     """
     if not query or not resumes:
         return resumes
-        
+    
+    with time_stage(STAGE_FILTERING):
+        return _filter_resumes(query, processor, resumes)
+
+def _filter_resumes(query, processor, resumes):
+    """Apply an NLP query to resumes, falling back to keyword search"""
     try:
         # Use Gemini to create a filtering prompt
         filters = process_nlp_query(query, processor)
@@ -100,7 +107,9 @@ def process_nlp_query(query, processor):
     """
     
     try:
-        result = processor._call_gemini_with_retry(prompt)
+        with accounting(kind=KIND_NLP_QUERY, batch_id=st.session_state.get('batch_id'),
+                        session_id=st.session_state.get('session_id')):
+            result = processor.generate(prompt)
         result = result.strip()
         
         # Try to find JSON in the response by looking for opening/closing braces
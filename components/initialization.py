@@ -1,11 +1,13 @@
 import streamlit as st
 from utils.secrets_manager import SecretsManager
+from utils.gemini_processor import GEMINI_AVAILABLE
+from utils.llm_backend import BACKEND_GEMINI, get_backend_name
+from utils.cassette import MODE_REPLAY, get_cassette_mode
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+# Another backend (e.g. a local server) or a replayed cassette can stand in for Gemini
+USING_GEMINI = get_backend_name() == BACKEND_GEMINI and get_cassette_mode() != MODE_REPLAY
+
+if USING_GEMINI and not GEMINI_AVAILABLE:
     st.error("Google Generative AI package is not installed. Please run: pip install google-generativeai")
 
 def initialize_app_state():
@@ -13,10 +15,11 @@ def initialize_app_state():
     secrets_manager = SecretsManager()
     
     # Initialize session state variables if they don't exist
-    if 'resume_data' not in st.session_state:
-        st.session_state.resume_data = []
-    if 'matches' not in st.session_state:
-        st.session_state.matches = []
+    # Results stay on the shared processor; the session only keeps their task IDs
+    if 'match_ids' not in st.session_state:
+        st.session_state.match_ids = []
+    if 'custom_values' not in st.session_state:
+        st.session_state.custom_values = {}
     if 'gemini_processor' not in st.session_state:
         st.session_state.gemini_processor = None
     if 'gemini_configured' not in st.session_state:
@@ -65,6 +68,13 @@ def initialize_app_state():
 
 def check_api_configuration():
     """Check if the Gemini API key is properly configured"""
+    if not USING_GEMINI:
+        if get_cassette_mode() == MODE_REPLAY:
+            st.info("Replaying recorded LLM responses instead of calling Google Gemini")
+        else:
+            st.info(f"Using the '{get_backend_name()}' LLM backend instead of Google Gemini")
+        return True
+    
     if not GEMINI_AVAILABLE:
         st.error("Google Generative AI package is not installed. This application requires it for processing resumes.")
         st.info("Please install the package using: pip install google-generativeai")
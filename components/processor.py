@@ -1,7 +1,66 @@
 import os
 import time
+import uuid
 import streamlit as st
-from utils.gemini_processor import GeminiProcessor
+from utils.gemini_processor import GeminiProcessor, MATCH_PREVIEW_FIELDS
+from utils.scheduler import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from utils.job_store import DEFAULT_STORE_PATH
+from components.initialization import USING_GEMINI
+
+# Worker threads in the shared processor: an upper bound, since the adaptive concurrency
+# limit decides how many are busy; API calls are still paced by one rate limiter
+SHARED_PROCESSOR_WORKERS = 16
+
+# Uploads of up to this many resumes are treated as interactive and overtake bulk batches
+INTERACTIVE_MAX_FILES = 3
+
+# Seconds between progress refreshes; short so streamed fields show up promptly
+POLL_INTERVAL = 0.5
+
+# Streamed fields shown next to a resume while it is still being analysed
+PREVIEW_FIELDS = MATCH_PREVIEW_FIELDS
+
+def format_partial(partial):
+    """
+    Format the fields streamed in so far for the progress list
+    
+    Args:
+        partial: Dictionary of response fields received so far
+        
+    Returns:
+        str: Short preview, or an empty string if no preview field has arrived
+    """
+    parts = []
+    for field in PREVIEW_FIELDS:
+        value = partial.get(field)
+        if value in (None, ""):
+            continue
+        parts.append(f"score {value}" if field == 'match_score' else str(value))
+    return " | ".join(parts)
+
+@st.cache_resource(show_spinner=False)
+def get_shared_processor(api_key, store_path=None):
+    """
+    Get the process-wide Gemini processor for an API key
+    
+    Every Streamlit session in this server process shares the returned instance, and
+    with it one rate limiter, one worker pool, one result cache and one job store,
+    so concurrent users stay within a single API quota.
+    
+    Args:
+        api_key: Gemini API key
+        store_path: Optional path of the persistent job store
+        
+    Returns:
+        GeminiProcessor: Shared processor instance
+    """
+    return GeminiProcessor(api_key, store_path=store_path, workers=SHARED_PROCESSOR_WORKERS)
+
+def get_session_id():
+    """Get a stable ID for the current Streamlit session, used for fair scheduling"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
 
 def initialize_processor(secrets_manager):
     """
@@ -11,19 +70,20 @@ def initialize_processor(secrets_manager):
         secrets_manager: Instance of SecretsManager
         
     Returns:
-        GeminiProcessor: Initialized processor instance
+        GeminiProcessor: Shared processor instance
     """
     if st.session_state.gemini_processor is None:
         if st.session_state.gemini_configured:
             try:
                 gemini_api_key = secrets_manager.get_secret('api_key', section='gemini')
-                st.session_state.gemini_processor = GeminiProcessor(gemini_api_key)
+                st.session_state.gemini_processor = get_shared_processor(gemini_api_key, DEFAULT_STORE_PATH)
             except Exception as e:
                 st.warning(f"Error initializing Google Gemini: {e}")
-                st.session_state.gemini_processor = GeminiProcessor("dummy_key")
+                st.session_state.gemini_processor = get_shared_processor("dummy_key")
         else:
-            st.warning("Google Gemini API key is not configured in .streamlit/secrets.toml")
-            st.session_state.gemini_processor = GeminiProcessor("dummy_key")
+            if USING_GEMINI:
+                st.warning("Google Gemini API key is not configured in .streamlit/secrets.toml")
+            st.session_state.gemini_processor = get_shared_processor("dummy_key")
     
     return st.session_state.gemini_processor
 
@@ -53,56 +113,98 @@ def process_resumes(file_paths, user_filters, processor):
     # Reset processing state
     st.session_state.processing_complete = False
     st.session_state.processing_files = {}
-    st.session_state.resume_data = []
+    st.session_state.match_ids = []
+    st.session_state.custom_values = {}
+    
+    # A previous run this session did not see through is not going to be read either
+    if st.session_state.get('batch_id'):
+        processor.cancel_batch(st.session_state.batch_id)
     
-    # Process files in batches
-    for i in range(0, total_files, batch_size):
-        batch = file_paths[i:i+batch_size]
+    # Results of this run live in their own namespace on the processor queue
+    batch_id = uuid.uuid4().hex
+    st.session_state.batch_id = batch_id
+    priority = PRIORITY_INTERACTIVE if total_files <= INTERACTIVE_MAX_FILES else PRIORITY_NORMAL
+    
+    try:
+        # Process files in batches
+        for i in range(0, len(file_paths), batch_size):
+            batch = file_paths[i:i+batch_size]
         
-        # Queue all files in the current batch
-        task_ids = []
-        for file_path in batch:
-            file_name = os.path.basename(file_path)
-            task_id = processor.queue_document_for_analysis(file_path, user_filters)
-            task_ids.append(task_id)
-            st.session_state.processing_files[task_id] = {
-                "file_path": file_path,
-                "file_name": file_name,
-                "status": "queued"
-            }
+            # Queue all files in the current batch
+            task_ids = []
+            for file_path in batch:
+                file_name = os.path.basename(file_path)
+                task_id = processor.queue_document_for_analysis(file_path, user_filters, batch_id=batch_id,
+                                                                session_id=get_session_id(), priority=priority)
+            
+                # Identical files share one task, so they are only analysed (and shown) once
+                if task_id in st.session_state.processing_files:
+                    st.session_state.processing_files[task_id]["file_name"] += f", {file_name}"
+                    total_files -= 1
+                    continue
+            
+                task_ids.append(task_id)
+                st.session_state.processing_files[task_id] = {
+                    "file_path": file_path,
+                    "file_name": file_name,
+                    "status": "queued"
+                }
         
-        # Wait for the batch to complete
-        batch_complete = False
-        while not batch_complete:
-            for task_id in task_ids:
-                result = processor.get_queued_result(task_id)
+            # Wait for the batch to complete
+            batch_complete = False
+            while not batch_complete:
+                for task_id in task_ids:
+                    result = processor.get_queued_result(task_id, batch_id)
                 
-                if result["status"] == "completed":
-                    if st.session_state.processing_files[task_id]["status"] != "complete":
-                        st.session_state.processing_files[task_id]["status"] = "complete"
-                        if result["data"]:
-                            st.session_state.resume_data.append(result["data"])
-                elif result["status"] == "failed":
-                    st.session_state.processing_files[task_id]["status"] = "error"
-                    st.session_state.processing_files[task_id]["error"] = result["error"]
+                    if result["status"] == "completed":
+                        if st.session_state.processing_files[task_id]["status"] != "complete":
+                            st.session_state.processing_files[task_id]["status"] = "complete"
+                            if result["data"]:
+                                st.session_state.match_ids.append(task_id)
+                    elif result["status"] == "failed":
+                        st.session_state.processing_files[task_id]["status"] = "error"
+                        st.session_state.processing_files[task_id]["error"] = result["error"]
+                    elif result["status"] == "paused":
+                        # Refused by a token budget; it is re-queued when the budget allows
+                        st.session_state.processing_files[task_id]["status"] = "paused"
+                        st.session_state.processing_files[task_id]["error"] = result["error"]
+                    elif result["status"] == "cancelled":
+                        # Past its deadline (see RESUME_PARSER_TASK_DEADLINE)
+                        st.session_state.processing_files[task_id]["status"] = "cancelled"
+                        st.session_state.processing_files[task_id]["error"] = result["error"]
+                    elif result["status"] in ("expired", "unknown"):
+                        # Evicted from memory with no job store to reload it from
+                        st.session_state.processing_files[task_id]["status"] = "error"
+                        st.session_state.processing_files[task_id]["error"] = (result["error"] or
+                                                                              "Result is no longer available")
+                    elif result["status"] == "processing":
+                        st.session_state.processing_files[task_id]["status"] = "processing"
+                        st.session_state.processing_files[task_id]["preview"] = format_partial(result.get("partial", {}))
             
-            completed = sum(1 for task in st.session_state.processing_files.values() 
-                          if task["status"] in ["complete", "error"])
-            progress = completed / total_files
-            progress_bar.progress(progress, text=f"Processed {completed}/{total_files} resumes")
+                completed = sum(1 for task in st.session_state.processing_files.values() 
+                              if task["status"] in ["complete", "error", "paused", "cancelled"])
+                progress = completed / total_files
+                progress_bar.progress(progress, text=f"Processed {completed}/{total_files} resumes")
             
-            status_text = ""
-            for task_id in task_ids:
-                task = st.session_state.processing_files[task_id]
-                icon = "⏳" if task["status"] == "queued" else "✅" if task["status"] == "complete" else "❌"
-                status_text += f"{icon} {task['file_name']}: {task['status'].upper()}\n"
-            file_status.code(status_text)
+                status_text = ""
+                for task_id in task_ids:
+                    task = st.session_state.processing_files[task_id]
+                    icon = {"queued": "⏳", "processing": "🔄", "complete": "✅", "paused": "⏸️", "cancelled": "🚫"}.get(task["status"], "❌")
+                    status_text += f"{icon} {task['file_name']}: {task['status'].upper()}"
+                    if task["status"] == "processing" and task.get("preview"):
+                        status_text += f" - {task['preview']}"
+                    status_text += "\n"
+                file_status.code(status_text)
             
-            batch_complete = all(st.session_state.processing_files[task_id]["status"] in ["complete", "error"] 
-                              for task_id in task_ids)
+                batch_complete = all(st.session_state.processing_files[task_id]["status"] in ["complete", "error", "paused", "cancelled"] 
+                                  for task_id in task_ids)
             
-            if not batch_complete:
-                time.sleep(1)
+                if not batch_complete:
+                    time.sleep(POLL_INTERVAL)
+    except BaseException:
+        # The user left the page or started a rerun: stop spending quota on results nobody will read
+        processor.cancel_batch(batch_id)
+        raise
     
     st.session_state.processing_complete = True
     
@@ -110,10 +212,20 @@ def process_resumes(file_paths, user_filters, processor):
                   if task["status"] == "complete")
     errors = sum(1 for task in st.session_state.processing_files.values() 
                if task["status"] == "error")
+    paused = sum(1 for task in st.session_state.processing_files.values() 
+               if task["status"] == "paused")
+    cancelled = sum(1 for task in st.session_state.processing_files.values() 
+                  if task["status"] == "cancelled")
     
     progress_bar.progress(1.0, text="Processing complete!")
     
-    if errors > 0:
+    if paused > 0:
+        status_container.warning(f"Processed {completed}/{total_files} resumes. {paused} were paused because "
+                                 f"the token budget is exhausted.")
+    elif cancelled > 0:
+        status_container.warning(f"Processed {completed}/{total_files} resumes. {cancelled} were abandoned "
+                                 f"after passing their deadline.")
+    elif errors > 0:
         status_container.warning(f"Processed {completed}/{total_files} resumes. {errors} had errors.")
     else:
         status_container.success(f"Successfully processed all {total_files} resumes!")
@@ -129,8 +241,9 @@ def filter_and_sort_matches(user_filters):
         user_filters: Dictionary of filters to apply
     """
     # With Gemini processing, filtering happens directly during document processing
-    # Just sort by match score now
-    st.session_state.matches = st.session_state.resume_data
+    # Just sort by match score now, in descending order
+    from components.results import load_resumes  # deferred: components.results imports pandas
     
-    # Sort by match score in descending order
-    st.session_state.matches.sort(key=lambda x: x.get('match_score', 0), reverse=True)
\ No newline at end of file
+    matches = load_resumes(st.session_state.match_ids)
+    matches.sort(key=lambda x: x.get('match_score', 0), reverse=True)
+    st.session_state.match_ids = [resume['task_id'] for resume in matches]
\ No newline at end of file
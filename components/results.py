@@ -2,18 +2,50 @@ import pandas as pd
 import streamlit as st
 from utils.export import export_to_excel
 from utils.file_handler import get_text_from_file
+from utils.token_ledger import KIND_CUSTOM_COLUMN, accounting
 
-def display_results(export_only=False):
+def load_resumes(task_ids):
+    """
+    Load resume records for task IDs from the processor
+    
+    Each record is a fresh copy of the shared result with this session's custom
+    column values and its task ID added, so nothing is kept in session state and
+    no session's custom columns leak into another's results.
+    
+    Args:
+        task_ids (list): Task IDs of the current run
+        
+    Returns:
+        list: Resume data dictionaries, in the order of task_ids
+    """
+    processor = st.session_state.gemini_processor
+    if not processor or not task_ids:
+        return []
+    
+    batch_id = st.session_state.get('batch_id')
+    custom_values = st.session_state.get('custom_values', {})
+    resumes = []
+    for task_id in task_ids:
+        data = processor.get_queued_result(task_id, batch_id)["data"]
+        if data:
+            resumes.append({**data, **custom_values.get(task_id, {}), 'task_id': task_id})
+    return resumes
+
+def display_results(task_ids=None, export_only=False):
     """Display the results of resume parsing and analysis
     
     Args:
+        task_ids (list): Task IDs of the resumes to show; defaults to all matches of the current run
         export_only (bool): If True, only show export options without displaying the data
     """
-    if 'matches' not in st.session_state or not st.session_state.matches:
+    if task_ids is None:
+        task_ids = st.session_state.get('match_ids', [])
+    matches = load_resumes(task_ids)
+    if not matches:
         return
         
     # Create dataframe from matches
-    df = pd.DataFrame(st.session_state.matches)
+    df = pd.DataFrame(matches)
     for col in st.session_state.display_columns:
         if col not in df.columns:
             df[col] = ""
@@ -37,7 +69,7 @@ def display_results(export_only=False):
     # Process when button is clicked
     if add_column_button and column_name and column_prompt:
         with st.spinner(f"Extracting {column_name}..."):
-            extract_custom_column(column_name, column_prompt)
+            extract_custom_column(column_name, column_prompt, matches)
     elif add_column_button and not (column_name and column_prompt):
         st.warning("Please enter both a column name and a prompt.")
     
@@ -77,13 +109,14 @@ def display_results(export_only=False):
             st.error(f"Error preparing Excel export: {e}")
             return None
 
-def extract_custom_column(column_name, column_prompt):
+def extract_custom_column(column_name, column_prompt, resumes):
     """
     Extract custom information from resumes using Gemini
     
     Args:
         column_name (str): Name of the new column to display
         column_prompt (str): Prompt to extract information with
+        resumes (list): Resume records from load_resumes()
     """
     processor = st.session_state.gemini_processor
     
@@ -91,10 +124,12 @@ def extract_custom_column(column_name, column_prompt):
         st.error("No AI processor available")
         return
     
-    for resume in st.session_state.matches:
+    custom_values = st.session_state.custom_values
+    for resume in resumes:
+        values = custom_values.setdefault(resume['task_id'], {})
         file_path = resume.get('file_path', "")
         try:
-            text = get_text_from_file(file_path)
+            text = get_text_from_file(file_path, max_chars=10000)
             
             custom_prompt = f"""You are extracting specific information from a resume.
 
@@ -107,11 +142,13 @@ Provide ONLY the requested information as plain text. Be precise and thorough.
 If the information cannot be found, state "Not found in resume".
 Do not include explanations, analysis, or any additional text."""
             
-            result = processor._call_gemini_with_retry(custom_prompt)
-            resume[column_name] = result.strip()
+            with accounting(kind=KIND_CUSTOM_COLUMN, batch_id=st.session_state.get('batch_id'),
+                            session_id=st.session_state.get('session_id')):
+                result = processor.generate(custom_prompt)
+            values[column_name] = result.strip()
                 
         except Exception as e:
-            resume[column_name] = f"Error processing: {str(e)[:50]}"
+            values[column_name] = f"Error processing: {str(e)[:50]}"
     
     if column_name not in st.session_state.display_columns:
         st.session_state.display_columns.append(column_name)
@@ -1,4 +1,34 @@
-from . import file_handler
-from . import export
-from . import gemini_processor
-from . import secrets_manager
\ No newline at end of file
+import importlib
+
+# Submodules are loaded on first attribute access so that importing one utility
+# (e.g. in a worker process) does not pull in Streamlit, pandas or the AI client.
+_SUBMODULES = (
+    "file_handler",
+    "pdf_extractor",
+    "docx_extractor",
+    "ocr",
+    "export",
+    "gemini_processor",
+    "secrets_manager",
+    "job_store",
+    "llm_backend",
+    "simulated_backend",
+    "local_llm_server",
+    "cassette",
+    "metrics",
+    "token_ledger",
+    "circuit_breaker",
+    "json_stream",
+    "structured_output",
+    "model_router",
+    "scheduler",
+    "concurrency_limiter",
+    "cancellation",
+    "memory",
+    "resume_record",
+)
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,127 @@
+"""
+Cancellation and deadlines for queued work.
+Every queued task gets a CancellationToken whose parent is the token of the
+batch that queued it, so a whole batch can be cancelled at once (e.g. when the
+user who started it leaves the page). A task shared by several batches through
+content-addressed deduplication is only cancelled once all of them are. A
+token can also carry a deadline, after which it counts as cancelled.
+
+Workers check the token before extracting text and before every API call, and
+waits for a call slot or a retry give up early, so cancelled work stops
+costing quota. The deadline of tasks queued without one comes from
+RESUME_PARSER_TASK_DEADLINE (seconds after queueing; unset for none).
+"""
+
+import os
+import time
+import threading
+
+DEADLINE_ENV_VAR = "RESUME_PARSER_TASK_DEADLINE"
+
+REASON_CANCELLED = "cancelled"
+REASON_DEADLINE = "deadline"
+
+# Longest a wait goes without re-checking its token
+CANCEL_POLL_INTERVAL = 0.5
+
+class TaskCancelledError(BaseException):
+    """
+    The task a call belongs to was cancelled or ran past its deadline
+
+    Derived from BaseException, like asyncio.CancelledError, so that the
+    `except Exception` blocks that turn errors into error records do not
+    swallow it on its way to the worker.
+    """
+    def __init__(self, reason=REASON_CANCELLED):
+        super().__init__("Task passed its deadline" if reason == REASON_DEADLINE else "Task was cancelled")
+        self.reason = reason
+
+def default_deadline(queued_at=None):
+    """Deadline for a task queued now, from RESUME_PARSER_TASK_DEADLINE, or None"""
+    seconds = os.environ.get(DEADLINE_ENV_VAR)
+    if not seconds or float(seconds) <= 0:
+        return None
+    return (queued_at or time.time()) + float(seconds)
+
+class CancellationToken:
+    """
+    Cancellation state of a task or batch
+
+    Args:
+        deadline: Optional epoch time after which the token counts as cancelled
+        parents: Tokens (e.g. of batches) that cancel this one once all of them are cancelled
+    """
+    def __init__(self, deadline=None, parents=()):
+        self.deadline = deadline
+        self.parents = []
+        self.children = []
+        self.reason = None
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        for parent in parents:
+            self.add_parent(parent)
+
+    def add_parent(self, parent):
+        """Make this token cancelled only once every parent, including this one, is"""
+        with self.lock:
+            self.parents.append(parent)
+        with parent.lock:
+            parent.children.append(self)
+
+    def extend_deadline(self, deadline):
+        """Keep the later of two deadlines; None means no deadline at all"""
+        with self.lock:
+            if self.deadline is not None:
+                self.deadline = None if deadline is None else max(self.deadline, deadline)
+
+    def cancel(self, reason=REASON_CANCELLED):
+        """Cancel the token and any child whose parents are now all cancelled"""
+        with self.lock:
+            if self.reason is not None:
+                return
+            self.reason = reason
+            children = list(self.children)
+        self.event.set()
+        for child in children:
+            child._parent_cancelled(reason)
+
+    def _parent_cancelled(self, reason):
+        with self.lock:
+            parents = list(self.parents)
+        if all(parent.cancelled for parent in parents):
+            self.cancel(reason)
+
+    @property
+    def cancelled(self):
+        """Reason the token is cancelled (REASON_CANCELLED or REASON_DEADLINE), or None"""
+        if self.reason is not None:
+            return self.reason
+        if self.deadline is not None and time.time() >= self.deadline:
+            return REASON_DEADLINE
+        return None
+
+    def check(self):
+        """
+        Raises:
+        - TaskCancelledError if the token is cancelled or past its deadline
+        """
+        reason = self.cancelled
+        if reason is not None:
+            raise TaskCancelledError(reason)
+
+    def sleep(self, seconds):
+        """
+        Sleep, waking early if the token is cancelled
+
+        Raises:
+        - TaskCancelledError if the token is cancelled or reaches its deadline meanwhile
+        """
+        end = time.time() + seconds
+        while True:
+            self.check()
+            remaining = end - time.time()
+            if remaining <= 0:
+                return
+            if self.deadline is not None:
+                remaining = min(remaining, max(self.deadline - time.time(), 0))
+            self.event.wait(remaining)
@@ -0,0 +1,226 @@
+"""
+Record/replay cassettes for LLM responses.
+In record mode every call made through the wrapped backend is appended to a JSONL
+cassette as a hash of model and prompt, response (or error), token usage and
+latency. In replay mode the cassette answers the same prompts on the same models
+deterministically without network access, optionally sleeping for the recorded
+latency, so parsing, filtering and export can be profiled on real responses and
+performance runs are repeatable.
+
+Cassettes hold candidate data from real resumes; keep them under data/processed
+(e.g. data/processed/cassettes/), which is not committed.
+
+Select with RESUME_PARSER_LLM_CASSETTE=<path> and
+RESUME_PARSER_LLM_CASSETTE_MODE=record|replay; set
+RESUME_PARSER_LLM_CASSETTE_LATENCY=1 to reproduce recorded latencies on replay.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from pathlib import Path
+from utils.llm_backend import FatalError, LLMBackend, estimate_tokens, join_prompt, make_error, make_usage
+
+CASSETTE_ENV_VAR = "RESUME_PARSER_LLM_CASSETTE"
+CASSETTE_MODE_ENV_VAR = "RESUME_PARSER_LLM_CASSETTE_MODE"
+CASSETTE_LATENCY_ENV_VAR = "RESUME_PARSER_LLM_CASSETTE_LATENCY"
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+class CassetteMissError(FatalError):
+    """The replayed cassette has no recording for a prompt; retrying cannot help"""
+
+def prompt_hash(prompt, temperature=0.0, model=None):
+    """Key a recording by model, prompt text and temperature"""
+    # Backends without a model choice keep the original key, so their cassettes stay valid
+    key = f"{temperature}\n{prompt}" if model is None else f"{model}\n{temperature}\n{prompt}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+class Cassette:
+    """
+    Recordings of one cassette file
+
+    Every CassetteBackend on the same file shares one Cassette (see
+    open_cassette()), so the model tiers append through a single lock and
+    replay from a single set of positions.
+
+    Args:
+        path: JSONL cassette file
+        mode: MODE_RECORD or MODE_REPLAY
+    """
+    def __init__(self, path, mode=MODE_REPLAY):
+        self.path = Path(path)
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.recordings = {}   # prompt hash -> list of recordings, in recorded order
+        self.positions = {}    # prompt hash -> index of the next recording to replay
+
+        if mode == MODE_REPLAY:
+            self.load()
+            print(f"Replaying {sum(len(r) for r in self.recordings.values())} recorded calls from {self.path}")
+
+    def load(self):
+        """Read all recordings from the cassette file"""
+        self.recordings = {}
+        self.positions = {}
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    recording = json.loads(line)
+                except ValueError:
+                    # A partly written last line from an interrupted recording
+                    continue
+                self.recordings.setdefault(recording["prompt_hash"], []).append(recording)
+
+    def append(self, recording):
+        """Write a recording to the end of the file"""
+        line = json.dumps(recording) + "\n"
+        with self.lock:
+            os.makedirs(self.path.parent, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.recordings.setdefault(recording["prompt_hash"], []).append(recording)
+
+    def next_recording(self, key):
+        """The recording to replay for a prompt hash, or None if there is none"""
+        with self.lock:
+            recordings = self.recordings.get(key)
+            if not recordings:
+                return None
+            # Repeated prompts replay in recorded order; the last recording repeats
+            position = self.positions.get(key, 0)
+            self.positions[key] = position + 1
+            return recordings[min(position, len(recordings) - 1)]
+
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+def open_cassette(path, mode=MODE_REPLAY):
+    """The process-wide Cassette for a file and mode"""
+    key = (str(Path(path).resolve()), mode)
+    with _cassettes_lock:
+        if key not in _cassettes:
+            _cassettes[key] = Cassette(path, mode)
+        return _cassettes[key]
+
+class CassetteBackend(LLMBackend):
+    """
+    LLM backend that records another backend's calls or replays them from a file
+
+    Recordings are keyed by model as well as prompt, so tiers on different models
+    can share one cassette file without answering each other's calls.
+
+    Args:
+        path: JSONL cassette file
+        mode: MODE_RECORD or MODE_REPLAY
+        backend: Backend whose calls are recorded (not needed for replay)
+        replay_latency: Sleep for the recorded latency when replaying
+        time_scale: Multiplier applied to replayed latencies
+        model: Model the calls are for; defaults to the wrapped backend's model
+    """
+    name = "cassette"
+
+    def __init__(self, path, mode=MODE_REPLAY, backend=None, replay_latency=False, time_scale=1.0, model=None):
+        if mode not in (MODE_RECORD, MODE_REPLAY):
+            raise ValueError(f"Cassette mode must be '{MODE_RECORD}' or '{MODE_REPLAY}'")
+        if mode == MODE_RECORD and backend is None:
+            raise ValueError("Recording needs a backend to record from")
+
+        self.mode = mode
+        self.backend = backend
+        self.model = model or getattr(backend, "model", None)
+        self.replay_latency = replay_latency
+        self.time_scale = time_scale
+        self.cassette = open_cassette(path, mode)
+        self.path = self.cassette.path
+
+    def is_available(self):
+        if self.mode == MODE_RECORD:
+            return self.backend.is_available()
+        return True
+
+    def generate(self, prompt, temperature=0.0):
+        return self.generate_with_usage(prompt, temperature)[0]
+
+    def generate_with_usage(self, prompt, temperature=0.0, schema=None, prefix=None):
+        # Keyed by the full prompt text only, so cassettes stay valid when the schema
+        # changes or a prompt is split differently
+        key = prompt_hash(join_prompt(prefix, prompt), temperature, self.model)
+        if self.mode == MODE_RECORD:
+            return self._record(key, prompt, temperature, schema, prefix)
+        return self._replay(key, join_prompt(prefix, prompt))
+
+    def _record(self, key, prompt, temperature, schema=None, prefix=None):
+        start_time = time.perf_counter()
+        recording = {"prompt_hash": key, "backend": self.backend.name, "model": self.model,
+                     "recorded_at": time.time()}
+        try:
+            response, usage = self.backend.generate_with_usage(prompt, temperature, schema, prefix)
+            recording["response"] = response
+            recording["usage"] = usage
+            return response, usage
+        except Exception as e:
+            # Failures are part of the traffic too; replay raises them again
+            recording["error"] = str(e)
+            recording["error_class"] = self.backend.classify_error(e)
+            recording["status_code"] = getattr(e, "status_code", None)
+            recording["retry_after"] = getattr(e, "retry_after", None)
+            raise
+        finally:
+            recording["seconds"] = round(time.perf_counter() - start_time, 4)
+            self.cassette.append(recording)
+
+    def _replay(self, key, prompt):
+        recording = self.cassette.next_recording(key)
+        if recording is None:
+            model_text = f" on {self.model}" if self.model else ""
+            raise CassetteMissError(f"No recording for prompt {key[:12]}{model_text} in {self.path}")
+
+        if self.replay_latency:
+            time.sleep(recording.get("seconds", 0) * self.time_scale)
+
+        if "error" in recording:
+            raise make_error(recording.get("error_class"), recording["error"],
+                             recording.get("status_code"), recording.get("retry_after"))
+        response = recording["response"]
+        # Cassettes recorded before usage was captured only have the text
+        usage = recording.get("usage") or make_usage(estimate_tokens(prompt), estimate_tokens(response), True)
+        return response, usage
+
+    def count_tokens(self, text):
+        if self.mode == MODE_RECORD:
+            return self.backend.count_tokens(text)
+        return super().count_tokens(text)
+
+    def classify_error(self, error):
+        if self.mode == MODE_RECORD:
+            return self.backend.classify_error(error)
+        return super().classify_error(error)
+
+def get_cassette_mode():
+    """Cassette mode configured through the environment, or None"""
+    if not os.environ.get(CASSETTE_ENV_VAR):
+        return None
+    return os.environ.get(CASSETTE_MODE_ENV_VAR, MODE_REPLAY).strip().lower()
+
+def wrap_with_cassette(backend):
+    """
+    Wrap a backend in a cassette if one is configured through the environment
+
+    Returns:
+    - The backend unchanged, or a CassetteBackend recording or replaying it
+    """
+    mode = get_cassette_mode()
+    if mode is None:
+        return backend
+
+    replay_latency = os.environ.get(CASSETTE_LATENCY_ENV_VAR, "").strip().lower() in ("1", "true", "yes")
+    return CassetteBackend(os.environ[CASSETTE_ENV_VAR], mode=mode, backend=backend, replay_latency=replay_latency)
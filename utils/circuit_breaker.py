@@ -0,0 +1,94 @@
+"""
+Circuit breaker for LLM API calls.
+One breaker is shared by all of a processor's workers. After a run of consecutive
+transient failures (server errors, timeouts, unreachable backend) it opens and
+every call fails immediately instead of retrying against an API that is down.
+After a cool-down a single trial call is let through; its outcome closes the
+breaker again or re-opens it.
+"""
+
+import time
+import threading
+from utils.llm_backend import FatalError
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+class CircuitOpenError(FatalError):
+    """A call was refused because the circuit breaker is open"""
+    def __init__(self, retry_in):
+        super().__init__(f"LLM API unavailable; circuit breaker open, next attempt in {retry_in:.0f} s")
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """
+    Fail fast across all workers while the API is down
+
+    Args:
+        failure_threshold: Consecutive failures that open the breaker
+        reset_timeout: Seconds the breaker stays open before a trial call is allowed
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        """
+        Check that a call may be made
+
+        Raises:
+        - CircuitOpenError while the breaker is open, or while another worker's trial call is in flight
+        """
+        with self.lock:
+            if self.state == STATE_CLOSED:
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == STATE_OPEN and retry_in <= 0:
+                self.state = STATE_HALF_OPEN
+                self.trial_in_flight = False
+            if self.state == STATE_HALF_OPEN and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return
+            raise CircuitOpenError(max(retry_in, 0.0))
+
+    def record_success(self):
+        """Close the breaker and reset the failure count"""
+        with self.lock:
+            if self.state != STATE_CLOSED:
+                print("LLM API recovered; circuit breaker closed")
+            self.state = STATE_CLOSED
+            self.failures = 0
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        """
+        Count a failure that suggests the API is down
+
+        Returns:
+        - True if the breaker is open after this failure
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    print(f"LLM API failing ({self.failures} consecutive errors); "
+                          f"circuit breaker open for {self.reset_timeout:.0f} s")
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+            return self.state == STATE_OPEN
+
+    def release(self):
+        """Give up a half-open trial call that ended without a verdict (e.g. a rate limit)"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def is_open(self):
+        with self.lock:
+            return self.state != STATE_CLOSED
@@ -0,0 +1,203 @@
+"""
+Adaptive concurrency control for LLM API calls.
+Bounds the number of calls in flight with a limit that is adjusted by
+additive increase / multiplicative decrease (AIMD): while calls succeed at
+normal latency and the limit is in use, it grows by about one call per round
+of calls; a 429 or a p90 latency well above the lowest p90 seen cuts it by a
+constant factor. The limit settles just below the point where the API
+starts pushing back, so throughput stays close to quota without tuning the
+worker count per API key. Calls are not also paced by a fixed gap between
+them unless RESUME_PARSER_MIN_CALL_GAP sets one (see utils.gemini_processor).
+
+RESUME_PARSER_MAX_CONCURRENCY caps the limit; RESUME_PARSER_LATENCY_TARGET
+(seconds) fixes the p90 latency above which the limit is cut instead of
+deriving it from the baseline.
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from utils.metrics import CONCURRENCY_DECREASES, CONCURRENCY_LIMIT, IN_FLIGHT_CALLS
+from utils.scheduler import PRIORITY_NORMAL, priority_rank
+from utils.cancellation import CANCEL_POLL_INTERVAL
+
+MAX_CONCURRENCY_ENV_VAR = "RESUME_PARSER_MAX_CONCURRENCY"
+LATENCY_TARGET_ENV_VAR = "RESUME_PARSER_LATENCY_TARGET"
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+DECREASE_RATE_LIMIT = "rate_limit"
+DECREASE_LATENCY = "latency"
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of a non-empty sequence"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+class ConcurrencyLimiter:
+    """
+    AIMD limit on the number of concurrent API calls, shared by all workers
+
+    Args:
+        initial_limit: Starting limit
+        min_limit: Lowest limit; one call is always allowed
+        max_limit: Highest limit
+        increase: Calls added to the limit per round of successful calls
+        decrease_factor: Factor the limit is multiplied by on a 429 or high latency
+        latency_target: p90 latency in seconds above which the limit is cut; None
+            derives it as latency_tolerance times the lowest p90 seen
+        latency_tolerance: Multiple of the baseline p90 that counts as high latency
+        window: Number of recent call latencies the percentiles are taken over; they
+            are only judged once half of it is filled
+    """
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=DEFAULT_MAX_CONCURRENCY, increase=1.0,
+                 decrease_factor=0.5, latency_target=None, latency_tolerance=2.0, window=50):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Concurrency limits must satisfy 1 <= min_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.latency_tolerance = latency_tolerance
+        self.latencies = deque(maxlen=window)
+        self.baseline = None
+        self.in_flight = 0
+        self.waiting = []              # heap of (priority rank, arrival) of callers waiting for a slot
+        self.tickets = itertools.count()
+        self.decreased_at = 0.0
+        self.condition = threading.Condition()
+        CONCURRENCY_LIMIT.set(int(self.limit))
+
+    @classmethod
+    def from_env(cls, max_limit=None):
+        """
+        Build the limiter from RESUME_PARSER_MAX_CONCURRENCY and RESUME_PARSER_LATENCY_TARGET
+
+        Args:
+            max_limit: Cap to use when the environment sets none
+        """
+        max_limit = int(os.environ.get(MAX_CONCURRENCY_ENV_VAR) or max_limit or DEFAULT_MAX_CONCURRENCY)
+        latency_target = os.environ.get(LATENCY_TARGET_ENV_VAR)
+        return cls(initial_limit=min(4, max_limit), max_limit=max_limit,
+                   latency_target=float(latency_target) if latency_target else None)
+
+    @property
+    def current_limit(self):
+        """The limit as a whole number of calls"""
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None, token=None):
+        """
+        Wait for a free call slot
+
+        Slots go to waiting callers in priority order (see utils.scheduler), then in
+        order of arrival, so an interactive call overtakes queued batch calls.
+
+        Args:
+            priority: Priority of the call
+            timeout: Optional seconds to wait at most
+            token: Optional CancellationToken; a cancelled caller leaves the line
+
+        Returns:
+            bool: False if the timeout expired first
+
+        Raises:
+            TaskCancelledError if the token is cancelled while waiting
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        ticket = (priority_rank(priority), next(self.tickets))
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while self.in_flight >= self.current_limit or self.waiting[0] != ticket:
+                    if token is not None:
+                        token.check()
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    if token is not None:
+                        remaining = min(remaining, CANCEL_POLL_INTERVAL) if remaining is not None else CANCEL_POLL_INTERVAL
+                    self.condition.wait(remaining)
+                self.in_flight += 1
+                IN_FLIGHT_CALLS.set(self.in_flight)
+                return True
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                # The next waiter in line may be able to go now
+                self.condition.notify_all()
+
+    def release(self):
+        """Free a call slot without reporting an outcome, e.g. after a non-quota error"""
+        with self.condition:
+            self.in_flight -= 1
+            IN_FLIGHT_CALLS.set(self.in_flight)
+            self.condition.notify_all()
+
+    def wait_for_capacity(self, timeout=None):
+        """
+        Wait until a call slot is free, without taking it
+
+        Workers call this before taking a task, so that tasks stay in the fair
+        queue while the limit is reached rather than queueing up on call slots.
+        Slots wanted by callers already waiting in acquire() do not count as free.
+        Several workers may see the same free slot; the extra ones wait in acquire().
+
+        Returns:
+            bool: False if the timeout expired first
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while self.in_flight + len(self.waiting) >= self.current_limit:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def record_success(self, latency):
+        """
+        Report a successful call and its latency in seconds
+
+        Grows the limit when it was in use, or cuts it if recent latency is too high.
+        """
+        with self.condition:
+            self.latencies.append(latency)
+            if len(self.latencies) >= self.latencies.maxlen // 2:
+                p90 = _percentile(self.latencies, 90)
+                self.baseline = p90 if self.baseline is None else min(self.baseline, p90)
+                target = self.latency_target or self.baseline * self.latency_tolerance
+                if p90 > target:
+                    self._decrease(DECREASE_LATENCY)
+                    return
+
+            # Only grow a limit that is actually reached; idle capacity says nothing about the quota
+            if self.in_flight >= self.current_limit - 1:
+                self.limit = min(self.limit + self.increase / self.limit, float(self.max_limit))
+                CONCURRENCY_LIMIT.set(self.current_limit)
+                self.condition.notify_all()
+
+    def record_rate_limit(self):
+        """Report a call refused with a 429"""
+        with self.condition:
+            self._decrease(DECREASE_RATE_LIMIT)
+
+    def _decrease(self, reason):
+        """Cut the limit, at most once per round trip so one burst of errors counts once"""
+        now = time.monotonic()
+        cooldown = _percentile(self.latencies, 50) if self.latencies else 1.0
+        if now - self.decreased_at < cooldown:
+            return
+        self.decreased_at = now
+        self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+        if reason == DECREASE_LATENCY:
+            # Judge the new limit on fresh latencies only
+            self.latencies.clear()
+        CONCURRENCY_LIMIT.set(self.current_limit)
+        CONCURRENCY_DECREASES.inc(reason=reason)
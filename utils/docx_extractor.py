@@ -0,0 +1,147 @@
+"""
+Streaming DOCX text extraction for Resume Parser application.
+Text is read straight out of the WordprocessingML parts in the zip archive with
+incremental XML parsing, so no document object model is built. Table cells,
+text boxes, headers and footers are included, which python-docx's
+``doc.paragraphs`` misses.
+"""
+
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+W_P = W + "p"
+W_T = W + "t"
+W_TAB = W + "tab"
+W_BR = W + "br"
+W_CR = W + "cr"
+W_TC = W + "tc"
+W_TR = W + "tr"
+W_NO_BREAK_HYPHEN = W + "noBreakHyphen"
+W_PPR = W + "pPr"
+MC_FALLBACK = MC + "Fallback"
+
+HEADER_PART = re.compile(r"^word/header\d*\.xml$")
+FOOTER_PART = re.compile(r"^word/footer\d*\.xml$")
+
+def _part_sort_key(name):
+    """Sort header1.xml, header2.xml, ... numerically"""
+    digits = re.findall(r"\d+", name)
+    return int(digits[-1]) if digits else 0
+
+def get_text_parts(names):
+    """
+    Order the text-bearing parts of a DOCX archive
+
+    Headers come first (contact details often live there), then the body, footnotes
+    and endnotes, then footers.
+    """
+    headers = sorted((n for n in names if HEADER_PART.match(n)), key=_part_sort_key)
+    footers = sorted((n for n in names if FOOTER_PART.match(n)), key=_part_sort_key)
+    body = [n for n in ("word/document.xml", "word/footnotes.xml", "word/endnotes.xml") if n in names]
+    return headers + body + footers
+
+def iter_part_lines(stream):
+    """
+    Yield the text lines of one WordprocessingML part in document order
+
+    Each paragraph becomes a line; each table row becomes a line with its cells
+    separated by tabs. Paragraphs inside text boxes are emitted where the text box
+    is anchored. The VML fallback copy of a text box (mc:Fallback) is skipped so
+    its content is not duplicated.
+    """
+    paragraphs = []    # stack of text fragment lists, one per open paragraph
+    cells = []         # stack of paragraph lists, one per open table cell
+    rows = []          # stack of cell text lists, one per open table row
+    fallback_depth = 0
+    properties_depth = 0   # inside w:pPr, where w:tab defines a tab stop, not a tab
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+
+        if event == "start":
+            if tag == MC_FALLBACK:
+                fallback_depth += 1
+            elif fallback_depth:
+                continue
+            elif tag == W_PPR:
+                properties_depth += 1
+            elif tag == W_P:
+                paragraphs.append([])
+            elif tag == W_TC:
+                cells.append([])
+            elif tag == W_TR:
+                rows.append([])
+            continue
+
+        if tag == MC_FALLBACK:
+            fallback_depth -= 1
+        elif not fallback_depth:
+            if tag == W_T and paragraphs:
+                if elem.text:
+                    paragraphs[-1].append(elem.text)
+            elif tag == W_PPR:
+                properties_depth -= 1
+            elif tag == W_TAB and paragraphs and not properties_depth:
+                paragraphs[-1].append("\t")
+            elif tag in (W_BR, W_CR) and paragraphs:
+                paragraphs[-1].append("\n")
+            elif tag == W_NO_BREAK_HYPHEN and paragraphs:
+                paragraphs[-1].append("-")
+            elif tag == W_P:
+                text = "".join(paragraphs.pop())
+                # Any cell opened inside this paragraph has closed by now, so an open
+                # cell is the one the paragraph was opened in
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+            elif tag == W_TC:
+                cell_text = " ".join(p for p in cells.pop() if p.strip())
+                if rows:
+                    rows[-1].append(cell_text)
+            elif tag == W_TR:
+                row_text = "\t".join(rows.pop())
+                if cells:
+                    # Nested table: the row belongs to the enclosing cell
+                    cells[-1].append(row_text)
+                else:
+                    yield row_text
+
+        # Everything needed from this element has been read
+        elem.clear()
+
+def extract_docx_text(file_path, max_chars=None):
+    """
+    Extract text from a DOCX file by streaming its XML parts
+
+    Args:
+        file_path: Path to the DOCX file
+        max_chars: Stop reading once this many characters were collected
+
+    Returns:
+        Extracted text content
+    """
+    lines = []
+    total = 0
+
+    with zipfile.ZipFile(file_path) as archive:
+        for part in get_text_parts(set(archive.namelist())):
+            with archive.open(part) as stream:
+                for line in iter_part_lines(stream):
+                    lines.append(line)
+                    total += len(line) + 1
+                    if max_chars is not None and total >= max_chars:
+                        text = "\n".join(lines)
+                        return text[:max_chars]
+
+    return "\n".join(lines)
+
+def extract_with_python_docx(file_path):
+    """Extract body paragraphs with python-docx (the previous implementation)"""
+    import docx
+    doc = docx.Document(file_path)
+    return "\n".join([p.text for p in doc.paragraphs])
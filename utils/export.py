@@ -1,4 +1,3 @@
-import pandas as pd
 import io
 
 def export_to_excel(df):
@@ -11,6 +10,8 @@ def export_to_excel(df):
     Returns:
         BytesIO object containing the Excel file
     """
+    import pandas as pd  # deferred so importing utils stays cheap
+
     try:
         output = io.BytesIO()
         
@@ -1,120 +1,238 @@
 import os
 import uuid
+import hashlib
+import time
+import zipfile
 from pathlib import Path
-import PyPDF2
-import docx
-import pdfplumber
-import fitz  # PyMuPDF
+from utils.metrics import STAGE_EXTRACTION, STAGE_UPLOAD_SAVE, EXTRACTION_SECONDS, UPLOADS, time_stage
+from utils.pdf_extractor import MAX_TEXT_CHARS, char_budget, extract_pdf_text
+from utils.docx_extractor import extract_docx_text, extract_with_python_docx
 
-def save_uploaded_files(uploaded_files):
+# The PDF and DOCX libraries (PyMuPDF, pdfplumber, PyPDF2, python-docx) are imported
+# inside the extractors that use them, so importing this module stays cheap and a
+# worker only pays for the formats it actually sees.
+
+UPLOAD_DIR = Path("data/uploads")
+QUARANTINE_DIR = Path("data/quarantine")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
+# Leading bytes every well-formed file of each type starts with
+FILE_SIGNATURES = {
+    ".pdf": b"%PDF-",
+    ".docx": b"PK\x03\x04",
+    ".doc": b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",
+}
+
+def save_uploaded_files(uploaded_files, rejected=None):
     """
-    Save uploaded files to the uploads directory with unique filenames
+    Save uploaded files to the uploads directory, named by content hash
+    
+    Each upload is streamed to disk in chunks while its SHA-256 is computed in the
+    same pass. If a file with the same content is already stored, the existing copy
+    is reused, so its content-addressed parse results are reused too. Files over
+    MAX_UPLOAD_BYTES are dropped and malformed files are moved to QUARANTINE_DIR.
     
     Args:
         uploaded_files: List of uploaded file objects from Streamlit
+        rejected: Optional list that receives (file name, reason) for skipped files
         
     Returns:
         List of paths to the saved files
     """
     saved_paths = []
-    upload_dir = Path("data/uploads")
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
     
     for uploaded_file in uploaded_files:
-        file_extension = Path(uploaded_file.name).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
-        
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        
-        saved_paths.append(str(file_path))
+        with time_stage(STAGE_UPLOAD_SAVE):
+            file_path = _save_uploaded_file(uploaded_file, rejected)
+        if file_path is not None:
+            saved_paths.append(file_path)
     
     return saved_paths
 
-def get_text_from_file(file_path):
+def _save_uploaded_file(uploaded_file, rejected=None):
+    """
+    Stream, validate and store one upload
+    
+    Returns:
+        Path of the stored file, or None if the upload was rejected
+    """
+    file_extension = Path(uploaded_file.name).suffix.lower()
+    temp_path = UPLOAD_DIR / f".{uuid.uuid4()}{file_extension}.part"
+    
+    try:
+        content_hash, error = _stream_to_file(uploaded_file, temp_path)
+        if error is None:
+            error = _validate_file(temp_path, file_extension)
+            if error is not None:
+                QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_path, QUARANTINE_DIR / f"{content_hash}{file_extension}")
+    except Exception as e:
+        error = f"could not be saved: {e}"
+    
+    if error is not None:
+        print(f"Rejected upload {uploaded_file.name}: {error}")
+        UPLOADS.inc(outcome="rejected")
+        if rejected is not None:
+            rejected.append((uploaded_file.name, error))
+        if temp_path.exists():
+            temp_path.unlink()
+        return None
+    
+    file_path = UPLOAD_DIR / f"{content_hash}{file_extension}"
+    if file_path.exists():
+        # Same bytes already stored: keep the existing file
+        temp_path.unlink()
+        UPLOADS.inc(outcome="duplicate")
+    else:
+        os.replace(temp_path, file_path)
+        UPLOADS.inc(outcome="saved")
+    
+    return str(file_path)
+
+def _stream_to_file(uploaded_file, file_path):
+    """
+    Copy an uploaded file to disk in chunks, hashing it on the way
+    
+    Returns:
+        Tuple of (hex digest, error message or None)
+    """
+    digest = hashlib.sha256()
+    size = 0
+    uploaded_file.seek(0)
+    
+    with open(file_path, "wb") as f:
+        for chunk in iter(lambda: uploaded_file.read(UPLOAD_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                return None, f"exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"
+            digest.update(chunk)
+            f.write(chunk)
+    
+    if size == 0:
+        return None, "is empty"
+    
+    return digest.hexdigest(), None
+
+def _validate_file(file_path, file_extension):
+    """
+    Cheap structural check of a stored upload
+    
+    Returns:
+        Error message if the file is malformed, otherwise None
+    """
+    signature = FILE_SIGNATURES.get(file_extension)
+    if signature is not None:
+        with open(file_path, "rb") as f:
+            head = f.read(1024)
+        # PDF writers may put junk before the header, so search the first KB
+        if (file_extension == ".pdf" and signature not in head) or \
+           (file_extension != ".pdf" and not head.startswith(signature)):
+            return f"is not a valid {file_extension} file"
+    
+    if file_extension == ".docx":
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                if "word/document.xml" not in archive.namelist():
+                    return "is not a valid .docx file (missing word/document.xml)"
+        except zipfile.BadZipFile:
+            return "is not a valid .docx file (corrupt archive)"
+    
+    return None
+
+def get_file_hash(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's content
+    
+    Args:
+        file_path: Path to the file
+        chunk_size: Number of bytes to read at a time
+        
+    Returns:
+        Hex digest identifying the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_text_from_file(file_path, max_chars=MAX_TEXT_CHARS, max_tokens=None):
     """
     Extract raw text content from a file without preprocessing
     
     Args:
         file_path: Path to the file
+        max_chars: Maximum number of characters to return (None for no limit)
+        max_tokens: Optional token budget, converted to characters
         
     Returns:
         Raw extracted text content ready for Gemini processing
     """
     file_extension = Path(file_path).suffix.lower()
+    max_chars = char_budget(max_chars, max_tokens)
     
     try:
-        if file_extension == ".pdf":
-            raw_text = extract_text_from_pdf(file_path)
-        elif file_extension == ".docx":
-            raw_text = extract_text_from_docx(file_path)
-        elif file_extension == ".txt":
-            raw_text = extract_text_from_txt(file_path)
-        else:
-            return f"Unsupported file format: {file_extension}"
+        with time_stage(STAGE_EXTRACTION):
+            start_time = time.perf_counter()
+            if file_extension == ".pdf":
+                # The PDF router records the time of the engine it picked
+                raw_text = extract_text_from_pdf(file_path, max_chars)
+            elif file_extension == ".docx":
+                raw_text = extract_text_from_docx(file_path, max_chars)
+                EXTRACTION_SECONDS.observe(time.perf_counter() - start_time, engine="docx")
+            elif file_extension == ".txt":
+                raw_text = extract_text_from_txt(file_path)
+                EXTRACTION_SECONDS.observe(time.perf_counter() - start_time, engine="txt")
+            else:
+                return f"Unsupported file format: {file_extension}"
         
-        return raw_text
+        return raw_text[:max_chars] if max_chars is not None else raw_text
     except Exception as e:
         print(f"Error extracting text from {file_path}: {e}")
         return ""
 
-def extract_text_from_pdf(file_path):
+def extract_text_from_pdf(file_path, max_chars=MAX_TEXT_CHARS, max_tokens=None):
     """
-    Extract raw text from PDF using multiple methods for better reliability
+    Extract raw text from PDF with the engine best suited to the file
+    
+    A quick look at the first pages decides whether the file has a text layer, so
+    each PDF is parsed once by one engine. Extraction stops once the character (or
+    token) budget is reached.
     
     Args:
         file_path: Path to the PDF file
+        max_chars: Character budget (None to read the whole document)
+        max_tokens: Optional token budget, converted to characters
         
     Returns:
         Extracted text content
     """
-    text = ""
+    return extract_pdf_text(file_path, char_budget(max_chars, max_tokens))
 
-    # Try PyMuPDF first (usually most reliable)
-    try:
-        with fitz.open(file_path) as pdf:
-            for page in pdf:
-                text += page.get_text("text") + "\n"
-        if text.strip():
-            return text
-    except Exception as e:
-        print(f"PyMuPDF failed: {e}")
-
-    # Fall back to pdfplumber if PyMuPDF fails
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        if text.strip():
-            return text
-    except Exception as e:
-        print(f"pdfplumber failed: {e}")
-
-    # Last resort: PyPDF2
-    try:
-        with open(file_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-    except Exception as e:
-        print(f"PyPDF2 failed: {e}")
-
-    return text.strip()
-
-def extract_text_from_docx(file_path):
+def extract_text_from_docx(file_path, max_chars=None):
     """
     Extract raw text from DOCX file
     
+    The XML parts are streamed out of the archive, which is faster than building the
+    python-docx object model and also picks up tables, text boxes, headers and
+    footers. python-docx is only used if the streaming parser cannot read the file.
+    
     Args:
         file_path: Path to the DOCX file
+        max_chars: Stop reading once this many characters were collected
         
     Returns:
         Extracted text content
     """
     try:
-        doc = docx.Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
+        return extract_docx_text(file_path, max_chars)
+    except Exception as e:
+        print(f"Streaming DOCX extraction failed for {file_path}: {e}")
+    
+    try:
+        return extract_with_python_docx(file_path)
     except Exception as e:
         print(f"Error reading DOCX file {file_path}: {e}")
         return ""
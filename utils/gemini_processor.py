@@ -6,71 +6,403 @@ This module handles communication with Google's Generative AI API.
 import os
 import json
 import time
+import heapq
 import random
+import hashlib
+import itertools
 import threading
-from queue import Queue
 import concurrent.futures
-from pathlib import Path
-from utils.file_handler import get_text_from_file
-
-# Check if Google Generative AI is available
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
+from collections import OrderedDict
+from utils.file_handler import get_text_from_file, get_file_hash
+from utils.pdf_extractor import MAX_TEXT_CHARS
+from utils.job_store import STATUS_CANCELLED, STATUS_COMPLETED, STATUS_FAILED, JobStore
+from utils.scheduler import (DEFAULT_SESSION_ID, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, FairQueue,
+                             priority_rank)
+from utils.llm_backend import (GEMINI_AVAILABLE, ERROR_FATAL, ERROR_RATE_LIMIT, estimate_tokens, join_prompt,
+                               make_error, streaming_enabled)
+from utils.json_stream import FieldStream
+from utils.structured_output import MATCH_SCHEMA, RESUME_SCHEMA, parse_json_object, subschema, validate
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.concurrency_limiter import ConcurrencyLimiter
+from utils.cancellation import (CANCEL_POLL_INTERVAL, REASON_CANCELLED, CancellationToken, TaskCancelledError,
+                                default_deadline)
+from utils.model_router import TIER_FAST, ModelRouter
+from utils.metrics import (STAGE_API_CALL, STAGE_CONCURRENCY_WAIT, STAGE_PROMPT_BUILD, STAGE_RATE_LIMIT_WAIT,
+                           STAGE_RESPONSE_PARSE,
+                           API_CALLS, BUDGET_REFUSALS, CIRCUIT_OPEN, ESCALATIONS, TASKS_CANCELLED, FIRST_FIELD_SECONDS, FOLLOW_UPS,
+                           RATE_LIMIT_DELAY, RESPONSE_PARSES, RESULTS_EVICTED, RETAINED_RESULTS, RETRIES,
+                           ROUTED_CALLS, STREAMS_STOPPED_EARLY, TOKENS, time_stage)
+from utils.memory import deep_sizeof
+from utils.resume_record import ResumeRecord, compact
+from utils.token_ledger import (ACTION_DEGRADE, EXPECTED_OUTPUT_TOKENS, KIND_FOLLOW_UP, KIND_RESUME, BudgetExceededError,
+                                TokenBudget, TokenLedger, accounting, current_accounting)
+
+if not GEMINI_AVAILABLE:
     print("Google Generative AI package not available. Install it using: pip install google-generativeai")
 
+# Minimum seconds between the starts of two API calls. The adaptive concurrency limiter
+# already bounds the calls in flight, and a gap on top of it would cap throughput at one
+# call per gap whatever the limit, so there is none by default: the RateLimiter then only
+# holds calls for Retry-After and gives a rate-limited call its backoff.
+MIN_CALL_GAP_ENV_VAR = "RESUME_PARSER_MIN_CALL_GAP"
+DEFAULT_MIN_CALL_GAP = 0.0
+
+# Delay the first 429 backs off from when calls have no minimum gap
+RATE_LIMIT_BACKOFF_BASE = 1.0
+
 class RateLimiter:
     """
     Implements rate limiting for API calls with adaptive backoff
+    
+    Parameters:
+    - initial_delay: Minimum seconds between call starts; each 429 raises the delay and
+      each success lets it decay back to this. With 0, calls are never spaced out and
+      the delay is only the backoff a rate-limited call sleeps before retrying
+    - max_delay: Highest delay
+    - backoff_factor: Factor the delay is multiplied by on a 429
+    - min_backoff: Delay a 429 backs off from; defaults to initial_delay, or
+      RATE_LIMIT_BACKOFF_BASE when that is zero
     """
-    def __init__(self, initial_delay=1, max_delay=60, backoff_factor=1.5):
+    def __init__(self, initial_delay=1, max_delay=60, backoff_factor=1.5, min_backoff=None):
+        self.initial_delay = initial_delay
         self.current_delay = initial_delay
         self.max_delay = max_delay
         self.backoff_factor = backoff_factor
+        self.min_backoff = min_backoff if min_backoff is not None else (initial_delay or RATE_LIMIT_BACKOFF_BASE)
         self.last_request_time = 0
+        self.hold_until = 0
         self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.waiting = []    # heap of (priority rank, arrival) of callers waiting for their turn
+        self.tickets = itertools.count()
+    
+    @classmethod
+    def from_env(cls):
+        """Build the rate limiter with the minimum gap set by RESUME_PARSER_MIN_CALL_GAP"""
+        return cls(initial_delay=float(os.environ.get(MIN_CALL_GAP_ENV_VAR) or DEFAULT_MIN_CALL_GAP))
+    
+    def wait(self, priority=PRIORITY_NORMAL, token=None):
+        """
+        Wait the appropriate amount of time before next request
+        
+        Waiting callers go in priority order, then in order of arrival, so an
+        interactive call takes the next free turn ahead of queued batch calls.
+        A caller whose cancellation token is cancelled leaves the line with
+        TaskCancelledError, handing its turn to the next one.
+        """
+        ticket = (priority_rank(priority), next(self.tickets))
+        poll = CANCEL_POLL_INTERVAL if token is not None else None
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            # Wake the caller currently at the front, in case this one overtakes it
+            self.condition.notify_all()
+            try:
+                while True:
+                    if token is not None:
+                        token.check()
+                    if self.waiting[0] == ticket:
+                        now = time.time()
+                        gap = self.current_delay if self.initial_delay > 0 else 0
+                        resume_at = max(self.last_request_time + gap, self.hold_until)
+                        if now >= resume_at:
+                            break
+                        self.condition.wait(min(resume_at - now, poll or resume_at - now))
+                    else:
+                        self.condition.wait(poll)
+                self.last_request_time = time.time()
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
     
-    def wait(self):
-        """Wait the appropriate amount of time before next request"""
+    def hold(self, seconds):
+        """Hold back every worker's next request for a server-requested delay (Retry-After)"""
         with self.lock:
-            elapsed = time.time() - self.last_request_time
-            if elapsed < self.current_delay:
-                time.sleep(self.current_delay - elapsed)
-            self.last_request_time = time.time()
+            self.hold_until = max(self.hold_until, time.time() + seconds)
     
     def success(self):
         """Call after successful request to gradually decrease wait time"""
         with self.lock:
             # Gradually decrease delay after successful calls, but not below initial
-            self.current_delay = max(self.current_delay / 1.2, 1)
+            self.current_delay = max(self.current_delay / 1.2, self.initial_delay)
     
     def failure(self):
         """Call after rate limit failure to increase wait time"""
         with self.lock:
             # Increase delay with some randomness to avoid synchronized retries
             jitter = random.uniform(0.8, 1.2)
-            self.current_delay = min(self.current_delay * self.backoff_factor * jitter, self.max_delay)
+            self.current_delay = min(max(self.current_delay, self.min_backoff) * self.backoff_factor * jitter,
+                                     self.max_delay)
             return self.current_delay
 
+DEFAULT_BATCH_ID = "default"
+RECOVERED_BATCH_ID = "recovered"
+
+# Retention of finished results in memory; the job store keeps them beyond that
+RESULT_TTL_ENV_VAR = "RESUME_PARSER_RESULT_TTL"
+MAX_RESULTS_ENV_VAR = "RESUME_PARSER_MAX_RESULTS"
+DEFAULT_RESULT_TTL = 3600
+DEFAULT_MAX_RESULTS = 500
+
+# Seconds between sweeps for results past their TTL
+EVICTION_INTERVAL = 5.0
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+UNKNOWN_RESULT = {"status": "unknown", "data": None, "error": None}
+EXPIRED_RESULT = {"status": "expired", "data": None, "error": "Result is no longer retained"}
+
+# Longest server-requested retry delay honoured; longer ones are capped
+MAX_RETRY_AFTER = 120
+
+# Backoff for server errors and timeouts without a Retry-After: base * 2^attempt, capped
+TRANSIENT_BACKOFF_BASE = 1.0
+TRANSIENT_BACKOFF_MAX = 30.0
+
+# Fields a results row needs first; a task's "preview_at" records when they had all streamed in
+RESUME_PREVIEW_FIELDS = ('name', 'email')
+MATCH_PREVIEW_FIELDS = ('name', 'email', 'match_score')
+
+# Resume text lengths tried, in order, when a degrading budget would otherwise be exceeded
+DEGRADED_TEXT_CHARS = (12000, 4000)
+
+# Resume text sent with a follow-up for missing fields; the full text was already paid for once
+FOLLOW_UP_TEXT_CHARS = 4000
+
 class ProcessingQueue:
     """
-    Manages a queue of resume processing tasks with rate limiting
+    Manages a queue of resume processing tasks with rate limiting.
+    Task IDs are derived from file content, so identical resumes submitted more than
+    once share a single in-flight future and are only sent to the API once. Results
+    are namespaced per batch.
+    When a JobStore is supplied, every state transition is persisted so that
+    unfinished work is recovered after a restart and completed work is never redone.
+    A pool of worker threads serves the priority lanes of a FairQueue (interactive,
+    normal, background) and, within a lane, sessions by weighted fair queuing, all
+    sharing the processor's single rate limiter.
+    Tasks refused by a token budget are paused rather than failed, and can be
+    resumed once the budget allows.
+    Each task carries a CancellationToken tied to its batch's token; cancelled or
+    expired tasks are skipped when dequeued and stop before their next API call.
+    Finished results are kept in memory for result_ttl seconds after they were
+    last read, and at most max_results of them, least recently used first out.
+    An evicted result is read back from the JobStore when asked for again.
+    Batches only hold task IDs and are dropped once idle past the TTL.
     """
-    def __init__(self, processor):
+    def __init__(self, processor, store=None, workers=1, result_ttl=None, max_results=None):
         self.processor = processor
-        self.queue = Queue()
-        self.results = {}
+        self.store = store
+        self.queue = FairQueue()
+        self.tasks = OrderedDict()  # task_id -> shared result entry, least recently used first
+        self.batches = OrderedDict()  # batch_id -> {task_id: None} in queueing order, least recently used first
+        self.batch_used = {}  # batch_id -> time the batch was last queued to or read
+        self.futures = {}    # task_id -> Future for queued or in-flight tasks
+        self.paused = {}     # task_id -> queue item of tasks refused by a token budget
+        self.tokens = {}     # task_id -> CancellationToken of queued, paused or in-flight tasks
+        self.batch_tokens = {}  # batch_id -> CancellationToken
+        self.result_ttl = float(result_ttl or os.environ.get(RESULT_TTL_ENV_VAR) or DEFAULT_RESULT_TTL)
+        self.max_results = int(max_results or os.environ.get(MAX_RESULTS_ENV_VAR) or DEFAULT_MAX_RESULTS)
+        self.evicted_at = 0.0
+        self.workers = workers
         self.processing = False
-        self.worker_thread = None
+        self.worker_threads = []
         self.lock = threading.Lock()
     
-    def add_task(self, file_path, user_filters=None, callback=None):
-        """Add a resume processing task to the queue"""
-        task_id = str(Path(file_path).stem)
-        self.queue.put((task_id, file_path, user_filters))
-        self.results[task_id] = {"status": "queued", "data": None, "error": None}
+    @staticmethod
+    def make_task_id(file_path, user_filters=None):
+        """
+        Derive a content-addressed task ID
+
+        The same file bytes analysed with the same filters always map to the same ID,
+        regardless of the file's name or location.
+        """
+        task_id = get_file_hash(file_path)
+        if user_filters:
+            filters_json = json.dumps(user_filters, sort_keys=True, default=str)
+            task_id += "-" + hashlib.sha256(filters_json.encode("utf-8")).hexdigest()[:16]
+        return task_id
+    
+    def _register(self, task_id, batch_id, entry):
+        """Attach a result entry to a batch namespace (caller holds the lock)"""
+        self.tasks[task_id] = entry
+        self._touch(task_id, entry)
+        self.batches.setdefault(batch_id, {})[task_id] = None
+        self._touch_batch(batch_id)
+        self._evict()
+    
+    def _touch(self, task_id, entry):
+        """Mark an entry as just used (caller holds the lock)"""
+        entry["used_at"] = time.time()
+        self.tasks.move_to_end(task_id)
+    
+    def _touch_batch(self, batch_id):
+        """Mark a batch namespace as just used (caller holds the lock)"""
+        self.batch_used[batch_id] = time.time()
+        self.batches.move_to_end(batch_id)
+    
+    def _entry(self, task_id):
+        """
+        Result entry of a task, read back from the store if it was evicted (caller holds the lock)
+        
+        Returns:
+        - The entry, or None if the task is unknown or its result is no longer kept anywhere
+        """
+        entry = self.tasks.get(task_id)
+        if entry is not None:
+            self._touch(task_id, entry)
+            return entry
+        if self.store is None:
+            return None
+        stored = self.store.get(task_id)
+        if stored is None or stored["status"] not in (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED):
+            return None
+        entry = {"status": stored["status"], "data": compact(stored["result"]), "error": stored["error"],
+                 "finished_at": stored["updated_at"]}
+        self.tasks[task_id] = entry
+        self._touch(task_id, entry)
+        self._evict()
+        return entry
+    
+    def _evict(self):
+        """
+        Drop finished entries past the TTL or over the cap, and batches idle past the TTL
+        (caller holds the lock)
+        
+        Completed results are already in the store, if there is one, and are read back on demand.
+        """
+        now = time.time()
+        unfinished = len(self.futures) + len(self.paused)
+        excess = len(self.tasks) - unfinished - self.max_results
+        if excess <= 0 and now - self.evicted_at < EVICTION_INTERVAL:
+            return
+        self.evicted_at = now
+        expired_before = now - self.result_ttl
+        
+        evicted = []
+        for task_id, entry in self.tasks.items():
+            if excess <= 0 and entry["used_at"] >= expired_before:
+                break
+            if entry["status"] in FINISHED_STATUSES:
+                evicted.append((task_id, "capacity" if excess > 0 else "ttl"))
+                excess -= 1
+        for task_id, reason in evicted:
+            del self.tasks[task_id]
+            RESULTS_EVICTED.inc(reason=reason)
+        
+        idle = []
+        for batch_id in self.batches:
+            if self.batch_used[batch_id] >= expired_before:
+                break
+            if not any(task_id in self.futures or task_id in self.paused for task_id in self.batches[batch_id]):
+                idle.append(batch_id)
+        for batch_id in idle:
+            del self.batches[batch_id]
+            del self.batch_used[batch_id]
+            self.batch_tokens.pop(batch_id, None)
+        
+        RETAINED_RESULTS.set(len(self.tasks))
+    
+    def _batch_token(self, batch_id):
+        """Cancellation token of a batch (caller holds the lock)"""
+        token = self.batch_tokens.get(batch_id)
+        if token is None:
+            token = self.batch_tokens[batch_id] = CancellationToken()
+        return token
+    
+    def recover_tasks(self):
+        """Re-queue tasks that were queued or in flight when the previous process stopped"""
+        if self.store is None:
+            return []
+        
+        recovered = self.store.recover()
+        with self.lock:
+            for task in recovered:
+                entry = {"status": "queued", "data": None, "error": None, "queued_at": time.time(),
+                         "batch_id": RECOVERED_BATCH_ID, "session_id": RECOVERED_BATCH_ID}
+                self._register(task["task_id"], RECOVERED_BATCH_ID, entry)
+                self.futures[task["task_id"]] = concurrent.futures.Future()
+                token = self.tokens[task["task_id"]] = CancellationToken(
+                    default_deadline(), [self._batch_token(RECOVERED_BATCH_ID)])
+                # Nobody is waiting on screen for these, so they yield to current work
+                entry["priority"] = PRIORITY_BACKGROUND
+                self.queue.put((task["task_id"], task["file_path"], task["user_filters"], token),
+                               session_id=RECOVERED_BATCH_ID, priority=PRIORITY_BACKGROUND)
+        
+        if recovered:
+            print(f"Recovered {len(recovered)} unfinished tasks from {self.store.path}")
+            self.start_processing()
+        
+        return [task["task_id"] for task in recovered]
+    
+    def add_task(self, file_path, user_filters=None, callback=None, batch_id=None, session_id=None,
+                 priority=PRIORITY_NORMAL, deadline=None):
+        """
+        Add a resume processing task to the queue
+
+        Parameters:
+        - file_path: Path to the document file
+        - user_filters: Optional dictionary containing user's filter preferences
+        - callback: Optional function called with (task_id, result) once the task finishes
+        - batch_id: Namespace for the task's result; defaults to a shared batch
+        - session_id: Session the task is scheduled under for fair sharing of workers
+        - priority: Lane the task waits in (PRIORITY_INTERACTIVE, PRIORITY_NORMAL or PRIORITY_BACKGROUND)
+        - deadline: Optional epoch time after which the task is abandoned; defaults
+          to RESUME_PARSER_TASK_DEADLINE seconds from now, if set
+
+        Returns:
+        - Content-addressed task ID
+        """
+        task_id = self.make_task_id(file_path, user_filters)
+        batch_id = batch_id or DEFAULT_BATCH_ID
+        if deadline is None:
+            deadline = default_deadline()
+        
+        with self.lock:
+            future = self.futures.get(task_id)
+            entry = self.tasks.get(task_id)
+            batch_token = self._batch_token(batch_id)
+            
+            token = self.tokens.get(task_id)
+            if future is not None and token is not None and token.cancelled:
+                # Cancelled but still stopping: the new request gets a run of its own
+                future = None
+            elif future is not None and token is not None and batch_token not in token.parents:
+                # Another batch now waits on the same task: it runs until both are cancelled
+                token.add_parent(batch_token)
+                token.extend_deadline(deadline)
+            
+            if (future is None and entry is not None and entry["status"] == "completed"
+                    and not (entry["data"] or {}).get("error")):
+                # Same content already analysed in this process; an error record (e.g. from an
+                # outage) is not reused but retried, as the job store does
+                future = concurrent.futures.Future()
+                future.set_result(entry["data"])
+            
+            if future is None and self.store is not None:
+                stored = self.store.enqueue(task_id, file_path, user_filters)
+                if stored["status"] == "completed":
+                    # Already paid for in an earlier run; serve the stored result
+                    entry = {"status": "completed", "data": compact(stored["result"]), "error": None}
+                    future = concurrent.futures.Future()
+                    future.set_result(entry["data"])
+            
+            if future is None:
+                # Nothing in flight for this content yet: queue it; tokens are charged to
+                # the batch and session that queued it first
+                entry = {"status": "queued", "data": None, "error": None, "queued_at": time.time(),
+                         "batch_id": batch_id, "session_id": session_id, "priority": priority}
+                future = concurrent.futures.Future()
+                self.futures[task_id] = future
+                self.paused.pop(task_id, None)
+                token = self.tokens[task_id] = CancellationToken(deadline, [batch_token])
+                self.queue.put((task_id, file_path, user_filters, token), session_id=session_id,
+                               priority=priority)
+            
+            # Duplicates coalesce onto the existing entry and future
+            self._register(task_id, batch_id, entry)
+        
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(task_id, f.result() if not f.exception() else None))
         
         # Start processing if not already running
         if not self.processing:
@@ -78,105 +410,363 @@ class ProcessingQueue:
         
         return task_id
     
+    def get_future(self, task_id):
+        """Get the shared future of a queued or in-flight task, or None"""
+        with self.lock:
+            return self.futures.get(task_id)
+    
     def start_processing(self):
-        """Start the background processing thread"""
-        if not self.processing:
+        """Start the background worker threads"""
+        with self.lock:
+            if self.processing:
+                return
             self.processing = True
-            self.worker_thread = threading.Thread(target=self._process_queue)
-            self.worker_thread.daemon = True
-            self.worker_thread.start()
+            for _ in range(self.workers):
+                worker_thread = threading.Thread(target=self._process_queue)
+                worker_thread.daemon = True
+                worker_thread.start()
+                self.worker_threads.append(worker_thread)
+    
+    def resume_paused(self):
+        """
+        Re-queue tasks that were paused by a token budget
+
+        Returns:
+        - List of re-queued task IDs
+        """
+        with self.lock:
+            paused, self.paused = self.paused, {}
+            for task_id, item in paused.items():
+                self.tokens[task_id] = item[3]
+                entry = self.tasks[task_id]
+                entry.update({"status": "queued", "error": None, "queued_at": time.time()})
+                self.futures[task_id] = concurrent.futures.Future()
+                self.queue.put(item, session_id=entry.get("session_id"),
+                               priority=entry.get("priority", PRIORITY_NORMAL))
+        
+        if paused:
+            self.start_processing()
+        return list(paused)
     
     def _process_queue(self):
-        """Process queue items one by one with rate limiting"""
-        while not self.queue.empty():
-            # Get the next task
-            task_id, file_path, user_filters = self.queue.get()
+        """
+        Process queue items as they arrive; the shared rate limiter paces the API calls
+        and the processor's concurrency limiter decides how many workers are busy at once
+        """
+        while True:
+            # Leave tasks queued (and fairly ordered) while the concurrency limit is reached
+            self.processor.concurrency.wait_for_capacity()
+            
+            # Get the next task, taking turns between sessions
+            task_id, file_path, user_filters, token = self.queue.get()
+            
+            # Skip tasks cancelled or expired while they waited, before any extraction or API call
+            if token.cancelled:
+                self._finish_cancelled(task_id, token, token.cancelled, "queued")
+                self.queue.task_done()
+                continue
             
             # Update status to processing
             with self.lock:
-                self.results[task_id]["status"] = "processing"
+                entry = self.tasks[task_id]
+                entry["status"] = "processing"
+                entry["started_at"] = time.time()
+                future = self.futures[task_id]
+            if self.store is not None:
+                self.store.mark_processing(task_id)
             
             try:
-                # Process the resume
-                if user_filters:
-                    result = self.processor.analyze_document_with_filters(file_path, user_filters)
-                else:
-                    result = self.processor.analyze_document(file_path)
+                # Process the resume, charging its tokens to the task's batch and session
+                with accounting(task_id=task_id, batch_id=entry.get("batch_id"),
+                                session_id=entry.get("session_id"), kind=KIND_RESUME,
+                                priority=entry.get("priority"), cancel_token=token):
+                    preview_fields = MATCH_PREVIEW_FIELDS if user_filters else RESUME_PREVIEW_FIELDS
+                    on_partial = lambda fields, entry=entry: self._publish_partial(entry, fields, preview_fields)
+                    if user_filters:
+                        result = self.processor.analyze_document_with_filters(file_path, user_filters,
+                                                                              on_partial=on_partial)
+                    else:
+                        result = self.processor.analyze_document(file_path, on_partial=on_partial)
                 
-                # Store the result
+                # Store the result; every batch holding this entry sees the update
                 with self.lock:
-                    self.results[task_id] = {
+                    entry.update({
                         "status": "completed",
                         "data": result,
-                        "error": None
-                    }
+                        "error": None,
+                        "finished_at": time.time()
+                    })
+                    self._forget(task_id, entry, future)
+                
+                if self.store is not None:
+                    # Error records are shown to the user but not cached, so a later run retries them
+                    if result and result.get('error'):
+                        self.store.mark_failed(task_id, result['error'])
+                    else:
+                        self.store.mark_completed(task_id, result)
+                
+                future.set_result(result)
+            
+            except BudgetExceededError as e:
+                # Not a failure: the task waits until the budget allows it
+                print(f"Paused task {task_id}: {e}")
+                with self.lock:
+                    entry.update({"status": "paused", "error": str(e), "finished_at": time.time()})
+                    if self.futures.get(task_id) is future:
+                        self.paused[task_id] = (task_id, file_path, user_filters, token)
+                    self._forget(task_id, entry, future, keep_token=True)
+                if self.store is not None:
+                    self.store.mark_paused(task_id, str(e))
+                
+                future.set_exception(e)
+            
+            except TaskCancelledError as e:
+                self._finish_cancelled(task_id, token, e.reason, "processing", entry, future)
             
             except Exception as e:
                 with self.lock:
-                    self.results[task_id] = {
+                    entry.update({
                         "status": "failed",
                         "data": None,
-                        "error": str(e)
-                    }
+                        "error": str(e),
+                        "finished_at": time.time()
+                    })
+                    self._forget(task_id, entry, future)
+                if self.store is not None:
+                    self.store.mark_failed(task_id, str(e))
+                
+                future.set_exception(e)
             
             self.queue.task_done()
+    
+    def _forget(self, task_id, entry, future, keep_token=False):
+        """
+        Drop a finished run's future and token (caller holds the lock)
         
-        self.processing = False
+        Left alone if the task was resubmitted after being cancelled and a new run owns them.
+        The entry's retention period starts over, so its result outlives the TTL of
+        its time in the queue.
+        """
+        entry.pop("partial", None)
+        if self.futures.get(task_id) is future:
+            del self.futures[task_id]
+            if not keep_token:
+                self.tokens.pop(task_id, None)
+        if self.tasks.get(task_id) is entry:
+            self._touch(task_id, entry)
+        self._evict()
+    
+    def _finish_cancelled(self, task_id, token, reason, status, entry=None, future=None):
+        """
+        Record a task as cancelled, if it is still in the given status under this token
+        
+        Parameters:
+        - task_id: ID of the task
+        - token: Token of the queued item; a stale item from before a resubmission is ignored
+        - reason: REASON_CANCELLED or REASON_DEADLINE
+        - status: Status the task must still be in ("queued", "paused" or "processing")
+        - entry, future: The run's own entry and future, for a worker stopping a run that
+          may since have been resubmitted
+        """
+        with self.lock:
+            current = self.tokens.get(task_id) is token
+            if entry is None:
+                if not current:
+                    return
+                entry, future = self.tasks.get(task_id), self.futures.get(task_id)
+            if entry is None or entry["status"] != status:
+                return
+            error = str(TaskCancelledError(reason))
+            entry.update({"status": "cancelled", "error": error, "finished_at": time.time()})
+            if current:
+                self.futures.pop(task_id, None)
+                self.paused.pop(task_id, None)
+                del self.tokens[task_id]
+            entry.pop("partial", None)
+        
+        TASKS_CANCELLED.inc(reason=reason, stage=status)
+        if self.store is not None and current:
+            # Not recovered after a restart, but queued again if resubmitted
+            self.store.mark_cancelled(task_id, error)
+        if future is not None:
+            future.set_exception(TaskCancelledError(reason))
+    
+    def cancel_task(self, task_id, reason=REASON_CANCELLED):
+        """
+        Cancel one task, whichever batches wait on it
+        
+        A queued or paused task is finished at once; a running one stops before
+        its next API call.
+        
+        Returns:
+        - True if the task was still unfinished
+        """
+        with self.lock:
+            token = self.tokens.get(task_id)
+            status = self.tasks[task_id]["status"] if token is not None else None
+        if token is None:
+            return False
+        token.cancel(reason)
+        if status in ("queued", "paused"):
+            self._finish_cancelled(task_id, token, reason, status)
+        return True
+    
+    def cancel_batch(self, batch_id, reason=REASON_CANCELLED):
+        """
+        Cancel the unfinished tasks of a batch
+        
+        Tasks that other, uncancelled batches also wait on keep running for them.
+        
+        Returns:
+        - Number of tasks cancelled
+        """
+        with self.lock:
+            batch_token = self._batch_token(batch_id)
+            unfinished = [(task_id, self.tokens[task_id], self.tasks[task_id]["status"])
+                          for task_id in self.batches.get(batch_id, {}) if task_id in self.tokens]
+        batch_token.cancel(reason)
+        
+        cancelled = 0
+        for task_id, token, status in unfinished:
+            if not token.cancelled:
+                continue
+            cancelled += 1
+            if status in ("queued", "paused"):
+                self._finish_cancelled(task_id, token, token.cancelled, status)
+        if cancelled:
+            print(f"Cancelled {cancelled} unfinished tasks of batch {batch_id}")
+        return cancelled
+    
+    def _publish_partial(self, entry, fields, preview_fields=()):
+        """Make fields of a response that is still streaming visible to pollers"""
+        with self.lock:
+            # Replaced rather than updated, so readers never see a dictionary mid-change
+            partial = {**entry.get("partial", {}), **fields}
+            entry["partial"] = partial
+            entry.setdefault("first_field_at", time.time())
+            if "preview_at" not in entry and all(field in partial for field in preview_fields):
+                entry["preview_at"] = time.time()
+    
+    def _entries(self, batch_id=None):
+        """
+        (task_id, entry) pairs of a batch, or of every retained task (caller holds the lock)
+        
+        A batch's evicted results are read back from the store; without a store they
+        show as expired.
+        """
+        if not batch_id:
+            return list(self.tasks.items())
+        if batch_id not in self.batches:
+            return []
+        self._touch_batch(batch_id)
+        return [(task_id, self._entry(task_id) or dict(EXPIRED_RESULT)) for task_id in list(self.batches[batch_id])]
     
-    def get_result(self, task_id):
-        """Get the result of a specific task"""
+    def get_result(self, task_id, batch_id=None):
+        """Get the result of a specific task, optionally within a single batch"""
         with self.lock:
-            return self.results.get(task_id, {"status": "unknown", "data": None, "error": None})
+            if batch_id:
+                if task_id not in self.batches.get(batch_id, {}):
+                    return dict(UNKNOWN_RESULT)
+                self._touch_batch(batch_id)
+                return self._entry(task_id) or dict(EXPIRED_RESULT)
+            return self._entry(task_id) or dict(UNKNOWN_RESULT)
     
-    def get_all_results(self):
-        """Get all completed results"""
+    def get_all_results(self, batch_id=None):
+        """Get all completed results, optionally for a single batch"""
         with self.lock:
-            return {task_id: data["data"] for task_id, data in self.results.items() 
+            return {task_id: data["data"] for task_id, data in self._entries(batch_id)
                     if data["status"] == "completed" and data["data"] is not None}
     
     def is_queue_empty(self):
-        """Check if the queue is empty"""
-        return self.queue.empty() and not self.processing
+        """Check if the queue is empty and no task is in flight"""
+        return self.queue.is_idle()
+    
+    def get_all_task_statuses(self, batch_id=None):
+        """Get the status of all tasks, optionally for a single batch"""
+        with self.lock:
+            return {task_id: data["status"] for task_id, data in self._entries(batch_id)}
     
-    def get_all_task_statuses(self):
-        """Get the status of all tasks"""
+    def memory_by_session(self):
+        """
+        Approximate memory held by retained result entries, per session that queued them
+        
+        Returns:
+        - Dictionary mapping session IDs to {"results": count, "bytes": size}
+        """
         with self.lock:
-            return {task_id: data["status"] for task_id, data in self.results.items()}
+            usage = {}
+            for entry in self.tasks.values():
+                session = usage.setdefault(entry.get("session_id") or DEFAULT_SESSION_ID, {"results": 0, "bytes": 0})
+                session["results"] += 1
+                session["bytes"] += deep_sizeof(entry)
+            return usage
 
 
 class GeminiProcessor:
     """
     Class to handle processing documents using Google's Gemini model
-    with robust rate limiting and queue management
+    with robust rate limiting and queue management.
+    Model calls go through an LLMBackend (Gemini unless another backend is passed
+    in or selected with RESUME_PARSER_LLM_BACKEND). A ModelRouter picks the model
+    tier of each call: resumes go to a fast model first and are escalated to the
+    large model only when its answer fails validation or looks unreliable.
     """
-    def __init__(self, api_key, model="gemini-1.5-pro"):
+    def __init__(self, api_key, model=None, store_path=None, workers=1, backend=None, budget=None,
+                 streaming=None, router=None):
         self.api_key = api_key
-        self.model = model
-        self.rate_limiter = RateLimiter()
+        self.router = router or ModelRouter.from_env(api_key, model, backend)
+        self.model = self.router.model_name(TIER_FAST)
+        self.backend = self.router.backend(TIER_FAST)
+        # Spaces calls only after 429s and for Retry-After; self.concurrency bounds calls in flight
+        self.rate_limiter = RateLimiter.from_env()
+        # Shared by every worker, so an outage stops all of them at once
+        self.breaker = CircuitBreaker()
+        # Adapts the number of concurrent calls to what the API accepts; workers beyond it stay idle
+        self.concurrency = ConcurrencyLimiter.from_env(max_limit=workers)
         self.lock = threading.Lock()
-        self.queue = ProcessingQueue(self)
+        self.store = JobStore(store_path) if store_path else None
+        # Token usage is kept next to the tasks it was spent on
+        self.ledger = TokenLedger(store_path if store_path else ":memory:")
+        self.budget = budget if budget is not None else TokenBudget.from_env()
+        self.queue = ProcessingQueue(self, store=self.store, workers=workers)
+        self.available = self.backend.is_available()
+        self.streaming = streaming_enabled() if streaming is None else streaming
+        self.stats = {"api_calls": 0, "retries": 0, "failed_calls": 0, "circuit_open": 0, "follow_ups": 0,
+                      "escalations": 0}
         
-        if not GEMINI_AVAILABLE:
-            print("Warning: Google Generative AI package not available. Install with pip install google-generativeai")
+        if not self.available:
+            print(f"Warning: LLM backend '{self.backend.name}' is not available")
             return
         
-        # Configure the Gemini API
-        try:
-            genai.configure(api_key=api_key)
-        except Exception as e:
-            print(f"Error configuring Gemini: {e}")
+        # Resume work left unfinished by a previous run
+        self.queue.recover_tasks()
     
-    def analyze_document(self, file_path):
+    def _count(self, name):
+        """Increment one of the call statistics"""
+        with self.lock:
+            self.stats[name] += 1
+    
+    def _check_cancelled(self):
+        """
+        Raises:
+        - TaskCancelledError if the task set by accounting() was cancelled or is past its deadline
+        """
+        token = current_accounting().get("cancel_token")
+        if token is not None:
+            token.check()
+    
+    def analyze_document(self, file_path, on_partial=None):
         """
         Analyze a document using Gemini with structured output
         
         Parameters:
         - file_path: Path to the document file
+        - on_partial: Optional function called with response fields as they stream in
         
         Returns:
         - Extracted information as a dictionary
         """
-        if not GEMINI_AVAILABLE:
+        if not self.available:
             return {
                 'name': "Error: Google Generative AI not available",
                 'email': '',
@@ -195,32 +785,48 @@ class GeminiProcessor:
             filename = os.path.basename(file_path)
             name_from_filename = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
             
+            # Nothing to do for a task cancelled since it was dequeued
+            self._check_cancelled()
+            
             # Extract text from file 
             text = get_text_from_file(file_path)
             
             # Trim text if it's too long for the Gemini API
-            if len(text) > 30000:  
+            if len(text) > MAX_TEXT_CHARS:
                 print(f"Warning: Document {file_path} is very long ({len(text)} chars). Truncating.")
-                text = text[:30000]
+                text = text[:MAX_TEXT_CHARS]
             
             # Check if text extraction was successful
             if not text or len(text) < 50:
                 raise ValueError(f"Failed to extract meaningful text from {file_path}. Text length: {len(text)}")
             
-            # Prepare the prompt for resume parsing
-            prompt = self._create_resume_parsing_prompt(text, name_from_filename)
+            # Prepare the prompt for resume parsing: shared instructions, then this resume
+            with time_stage(STAGE_PROMPT_BUILD):
+                prefix = self._create_resume_parsing_prompt()
+                prompt, degraded = self._fit_prompt_to_budget(
+                    lambda resume_text: self._create_resume_prompt_suffix(resume_text, name_from_filename), text,
+                    prefix)
             
-            # Call Gemini API with retry logic
-            response = self._call_gemini_with_retry(prompt)
+            # Call the model tier routing picks, streaming fields as they arrive
+            data, tier = self._run_extraction(prompt, prefix, RESUME_SCHEMA, text,
+                                              name_from_filename, on_partial=on_partial)
             
             # Parse the response
-            extracted_info = self._parse_response(response)
+            with time_stage(STAGE_RESPONSE_PARSE):
+                extracted_info = self._parse_response(data)
             
             # Add filename and file path for reference
             extracted_info['filename'] = os.path.basename(file_path)
             extracted_info['file_path'] = file_path
+            extracted_info['model_tier'] = tier
+            extracted_info['model'] = self.router.model_name(tier)
+            if degraded:
+                extracted_info['budget_degraded'] = True
             
             return extracted_info
+        except BudgetExceededError:
+            # The queue pauses the task instead of recording an error
+            raise
         except Exception as e:
             print(f"Error analyzing document {file_path}: {e}")
             # Return a structured error object
@@ -237,18 +843,19 @@ class GeminiProcessor:
                 'error': str(e)
             }
     
-    def analyze_document_with_filters(self, file_path, user_filters):
+    def analyze_document_with_filters(self, file_path, user_filters, on_partial=None):
         """
         Analyze a document using Gemini, incorporating user filter preferences
         
         Parameters:
         - file_path: Path to the document file
         - user_filters: Dictionary containing user's filter preferences
+        - on_partial: Optional function called with response fields as they stream in
         
         Returns:
         - Extracted information as a dictionary with match score
         """
-        if not GEMINI_AVAILABLE:
+        if not self.available:
             return {
                 'name': "Error: Google Generative AI not available",
                 'email': '',
@@ -268,29 +875,44 @@ class GeminiProcessor:
             filename = os.path.basename(file_path)
             name_from_filename = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
             
+            # Nothing to do for a task cancelled since it was dequeued
+            self._check_cancelled()
+            
             # Extract text from file
             text = get_text_from_file(file_path)
             
-            if len(text) > 30000:
-                text = text[:30000]
+            if len(text) > MAX_TEXT_CHARS:
+                text = text[:MAX_TEXT_CHARS]
             
             if not text or len(text) < 50:
                 raise ValueError(f"Failed to extract meaningful text from {file_path}.")
             
-            # Create prompt with filters
-            prompt = self._create_resume_parsing_prompt_with_filters(text, user_filters, name_from_filename)
+            # Create prompt with filters; the requirements are shared by the whole batch
+            with time_stage(STAGE_PROMPT_BUILD):
+                prefix = self._create_resume_parsing_prompt_with_filters(user_filters)
+                prompt, degraded = self._fit_prompt_to_budget(
+                    lambda resume_text: self._create_resume_prompt_suffix(resume_text, name_from_filename), text,
+                    prefix)
             
-            # Call Gemini API with retry logic
-            response = self._call_gemini_with_retry(prompt)
+            # Call the model tier routing picks, streaming fields as they arrive
+            data, tier = self._run_extraction(prompt, prefix, MATCH_SCHEMA, text,
+                                              name_from_filename, user_filters, on_partial)
             
             # Parse response
-            extracted_info = self._parse_response(response)
+            with time_stage(STAGE_RESPONSE_PARSE):
+                extracted_info = self._parse_response(data)
             
             # Add file info
             extracted_info['filename'] = os.path.basename(file_path)
             extracted_info['file_path'] = file_path
+            extracted_info['model_tier'] = tier
+            extracted_info['model'] = self.router.model_name(tier)
+            if degraded:
+                extracted_info['budget_degraded'] = True
             
             return extracted_info
+        except BudgetExceededError:
+            raise
         except Exception as e:
             print(f"Error analyzing document with filters {file_path}: {e}")
             return {
@@ -307,122 +929,438 @@ class GeminiProcessor:
                 'error': str(e)
             }
     
-    def _call_gemini_with_retry(self, prompt, max_retries=3):
+    def generate(self, prompt, max_retries=3, stream=None, schema=None, prefix=None, tier=None):
         """
-        Call Gemini API with retries and backoff
+        Call the LLM backend with rate limiting, retries and backoff
         
         Parameters:
-        - prompt: The prompt for Gemini
+        - prompt: The prompt for the model
         - max_retries: Maximum number of retry attempts
+        - stream: Optional FieldStream fed the response as it arrives; it can end
+          the response early (when streaming is enabled)
+        - schema: Optional JSON schema of the expected response (see utils.structured_output)
+        - prefix: Optional static text sent before the prompt, context-cached where the backend can
+        - tier: Model tier to call; defaults to the tier routed for the kind of call set by accounting()
         
         Returns:
-        - Response from Gemini
+        - Response text from the model
         """
-        if not GEMINI_AVAILABLE:
+        if not self.available:
             return "Google Generative AI not available"
+        
+        context = current_accounting()
+        kind = context.get("kind", KIND_RESUME)
+        token = context.get("cancel_token")
+        # Queued resumes carry their lane; direct calls (queries, custom columns) have a user waiting
+        priority = context.get("priority") or (PRIORITY_NORMAL if kind in (KIND_RESUME, KIND_FOLLOW_UP)
+                                               else PRIORITY_INTERACTIVE)
+        if tier is None:
+            tier = self.router.tier_for(kind)
+        backend = self.router.backend(tier)
+        
+        # Refuse calls that would take a batch, session, day or month over its token budget
+        try:
+            self.ledger.check(self.budget, estimate_tokens(join_prompt(prefix, prompt)) + EXPECTED_OUTPUT_TOKENS)
+        except BudgetExceededError as e:
+            BUDGET_REFUSALS.inc(scope=e.scope)
+            raise
             
         attempts = 0
         last_exception = None
+        last_error_class = None
         
         while attempts < max_retries:
+            # Do not spend quota on a task nobody is waiting for any more
+            self._check_cancelled()
+            
+            # Fail fast while the API is known to be down
             try:
-                # Wait according to rate limiter
-                self.rate_limiter.wait()
-                
-                # Call Gemini
-                response = self._call_gemini(prompt)
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("circuit_open")
+                API_CALLS.inc(backend=backend.name, outcome="circuit_open")
+                raise
+            
+            try:
+                # Wait for a slot under the adaptive concurrency limit, then according to rate limiter
+                with time_stage(STAGE_CONCURRENCY_WAIT):
+                    self.concurrency.acquire(priority, token=token)
+                try:
+                    with time_stage(STAGE_RATE_LIMIT_WAIT):
+                        self.rate_limiter.wait(priority, token=token)
+                    
+                    # The waits can be long; check again right before the call
+                    self._check_cancelled()
+                    
+                    # Call the model
+                    self._count("api_calls")
+                    ROUTED_CALLS.inc(kind=kind, tier=tier)
+                    call_started = time.perf_counter()
+                    with time_stage(STAGE_API_CALL):
+                        if stream is not None and self.streaming:
+                            response, usage = self._generate_streamed(backend, prompt, stream, schema, prefix,
+                                                                      token)
+                        else:
+                            response, usage = backend.generate_with_usage(prompt, schema=schema, prefix=prefix)
+                    self.concurrency.record_success(time.perf_counter() - call_started)
+                finally:
+                    self.concurrency.release()
+                API_CALLS.inc(backend=backend.name, outcome="success")
+                self.breaker.record_success()
+                CIRCUIT_OPEN.set(0)
+                self._record_usage(usage, backend)
                 
                 # Update rate limiter on success
                 self.rate_limiter.success()
+                RATE_LIMIT_DELAY.set(self.rate_limiter.current_delay)
                 
                 return response
+            except TaskCancelledError:
+                # Gave up its place in line (or its stream); a half-open breaker's trial goes to another call
+                self.breaker.release()
+                raise
             except Exception as e:
                 last_exception = e
                 attempts += 1
+                self._count("failed_calls")
+                error_class = last_error_class = backend.classify_error(e)
+                API_CALLS.inc(backend=backend.name, outcome=error_class)
+                
+                # Errors such as a rejected request or bad credentials would fail again; do not retry them
+                if error_class == ERROR_FATAL:
+                    self.breaker.release()
+                    raise
                 
-                # Update rate limiter and wait before retry
-                wait_time = self.rate_limiter.failure()
-                print(f"API error: {str(e)}. Retrying after {wait_time:.2f} seconds. Attempt {attempts}/{max_retries}")
-                time.sleep(wait_time)
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None:
+                    retry_after = min(retry_after, MAX_RETRY_AFTER)
+                
+                if error_class == ERROR_RATE_LIMIT:
+                    # The API is up but over quota: slow every worker down and run fewer calls at once
+                    self.breaker.release()
+                    self.concurrency.record_rate_limit()
+                    wait_time = max(self.rate_limiter.failure(), retry_after or 0)
+                    if retry_after:
+                        self.rate_limiter.hold(retry_after)
+                    RATE_LIMIT_DELAY.set(self.rate_limiter.current_delay)
+                else:
+                    # Server errors and timeouts count towards opening the breaker
+                    if self.breaker.record_failure():
+                        CIRCUIT_OPEN.set(1)
+                        # Later attempts would be refused anyway; give up on this call now
+                        break
+                    if retry_after is not None:
+                        wait_time = retry_after
+                    else:
+                        backoff = TRANSIENT_BACKOFF_BASE * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+                        wait_time = min(backoff, TRANSIENT_BACKOFF_MAX)
+                
+                if attempts < max_retries:
+                    self._count("retries")
+                    RETRIES.inc(error_class=error_class)
+                    print(f"API error ({error_class}): {str(e)}. Retrying after {wait_time:.2f} seconds. "
+                          f"Attempt {attempts}/{max_retries}")
+                    if token is not None:
+                        token.sleep(wait_time)
+                    else:
+                        time.sleep(wait_time)
+        
+        # If all retries fail, raise the last error, keeping its class for callers
+        raise make_error(last_error_class, f"Maximum retries ({max_retries}) exceeded: {str(last_exception)}",
+                         getattr(last_exception, "status_code", None),
+                         getattr(last_exception, "retry_after", None)) from last_exception
+    
+    def _generate_streamed(self, backend, prompt, stream, schema=None, prefix=None, token=None):
+        """
+        Stream one response into a FieldStream, stopping once it has what it needs
+        (or, for a cancelled task, at once)
         
-        # If all retries fail, raise the exception
-        raise Exception(f"Maximum retries ({max_retries}) exceeded: {str(last_exception)}")
+        Returns:
+        - Tuple of (response text received, usage)
+        """
+        stream.restart()
+        response_stream = backend.generate_stream(prompt, schema=schema, prefix=prefix)
+        try:
+            for chunk in response_stream:
+                if token is not None:
+                    token.check()
+                if stream.feed(chunk):
+                    break
+        finally:
+            response_stream.close()
+        
+        if stream.first_field_seconds is not None:
+            FIRST_FIELD_SECONDS.observe(stream.first_field_seconds, backend=backend.name)
+        if stream.stopped_early:
+            STREAMS_STOPPED_EARLY.inc(backend=backend.name)
+        return response_stream.text, response_stream.usage
     
-    def _call_gemini(self, prompt):
+    def _run_extraction(self, prompt, prefix, schema, resume_text, name_hint=None,
+                        user_filters=None, on_partial=None):
         """
-        Call the Gemini API with the given prompt
+        Get a validated response from the routed model tier, escalating hard cases
+        
+        The routed tier (normally the fast model) answers first. If its response fails
+        validation or looks unreliable, the same prompt goes to the large model, whose
+        fields take precedence; if that call fails, the first response is kept. Fields
+        still missing are then asked for again from whichever tier served the result.
         
         Parameters:
-        - prompt: The prompt for Gemini
+        - prompt: Per-resume prompt
+        - prefix: Static prompt prefix
+        - schema: Schema of the response
+        - resume_text: Resume text the prompt was built from
+        - name_hint: Optional candidate name guessed from the filename
+        - user_filters: Filters, for match prompts
+        - on_partial: Optional function called with response fields as they stream in
         
         Returns:
-        - Response text from Gemini
+        - Tuple of (valid fields, tier that served them)
         """
-        if not GEMINI_AVAILABLE:
-            return "Google Generative AI not available"
-            
+        tier = self.router.tier_for(KIND_RESUME)
+        # The stream ends with the JSON object: every schema field is required, and the last one
+        # is only complete at the closing brace, so there is no earlier point to stop at
+        fields = FieldStream(on_fields=on_partial)
+        response = fields.response_text(self.generate(prompt, stream=fields, schema=schema, prefix=prefix, tier=tier))
+        with time_stage(STAGE_RESPONSE_PARSE):
+            data, missing = self._validate_response(response, schema)
+        
+        reason = self.router.escalation_reason(tier, data, missing, resume_text, name_hint)
+        if reason:
+            print(f"Escalating to the {self.router.escalation_tier} model ({reason})")
+            self._count("escalations")
+            ESCALATIONS.inc(reason=reason)
+            escalation_tier = self.router.escalation_tier
+            fields = FieldStream(on_fields=on_partial)
+            try:
+                response = fields.response_text(self.generate(prompt, stream=fields, schema=schema, prefix=prefix,
+                                                              tier=escalation_tier))
+            except Exception as e:
+                # Includes a budget refusal: keep the first answer rather than failing the resume
+                print(f"Escalated request failed: {e}")
+            else:
+                with time_stage(STAGE_RESPONSE_PARSE):
+                    escalated, _ = self._validate_response(response, schema)
+                data = {**data, **escalated}
+                missing = [field for field in schema['required'] if field not in data]
+                tier = escalation_tier
+        
+        # Ask again for just the fields the response lacks
+        if missing:
+            data = self._complete_missing_fields(data, missing, schema, resume_text, name_hint, user_filters, tier)
+        return data, tier
+    
+    def _validate_response(self, response, schema):
+        """
+        Parse a response, repairing it if needed, and check it against a schema
+        
+        Parameters:
+        - response: Response text
+        - schema: Schema from utils.structured_output
+        
+        Returns:
+        - Tuple of (valid fields, names of required fields missing or invalid)
+        """
+        data, outcome = parse_json_object(response)
+        RESPONSE_PARSES.inc(outcome=outcome)
+        return validate(data, schema)
+    
+    def _complete_missing_fields(self, data, missing, schema, resume_text, name_hint=None, user_filters=None,
+                                 tier=None):
+        """
+        Ask the model again for only the fields a response lacked
+        
+        Parameters:
+        - data: Valid fields from the first response
+        - missing: Names of the fields to ask for
+        - schema: Schema of the full response
+        - resume_text: Resume text the first prompt was built from; only its first
+          FOLLOW_UP_TEXT_CHARS characters are sent
+        - name_hint: Optional candidate name guessed from the filename
+        - user_filters: Filters, when match fields are requested
+        - tier: Model tier that produced the first response, which is asked again
+        
+        Returns:
+        - The fields with whatever the follow-up supplied merged in; fields still
+          missing get defaults when the response is parsed
+        """
+        print(f"Response lacked {len(missing)} fields ({', '.join(missing)}); asking for them again")
+        self._count("follow_ups")
+        follow_up_schema = subschema(schema, missing)
+        prompt = self._create_missing_fields_prompt(resume_text[:FOLLOW_UP_TEXT_CHARS], follow_up_schema,
+                                                    name_hint, user_filters)
+        try:
+            # Charged as a follow-up, so the ledger separates them from first requests
+            with accounting(kind=KIND_FOLLOW_UP):
+                response = self.generate(prompt, schema=follow_up_schema, tier=tier)
+        except Exception as e:
+            # Includes a budget refusal: keep the fields already paid for
+            print(f"Follow-up request failed: {e}")
+            FOLLOW_UPS.inc(outcome="failed")
+            return data
+        
+        with time_stage(STAGE_RESPONSE_PARSE):
+            supplied, still_missing = self._validate_response(response, follow_up_schema)
+        data = {**data, **{field: supplied[field] for field in missing if field in supplied}}
+        FOLLOW_UPS.inc(outcome="incomplete" if still_missing else "completed")
+        return data
+    
+    def _record_usage(self, usage, backend):
+        """Charge a call's tokens to the task, batch and session set by accounting()"""
+        kind = current_accounting().get("kind", KIND_RESUME)
+        TOKENS.inc(usage["prompt_tokens"], kind=kind, direction="prompt")
+        TOKENS.inc(usage["output_tokens"], kind=kind, direction="output")
+        if usage.get("cached_tokens"):
+            TOKENS.inc(usage["cached_tokens"], kind=kind, direction="cached")
         try:
-            model = genai.GenerativeModel(self.model)
-            response = model.generate_content(
-                prompt,
-                generation_config={"temperature": 0.0}
-            )
-            return response.text
+            self.ledger.record(usage, backend=backend.name)
         except Exception as e:
-            raise Exception(f"Gemini API call failed: {str(e)}")
+            # Losing a ledger row must not fail an already paid-for call
+            print(f"Error recording token usage: {e}")
+    
+    def _fit_prompt_to_budget(self, build_prompt, text, prefix=""):
+        """
+        Build a resume prompt, shortening the resume text if a degrading budget requires it
+        
+        Parameters:
+        - build_prompt: Function that builds the prompt from resume text
+        - text: Resume text
+        - prefix: Static prompt prefix sent before the built prompt
+        
+        Returns:
+        - Tuple of (prompt, whether the text was shortened); an over-budget prompt is
+          returned unchanged and refused by generate()
+        """
+        prompt = build_prompt(text)
+        if self.budget.action != ACTION_DEGRADE or \
+                self.ledger.fits(self.budget, estimate_tokens(prefix + prompt) + EXPECTED_OUTPUT_TOKENS):
+            return prompt, False
+        
+        for max_chars in DEGRADED_TEXT_CHARS:
+            if len(text) <= max_chars:
+                continue
+            shorter_prompt = build_prompt(text[:max_chars])
+            if self.ledger.fits(self.budget, estimate_tokens(prefix + shorter_prompt) + EXPECTED_OUTPUT_TOKENS):
+                print(f"Token budget nearly exhausted; analysing the first {max_chars} characters only")
+                return shorter_prompt, True
+        
+        return prompt, False
+    
+    def get_token_usage(self, scope, key=None):
+        """
+        Get token usage for a task, batch, session, day or month
+        
+        Parameters:
+        - scope: "task", "batch", "session", "day" or "month"
+        - key: ID, day (YYYY-MM-DD) or month (YYYY-MM); omit to list the most recent per scope
+        
+        Returns:
+        - Total tokens for a key, or a list of per-key summaries
+        """
+        if key is None:
+            return self.ledger.summarize(scope)
+        return self.ledger.total(scope, key)
     
-    def queue_document_for_analysis(self, file_path, user_filters=None):
+    def resume_paused_tasks(self):
+        """
+        Re-queue tasks paused by a token budget, e.g. after raising the limit
+        
+        Returns:
+        - List of re-queued task IDs
+        """
+        return self.queue.resume_paused()
+    
+    def queue_document_for_analysis(self, file_path, user_filters=None, batch_id=None, session_id=None,
+                                    priority=PRIORITY_NORMAL, deadline=None):
         """
         Queue a document for asynchronous analysis
         
         Parameters:
         - file_path: Path to the document file
         - user_filters: Optional dictionary containing user's filter preferences
+        - batch_id: Optional batch namespace for the result
+        - session_id: Optional session ID used for fair scheduling between users
+        - priority: Queue lane; PRIORITY_INTERACTIVE for work a user is waiting on
+        - deadline: Optional epoch time after which the task is abandoned
         
         Returns:
         - Task ID for checking result status
         """
-        return self.queue.add_task(file_path, user_filters)
+        return self.queue.add_task(file_path, user_filters, batch_id=batch_id, session_id=session_id,
+                                   priority=priority, deadline=deadline)
+    
+    def cancel_batch(self, batch_id):
+        """
+        Cancel the unfinished tasks of a batch, e.g. when nobody will read its results
+        
+        Returns:
+        - Number of tasks cancelled
+        """
+        return self.queue.cancel_batch(batch_id)
     
-    def get_queued_result(self, task_id):
+    def cancel_task(self, task_id):
+        """
+        Cancel one queued or running task
+        
+        Returns:
+        - True if the task was still unfinished
+        """
+        return self.queue.cancel_task(task_id)
+    
+    def get_queued_result(self, task_id, batch_id=None):
         """
         Get the result of a queued document analysis
         
         Parameters:
         - task_id: Task ID returned by queue_document_for_analysis
+        - batch_id: Optional batch namespace to look the task up in
         
         Returns:
         - Result data or status information
         """
-        return self.queue.get_result(task_id)
+        return self.queue.get_result(task_id, batch_id)
     
-    def get_all_completed_results(self):
+    def get_all_completed_results(self, batch_id=None):
         """
         Get all completed analysis results
         
+        Parameters:
+        - batch_id: Optional batch namespace to restrict the results to
+        
         Returns:
         - Dictionary of completed results
         """
-        return self.queue.get_all_results()
+        return self.queue.get_all_results(batch_id)
     
-    def get_all_task_statuses(self):
+    def get_all_task_statuses(self, batch_id=None):
         """
         Get the status of all tasks
         
+        Parameters:
+        - batch_id: Optional batch namespace to restrict the statuses to
+        
         Returns:
         - Dictionary mapping task_id to status
         """
-        return self.queue.get_all_task_statuses()
+        return self.queue.get_all_task_statuses(batch_id)
     
-    def _create_resume_parsing_prompt(self, resume_text, name_hint=None):
+    def memory_by_session(self):
         """
-        Create a prompt for Gemini to extract information from a resume
+        Approximate memory held by retained results, per session that queued them
+        
+        Returns:
+        - Dictionary mapping session IDs to {"results": count, "bytes": size}
         """
-        name_hint_text = ""
-        if name_hint:
-            name_hint_text = f"\nHINT: The candidate's name might be '{name_hint}' based on the filename."
-            
-        prompt = f"""You are an expert resume parser with extensive experience in HR and technical recruiting. Extract precise information from this resume:{name_hint_text}
+        return self.queue.memory_by_session()
+    
+    def _create_resume_parsing_prompt(self):
+        """
+        Create the instructions for Gemini to extract information from a resume
+        
+        The text is the same for every resume, so it forms the cacheable prompt prefix;
+        the resume itself follows in _create_resume_prompt_suffix().
+        """
+        prompt = f"""You are an expert resume parser with extensive experience in HR and technical recruiting. Extract precise information from the resume at the end of this prompt.
 
 # EXTRACTION GUIDELINES:
 
@@ -470,15 +1408,12 @@ Create a clean, structured JSON object with these exact fields:
 }}
 
 Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid and properly formatted.
-
-RESUME TEXT:
-{resume_text}
 """
         return prompt
     
-    def _create_resume_parsing_prompt_with_filters(self, resume_text, user_filters, name_hint=None):
+    def _describe_filters(self, user_filters):
         """
-        Create an enhanced prompt for Gemini to extract information and provide matching analysis
+        Describe the job requirements for a prompt
         """
         # Build filter context string
         filter_context = "The evaluator is specifically looking for candidates with these qualifications:\n"
@@ -500,11 +1435,18 @@ RESUME TEXT:
                 if value:
                     filter_context += f"- {key}: {value}\n"
         
-        name_hint_text = ""
-        if name_hint:
-            name_hint_text = f"\nHINT: The candidate's name might be '{name_hint}' based on the filename."
+        return filter_context
+    
+    def _create_resume_parsing_prompt_with_filters(self, user_filters):
+        """
+        Create enhanced instructions for Gemini to extract information and provide matching analysis
         
-        prompt = f"""You are an expert resume parser and talent evaluator. Extract precise information from this resume and evaluate how well the candidate matches the job requirements.{name_hint_text}
+        The job requirements are part of these instructions, so they are shared (and cached)
+        across every resume analysed with the same filters.
+        """
+        filter_context = self._describe_filters(user_filters)
+        
+        prompt = f"""You are an expert resume parser and talent evaluator. Extract precise information from the resume at the end of this prompt and evaluate how well the candidate matches the job requirements.
 
 # JOB REQUIREMENTS - IMPORTANT
 {filter_context}
@@ -545,6 +1487,41 @@ Create a clean JSON object with these exact fields:
 }}
 
 Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid.
+"""
+        return prompt
+    
+    def _create_resume_prompt_suffix(self, resume_text, name_hint=None):
+        """
+        Create the per-resume part of a resume parsing prompt
+        """
+        name_hint_text = ""
+        if name_hint:
+            name_hint_text = f"HINT: The candidate's name might be '{name_hint}' based on the filename.\n"
+        
+        return f"""
+{name_hint_text}
+RESUME TEXT:
+{resume_text}
+"""
+    
+    def _create_missing_fields_prompt(self, resume_text, schema, name_hint=None, user_filters=None):
+        """
+        Create a short follow-up prompt asking only for the fields in a schema
+        """
+        name_hint_text = ""
+        if name_hint:
+            name_hint_text = f"\nHINT: The candidate's name might be '{name_hint}' based on the filename."
+        
+        requirements_text = ""
+        if user_filters and any(field in schema['properties'] for field in ('match_score', 'match_reasons', 'gap_analysis')):
+            requirements_text = f"\n# JOB REQUIREMENTS\n{self._describe_filters(user_filters)}"
+        
+        prompt = f"""You are an expert resume parser. Extract ONLY the following fields from this resume.{name_hint_text}
+{requirements_text}
+# FIELDS (JSON schema of each field):
+{json.dumps(schema['properties'], indent=2)}
+
+Your output must be ONLY a JSON object with exactly these fields.
 
 RESUME TEXT:
 {resume_text}
@@ -556,119 +1533,84 @@ RESUME TEXT:
         Parse the response from Gemini
         
         Parameters:
-        - response: The JSON response from Gemini
+        - response: The JSON response from Gemini, or its already validated fields
         
         Returns:
-        - Extracted information as a dictionary
+        - Extracted information as a ResumeRecord, which reads like the dictionary it replaces
         """
         try:
-            # Find the JSON object in the response
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                extracted_info = json.loads(json_str)
-                
-                # Ensure all required fields are present
-                required_fields = ['name', 'email', 'phone', 'location', 'experience', 
-                                  'skills', 'work_history', 'education', 'linkedin', 'github', 
-                                  'languages', 'certifications']
-                
-                for field in required_fields:
-                    if field not in extracted_info:
-                        if field in ['work_history', 'education', 'skills', 'languages', 'certifications', 'match_reasons', 'gap_analysis']:
-                            extracted_info[field] = []
-                        else:
-                            extracted_info[field] = ""
-                
-                # Ensure experience is numeric
-                try:
-                    extracted_info['experience'] = int(extracted_info['experience']) if extracted_info.get('experience') is not None else 0
-                except (ValueError, TypeError):
-                    extracted_info['experience'] = 0
-                
-                # Format array fields to strings for compatibility with existing code
-                if isinstance(extracted_info.get('skills', []), list):
-                    extracted_info['skills'] = ', '.join(extracted_info.get('skills', []))
-                
-                # Format education array into a string
-                if isinstance(extracted_info.get('education', []), list):
-                    education_parts = []
-                    for edu in extracted_info.get('education', []):
-                        if isinstance(edu, dict):
-                            edu_str = ""
-                            if 'degree' in edu:
-                                edu_str += edu['degree']
-                            if 'institution' in edu:
-                                if edu_str:
-                                    edu_str += " from "
-                                edu_str += edu['institution']
-                            if 'year' in edu:
-                                edu_str += f" ({edu['year']})"
-                            if 'field' in edu:
-                                edu_str += f", {edu['field']}"
-                            education_parts.append(edu_str)
-                    extracted_info['education'] = "; ".join(education_parts)
-                
-                # Format languages array into a string
-                if isinstance(extracted_info.get('languages', []), list):
-                    language_parts = []
-                    for lang in extracted_info.get('languages', []):
-                        if isinstance(lang, dict) and 'name' in lang:
-                            lang_str = lang['name']
-                            if 'proficiency' in lang:
-                                lang_str += f" ({lang['proficiency']})"
-                            language_parts.append(lang_str)
-                        elif isinstance(lang, str):
-                            language_parts.append(lang)
-                    extracted_info['languages'] = ", ".join(language_parts)
-                
-                # Format certifications array into a string
-                if isinstance(extracted_info.get('certifications', []), list):
-                    extracted_info['certifications'] = ", ".join(extracted_info.get('certifications', []))
-                
-                # Add a formatted work history summary
-                if isinstance(extracted_info.get('work_history', []), list) and extracted_info.get('work_history', []):
-                    work_history_parts = []
-                    for job in extracted_info.get('work_history', []):
-                        if isinstance(job, dict):
-                            job_str = ""
-                            if 'position' in job:
-                                job_str += job['position']
-                            if 'company' in job:
-                                if job_str:
-                                    job_str += " at "
-                                job_str += job['company']
-                            if 'dates' in job:
-                                job_str += f" ({job['dates']})"
-                            work_history_parts.append(job_str)
-                    extracted_info['work_history_summary'] = "; ".join(work_history_parts)
-                else:
-                    extracted_info['work_history_summary'] = ""
-                
-                # Format match reasons into a string if present
-                if 'match_reasons' in extracted_info and isinstance(extracted_info.get('match_reasons', []), list):
-                    extracted_info['match_reasons_text'] = "- " + "\n- ".join(extracted_info.get('match_reasons', []))
-                else:
-                    extracted_info['match_reasons_text'] = ""
-                
-                # Format gap analysis into a string if present
-                if 'gap_analysis' in extracted_info and isinstance(extracted_info.get('gap_analysis', []), list) and extracted_info.get('gap_analysis', []):
-                    extracted_info['gap_analysis_text'] = "Areas for improvement:\n- " + "\n- ".join(extracted_info.get('gap_analysis', []))
-                else:
-                    extracted_info['gap_analysis_text'] = "No significant gaps identified."
-                    
-                # Ensure match score is present
-                if 'match_score' not in extracted_info:
-                    extracted_info['match_score'] = 0
-                
-                return extracted_info
+            if isinstance(response, dict):
+                extracted_info = dict(response)
             else:
-                raise ValueError("No JSON object found in response")
+                # Find the JSON object in the response, repairing it if needed
+                extracted_info, _ = parse_json_object(response)
+                if not extracted_info:
+                    raise ValueError("No JSON object found in response")
+            
+            # Ensure all required fields are present
+            required_fields = ['name', 'email', 'phone', 'location', 'experience', 
+                              'skills', 'work_history', 'education', 'linkedin', 'github', 
+                              'languages', 'certifications']
+            
+            for field in required_fields:
+                if field not in extracted_info:
+                    if field in ['work_history', 'education', 'skills', 'languages', 'certifications', 'match_reasons', 'gap_analysis']:
+                        extracted_info[field] = []
+                    else:
+                        extracted_info[field] = ""
+            
+            # Ensure experience is numeric
+            try:
+                extracted_info['experience'] = int(extracted_info['experience']) if extracted_info.get('experience') is not None else 0
+            except (ValueError, TypeError):
+                extracted_info['experience'] = 0
+            
+            # Format education array into a string
+            if isinstance(extracted_info.get('education', []), list):
+                education_parts = []
+                for edu in extracted_info.get('education', []):
+                    if isinstance(edu, dict):
+                        edu_str = ""
+                        if 'degree' in edu:
+                            edu_str += edu['degree']
+                        if 'institution' in edu:
+                            if edu_str:
+                                edu_str += " from "
+                            edu_str += edu['institution']
+                        if 'year' in edu:
+                            edu_str += f" ({edu['year']})"
+                        if 'field' in edu:
+                            edu_str += f", {edu['field']}"
+                        education_parts.append(edu_str)
+                extracted_info['education'] = "; ".join(education_parts)
+            
+            # Format languages array into a string
+            if isinstance(extracted_info.get('languages', []), list):
+                language_parts = []
+                for lang in extracted_info.get('languages', []):
+                    if isinstance(lang, dict) and 'name' in lang:
+                        lang_str = lang['name']
+                        if 'proficiency' in lang:
+                            lang_str += f" ({lang['proficiency']})"
+                        language_parts.append(lang_str)
+                    elif isinstance(lang, str):
+                        language_parts.append(lang)
+                extracted_info['languages'] = ", ".join(language_parts)
+            
+            # Format certifications array into a string
+            if isinstance(extracted_info.get('certifications', []), list):
+                extracted_info['certifications'] = ", ".join(extracted_info.get('certifications', []))
+            
+            # Ensure match score is present
+            if 'match_score' not in extracted_info:
+                extracted_info['match_score'] = 0
+            
+            # Skills are joined and the work history summary, match reasons and gap analysis
+            # texts are derived when read, rather than stored beside the lists
+            return ResumeRecord(extracted_info)
         except Exception as e:
             print(f"Error parsing Gemini response: {e}")
-            return {
+            return ResumeRecord.from_dict({
                 'name': 'Unknown',
                 'email': '',
                 'phone': '',
@@ -687,4 +1629,4 @@ RESUME TEXT:
                 'match_reasons_text': '',
                 'gap_analysis': [],
                 'gap_analysis_text': 'No analysis available.'
-            }
\ No newline at end of file
+            })
\ No newline at end of file
@@ -0,0 +1,234 @@
+"""
+Persistent SQLite-backed task store for the Resume Parser processing queue.
+This module records every task's state transitions so queued and in-flight
+work survives process restarts.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+DEFAULT_STORE_PATH = os.path.join("data", "processed", "queue.db")
+
+STATUS_QUEUED = "queued"
+STATUS_PROCESSING = "processing"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+class JobStore:
+    """
+    Durable record of processing tasks backed by a single SQLite file
+    """
+    def __init__(self, path=DEFAULT_STORE_PATH, max_attempts=3):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # One shared connection guarded by our own lock; worker threads all write through it
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create tables if they do not exist yet"""
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    file_path TEXT NOT NULL,
+                    user_filters TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS task_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempt INTEGER NOT NULL,
+                    detail TEXT,
+                    at REAL NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status)")
+
+    def _record_event(self, task_id, status, attempt, detail=None):
+        """Append a state transition to the event log (caller holds the lock)"""
+        self.conn.execute(
+            "INSERT INTO task_events (task_id, status, attempt, detail, at) VALUES (?, ?, ?, ?, ?)",
+            (task_id, status, attempt, detail, time.time())
+        )
+
+    def _row_to_task(self, row):
+        """Convert a database row into a plain task dictionary"""
+        if row is None:
+            return None
+        return {
+            "task_id": row["task_id"],
+            "file_path": row["file_path"],
+            "user_filters": json.loads(row["user_filters"]) if row["user_filters"] else None,
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def get(self, task_id):
+        """Get a stored task by ID, or None if it is unknown"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row_to_task(row)
+
+    def enqueue(self, task_id, file_path, user_filters=None):
+        """
+        Record a task as queued
+
+        Parameters:
+        - task_id: Unique task identifier
+        - file_path: Path to the document file
+        - user_filters: Optional filter dictionary used for the analysis
+
+        Returns:
+        - The stored task; completed tasks are returned unchanged so callers can skip them
+        """
+        now = time.time()
+        filters_json = json.dumps(user_filters) if user_filters else None
+
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+
+            if row is not None and row["status"] == STATUS_COMPLETED:
+                return self._row_to_task(row)
+
+            self.conn.execute("BEGIN")
+            try:
+                if row is None:
+                    self.conn.execute(
+                        "INSERT INTO tasks (task_id, file_path, user_filters, status, attempts, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, 0, ?, ?)",
+                        (task_id, file_path, filters_json, STATUS_QUEUED, now, now)
+                    )
+                    attempts = 0
+                else:
+                    self.conn.execute(
+                        "UPDATE tasks SET file_path = ?, user_filters = ?, status = ?, error = NULL, updated_at = ? "
+                        "WHERE task_id = ?",
+                        (file_path, filters_json, STATUS_QUEUED, now, task_id)
+                    )
+                    attempts = row["attempts"]
+                self._record_event(task_id, STATUS_QUEUED, attempts)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            row = self.conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._row_to_task(row)
+
+    def _transition(self, task_id, status, result=None, error=None, increment_attempts=False):
+        """Move a task to a new status and log the transition"""
+        now = time.time()
+        # Mappings that are not dicts (e.g. ResumeRecord) are stored as plain JSON objects
+        result_json = json.dumps(result, default=dict) if result is not None else None
+
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                if increment_attempts:
+                    self.conn.execute(
+                        "UPDATE tasks SET status = ?, attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                        (status, now, task_id)
+                    )
+                else:
+                    self.conn.execute(
+                        "UPDATE tasks SET status = ?, result = ?, error = ?, updated_at = ? WHERE task_id = ?",
+                        (status, result_json, error, now, task_id)
+                    )
+                row = self.conn.execute("SELECT attempts FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+                attempts = row["attempts"] if row else 0
+                self._record_event(task_id, status, attempts, error)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return attempts
+
+    def mark_processing(self, task_id):
+        """Record that a worker picked up the task; returns the attempt number"""
+        return self._transition(task_id, STATUS_PROCESSING, increment_attempts=True)
+
+    def mark_completed(self, task_id, result):
+        """Record a successful result so the task is never paid for again"""
+        self._transition(task_id, STATUS_COMPLETED, result=result)
+
+    def mark_failed(self, task_id, error):
+        """Record a failed attempt"""
+        self._transition(task_id, STATUS_FAILED, error=error)
+
+    def mark_cancelled(self, task_id, reason):
+        """Record that a task was cancelled or expired; it is not recovered, but can be queued again"""
+        self._transition(task_id, STATUS_CANCELLED, error=reason)
+
+    def mark_paused(self, task_id, reason):
+        """Put a task back in the queued state, e.g. when it was refused by a token budget"""
+        self._transition(task_id, STATUS_QUEUED, error=reason)
+
+    def recover(self):
+        """
+        Recover tasks left unfinished by a previous process
+
+        Tasks that were in flight when the process died are re-queued, unless they
+        have already used up their attempts (e.g. a file that keeps crashing the worker),
+        in which case they are marked as failed.
+
+        Returns:
+        - List of task dictionaries that should be queued again, oldest first
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM tasks WHERE status IN (?, ?) ORDER BY created_at",
+                (STATUS_QUEUED, STATUS_PROCESSING)
+            ).fetchall()
+
+        recovered = []
+        for row in rows:
+            task = self._row_to_task(row)
+            if task["status"] == STATUS_PROCESSING:
+                if task["attempts"] >= self.max_attempts:
+                    self.mark_failed(task["task_id"], f"Abandoned after {task['attempts']} interrupted attempts")
+                    continue
+                self._transition(task["task_id"], STATUS_QUEUED)
+                task["status"] = STATUS_QUEUED
+            recovered.append(task)
+
+        return recovered
+
+    def get_task_events(self, task_id):
+        """Get the recorded state transitions of a task, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, attempt, detail, at FROM task_events WHERE task_id = ? ORDER BY id",
+                (task_id,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self.lock:
+            self.conn.close()
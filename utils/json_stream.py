@@ -0,0 +1,162 @@
+"""
+Incremental JSON parsing for streamed LLM responses.
+Feeds response chunks through a small scanner that tracks the outermost JSON
+object and decodes each top-level field as soon as its value is complete, so
+name, email or match score can be shown before the rest of the response
+arrives. Text before the object (e.g. a ```json fence) is skipped.
+"""
+
+import json
+import time
+
+class IncrementalJSONParser:
+    """
+    Decode the top-level fields of a JSON object as its text arrives
+
+    Only whole values are reported: a string field appears once its closing quote
+    arrives, a list once its closing bracket does. Fields whose value fails to
+    decode are skipped; the full response is still parsed normally at the end.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0       # next character of buffer to scan
+        self.started = False    # seen the opening brace of the outer object
+        self.complete = False   # seen its closing brace
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        self.fields = {}
+
+    def feed(self, chunk):
+        """
+        Scan the next chunk of response text
+
+        Parameters:
+        - chunk: Text received since the previous call
+
+        Returns:
+        - Dictionary of the fields completed by this chunk (empty if none)
+        """
+        self.buffer += chunk
+        completed = {}
+        buffer = self.buffer
+        index = self.position
+
+        while index < len(buffer) and not self.complete:
+            char = buffer[index]
+
+            if not self.started:
+                if char == "{":
+                    self.started = True
+                    self.depth = 1
+                index += 1
+                continue
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.key is None and self.value_start is None:
+                        # End of a top-level key
+                        self.key = json.loads(buffer[self.key_start:index + 1])
+                index += 1
+                continue
+
+            if char == '"':
+                self.in_string = True
+                if self.depth == 1 and self.key is None:
+                    self.key_start = index
+            elif char == ":" and self.depth == 1 and self.key is not None and self.value_start is None:
+                self.value_start = index + 1
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self._finish_value(buffer[self.value_start:index] if self.value_start else None, completed)
+                    self.complete = True
+            elif char == "," and self.depth == 1:
+                self._finish_value(buffer[self.value_start:index] if self.value_start else None, completed)
+            index += 1
+
+        self.position = index
+        return completed
+
+    def _finish_value(self, text, completed):
+        """Decode the value of the current top-level field and reset for the next one"""
+        key = self.key
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        if key is None or text is None:
+            return
+        try:
+            value = json.loads(text)
+        except ValueError:
+            return
+        self.fields[key] = value
+        completed[key] = value
+
+    def has_fields(self, names):
+        """Whether every named field has been completed"""
+        return all(name in self.fields for name in names)
+
+    def text(self):
+        """All text fed so far"""
+        return self.buffer
+
+class FieldStream:
+    """
+    Watch a streamed response for the fields of its JSON object
+
+    Args:
+        required_fields: Fields after which the rest of the response is not needed
+        on_fields: Optional function called with each batch of newly completed fields
+    """
+    def __init__(self, required_fields=(), on_fields=None):
+        self.required_fields = tuple(required_fields)
+        self.on_fields = on_fields
+        self.restart()
+
+    def restart(self):
+        """Start over, e.g. when the call is retried"""
+        self.parser = IncrementalJSONParser()
+        self.started_at = time.perf_counter()
+        self.first_field_seconds = None
+        self.stopped_early = False
+
+    def feed(self, chunk):
+        """
+        Take the next chunk of the response
+
+        Returns:
+        - True once the object is complete or every required field has arrived
+        """
+        fields = self.parser.feed(chunk)
+        if fields:
+            if self.first_field_seconds is None:
+                self.first_field_seconds = time.perf_counter() - self.started_at
+            if self.on_fields is not None:
+                self.on_fields(fields)
+        if self.parser.complete:
+            return True
+        if self.required_fields and self.parser.has_fields(self.required_fields):
+            self.stopped_early = True
+            return True
+        return False
+
+    @property
+    def fields(self):
+        return self.parser.fields
+
+    def response_text(self, text):
+        """The response to parse: the fields received when the stream was cut short, else the text itself"""
+        if self.stopped_early:
+            return json.dumps(self.parser.fields)
+        return text
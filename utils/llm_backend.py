@@ -0,0 +1,632 @@
+"""
+LLM backends for Resume Parser application.
+GeminiProcessor talks to the model only through an LLMBackend, so providers can be
+swapped without touching the pipeline. Gemini is the default; LocalHTTPBackend
+talks to a server on the same machine (see utils.local_llm_server), which lets
+throughput tests and CI run without network access or API quota.
+
+The backend is chosen with the RESUME_PARSER_LLM_BACKEND environment variable
+("gemini", "local" or "simulated"); RESUME_PARSER_LLM_URL points the local
+backend at its server. Any of them can be wrapped in a record/replay cassette
+(see utils.cassette).
+
+Responses can also be streamed (generate_stream()), so callers can act on the
+first fields of a response before it is complete; set
+RESUME_PARSER_LLM_STREAMING=0 to always wait for whole responses. Callers that
+expect JSON can pass a schema (see utils.structured_output); backends with a
+JSON response mode use it, the others rely on the prompt.
+
+Prompts can be split into a static prefix (instructions shared by a whole batch)
+and a per-call suffix. Gemini serves large prefixes from a context cache, so they
+are billed at the cached rate and not re-processed; every other backend simply
+sends prefix + suffix, with the prefix first so provider-side implicit prefix
+caching can apply.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import importlib.util
+import threading
+import urllib.error
+
+BACKEND_ENV_VAR = "RESUME_PARSER_LLM_BACKEND"
+URL_ENV_VAR = "RESUME_PARSER_LLM_URL"
+STREAMING_ENV_VAR = "RESUME_PARSER_LLM_STREAMING"
+CONTEXT_CACHE_MIN_TOKENS_ENV_VAR = "RESUME_PARSER_CONTEXT_CACHE_MIN_TOKENS"
+
+BACKEND_GEMINI = "gemini"
+BACKEND_LOCAL = "local"
+BACKEND_SIMULATED = "simulated"
+
+DEFAULT_MODEL = "gemini-1.5-pro"
+DEFAULT_LOCAL_URL = "http://127.0.0.1:8765"
+LOCAL_REQUEST_TIMEOUT = 120
+
+# Gemini context caching: smallest prefix worth caching (the API minimum for 1.5 models),
+# lifetime of a cache, and how long to wait before trying again after creation failed
+CONTEXT_CACHE_MIN_TOKENS = 32768
+CONTEXT_CACHE_TTL = 3600
+CONTEXT_CACHE_RETRY_AFTER = 600
+
+# Error classes returned by LLMBackend.classify_error
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_TRANSIENT = "transient"
+ERROR_FATAL = "fatal"
+
+# Rough characters-per-token ratio used when a backend cannot count tokens itself
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text):
+    """Estimate a text's token count locally, without calling any API"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+def make_usage(prompt_tokens, output_tokens, estimated, cached_tokens=0):
+    """
+    Token usage of one call, as reported by generate_with_usage()
+
+    cached_tokens is the part of prompt_tokens served from a context cache.
+    """
+    return {
+        "prompt_tokens": int(prompt_tokens or 0),
+        "output_tokens": int(output_tokens or 0),
+        "cached_tokens": int(cached_tokens or 0),
+        "estimated": bool(estimated)
+    }
+
+def join_prompt(prefix, prompt):
+    """The full prompt text for a static prefix and a per-call suffix"""
+    return prefix + prompt if prefix else prompt
+
+# Check if Google Generative AI is available without importing it; the package is
+# heavy and is only loaded on the first API call
+try:
+    GEMINI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ImportError:
+    GEMINI_AVAILABLE = False
+
+RATE_LIMIT_MARKERS = ("429", "resource has been exhausted", "quota", "rate limit")
+TRANSIENT_MARKERS = ("500", "502", "503", "504", "timed out", "timeout", "unavailable",
+                     "deadline exceeded", "connection reset", "connection refused", "temporarily")
+# Bad key, missing permission or malformed request: retrying cannot succeed
+FATAL_MARKERS = ("api key not valid", "api_key_invalid", "permission denied", "permission_denied",
+                 "unauthenticated", "invalid argument", "invalid_argument", "is not found")
+
+# 4xx statuses that are worth retrying
+RETRYABLE_CLIENT_STATUSES = (408, 429)
+
+# Schema keywords Gemini's response_schema understands; others (e.g. minimum) are dropped
+GEMINI_SCHEMA_KEYS = ("type", "format", "description", "nullable", "enum", "properties", "items", "required")
+
+# Server-suggested delays in Gemini error messages, e.g. "retry_delay { seconds: 17 }"
+RETRY_DELAY_PATTERNS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+)
+
+class LLMError(Exception):
+    """
+    Error from an LLM backend, classified for the retry logic
+
+    Attributes:
+    - error_class: ERROR_RATE_LIMIT, ERROR_TRANSIENT or ERROR_FATAL
+    - status_code: HTTP status, if known
+    - retry_after: Seconds the server asked us to wait before retrying, if given
+    """
+    error_class = ERROR_TRANSIENT
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class RateLimitError(LLMError):
+    """Quota or rate limit hit (HTTP 429); retry after backing off"""
+    error_class = ERROR_RATE_LIMIT
+
+class TransientError(LLMError):
+    """Server error, timeout or connection problem (HTTP 5xx); retry"""
+    error_class = ERROR_TRANSIENT
+
+class FatalError(LLMError):
+    """Bad request, authentication or permission error (HTTP 4xx); never retried"""
+    error_class = ERROR_FATAL
+
+ERROR_TYPES = {
+    ERROR_RATE_LIMIT: RateLimitError,
+    ERROR_TRANSIENT: TransientError,
+    ERROR_FATAL: FatalError,
+}
+
+def classify_status(status_code):
+    """Map an HTTP status to an error class, or None if it is not an error status"""
+    if not isinstance(status_code, int) or status_code < 400:
+        return None
+    if status_code == 429:
+        return ERROR_RATE_LIMIT
+    if status_code >= 500 or status_code in RETRYABLE_CLIENT_STATUSES:
+        return ERROR_TRANSIENT
+    return ERROR_FATAL
+
+def classify_message(message):
+    """
+    Classify an untyped error by its message; unknown errors count as transient
+
+    Transient markers are checked before fatal ones, so a server failure that also
+    mentions e.g. an invalid argument is still retried.
+    """
+    message = message.lower()
+    if any(marker in message for marker in RATE_LIMIT_MARKERS):
+        return ERROR_RATE_LIMIT
+    if any(marker in message for marker in TRANSIENT_MARKERS):
+        return ERROR_TRANSIENT
+    if any(marker in message for marker in FATAL_MARKERS):
+        return ERROR_FATAL
+    return ERROR_TRANSIENT
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header value (delay in seconds or an HTTP date)
+
+    Returns:
+    - Seconds to wait, or None if the value is missing or malformed
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        from email.utils import parsedate_to_datetime
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+def retry_delay_from_message(message):
+    """Extract a server-suggested retry delay from an error message, if there is one"""
+    for pattern in RETRY_DELAY_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def make_error(error_class, message, status_code=None, retry_after=None):
+    """Create the typed LLMError for an error class"""
+    return ERROR_TYPES.get(error_class, TransientError)(message, status_code=status_code, retry_after=retry_after)
+
+class ResponseStream:
+    """
+    Response text arriving in chunks
+
+    Iterate to receive the chunks as they arrive and close() to stop early. The full
+    text and token usage are available once the stream is exhausted or closed;
+    usage is estimated from the text received when the backend did not report it.
+
+    Args:
+        chunks: Iterator of (text, usage or None) tuples produced by the backend
+        prompt: The prompt, for estimating usage
+    """
+    def __init__(self, chunks, prompt):
+        self.chunks = chunks
+        self.prompt = prompt
+        self.parts = []
+        self.reported_usage = None
+        self.closed = False
+
+    def __iter__(self):
+        for text, usage in self.chunks:
+            if usage is not None:
+                self.reported_usage = usage
+            if text:
+                self.parts.append(text)
+                yield text
+
+    def close(self):
+        """Stop receiving; the backend abandons the rest of the response"""
+        if not self.closed:
+            self.closed = True
+            close = getattr(self.chunks, "close", None)
+            if close is not None:
+                close()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def usage(self):
+        if self.reported_usage is not None:
+            return self.reported_usage
+        return make_usage(estimate_tokens(self.prompt), estimate_tokens(self.text), estimated=True)
+
+class LLMBackend:
+    """
+    Base class for text generation backends
+
+    Subclasses implement generate(); the other methods have working defaults.
+    """
+    name = "base"
+
+    def is_available(self):
+        """Check whether the backend's dependencies are installed"""
+        return True
+
+    def generate(self, prompt, temperature=0.0):
+        """
+        Generate a completion for a prompt
+
+        Parameters:
+        - prompt: The prompt text
+        - temperature: Sampling temperature
+
+        Returns:
+        - Response text
+        """
+        raise NotImplementedError
+
+    def generate_with_usage(self, prompt, temperature=0.0, schema=None, prefix=None):
+        """
+        Generate a completion and report the tokens it used
+
+        Backends that do not get usage back from their API estimate it locally.
+        A schema asks for JSON output following it; backends without a JSON mode
+        ignore it. A prefix is static text sent before the prompt; backends without
+        context caching just prepend it.
+
+        Returns:
+        - Tuple of (response text, usage dictionary from make_usage())
+        """
+        prompt = join_prompt(prefix, prompt)
+        text = self.generate(prompt, temperature)
+        return text, make_usage(estimate_tokens(prompt), estimate_tokens(text), estimated=True)
+
+    def generate_stream(self, prompt, temperature=0.0, schema=None, prefix=None):
+        """
+        Generate a completion, receiving it in chunks as it is produced
+
+        Backends that cannot stream deliver the whole response as one chunk.
+
+        Returns:
+        - ResponseStream
+        """
+        def chunks():
+            text, usage = self.generate_with_usage(prompt, temperature, schema, prefix)
+            yield text, usage
+        return ResponseStream(chunks(), join_prompt(prefix, prompt))
+
+    async def generate_async(self, prompt, temperature=0.0):
+        """Generate a completion without blocking the event loop"""
+        import asyncio
+        return await asyncio.to_thread(self.generate, prompt, temperature)
+
+    def count_tokens(self, text):
+        """Estimate the number of tokens in a text"""
+        return estimate_tokens(text)
+
+    def classify_error(self, error):
+        """
+        Classify an exception raised by generate()
+
+        Returns:
+        - ERROR_RATE_LIMIT, ERROR_TRANSIENT or ERROR_FATAL
+        """
+        if isinstance(error, LLMError):
+            return error.error_class
+
+        status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+        error_class = classify_status(status_code)
+        if error_class is not None:
+            return error_class
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return ERROR_TRANSIENT
+        # Unknown errors are retried, as they always were
+        return classify_message(str(error))
+
+class GeminiBackend(LLMBackend):
+    """
+    Google Gemini through the google-generativeai package
+    """
+    name = BACKEND_GEMINI
+
+    def __init__(self, api_key, model=DEFAULT_MODEL):
+        self.api_key = api_key
+        self.model = model
+        self._genai = None
+        # Cleared if the API or client library rejects response schemas
+        self.schema_supported = True
+        self.cache_min_tokens = int(os.environ.get(CONTEXT_CACHE_MIN_TOKENS_ENV_VAR, CONTEXT_CACHE_MIN_TOKENS))
+        self.caches = {}   # prefix hash -> (CachedContent or None if creation failed, valid until)
+        self.cache_lock = threading.Lock()
+        self.lock = threading.Lock()
+
+    def is_available(self):
+        return GEMINI_AVAILABLE
+
+    def _get_model(self):
+        """Import and configure the Gemini client library on first use"""
+        with self.lock:
+            if self._genai is None:
+                import google.generativeai as genai
+
+                # Configure the Gemini API
+                try:
+                    genai.configure(api_key=self.api_key)
+                except Exception as e:
+                    print(f"Error configuring Gemini: {e}")
+                self._genai = genai
+        return self._genai.GenerativeModel(self.model)
+
+    def generate(self, prompt, temperature=0.0):
+        return self.generate_with_usage(prompt, temperature)[0]
+
+    def _generation_config(self, temperature, schema, use_schema=True):
+        """Generation settings; a schema switches on JSON output"""
+        config = {"temperature": temperature}
+        if schema is not None:
+            config["response_mime_type"] = "application/json"
+            if use_schema and self.schema_supported:
+                config["response_schema"] = _gemini_schema(schema)
+        return config
+
+    def _cached_content(self, prefix):
+        """
+        Get (creating it if needed) the context cache holding a prompt prefix
+
+        Returns:
+        - CachedContent, or None if the prefix is too small to cache or caching failed
+        """
+        if estimate_tokens(prefix) < self.cache_min_tokens:
+            return None
+
+        key = hashlib.sha256(f"{self.model}\n{prefix}".encode("utf-8")).hexdigest()
+        with self.cache_lock:
+            cached, valid_until = self.caches.get(key, (None, 0))
+            # Refresh a little before expiry so in-flight calls never hit an expired cache
+            if time.time() < valid_until - 60:
+                return cached
+
+            self._get_model()
+            try:
+                import datetime
+                model = self.model if self.model.startswith("models/") else f"models/{self.model}"
+                cached = self._genai.caching.CachedContent.create(
+                    model=model,
+                    display_name=f"resume-parser-{key[:12]}",
+                    contents=[prefix],
+                    ttl=datetime.timedelta(seconds=CONTEXT_CACHE_TTL)
+                )
+                self.caches[key] = (cached, time.time() + CONTEXT_CACHE_TTL)
+                print(f"Cached a {estimate_tokens(prefix)}-token prompt prefix for {CONTEXT_CACHE_TTL} s")
+            except Exception as e:
+                print(f"Context caching unavailable, sending full prompts: {e}")
+                cached = None
+                self.caches[key] = (None, time.time() + CONTEXT_CACHE_RETRY_AFTER)
+            return cached
+
+    def _model_and_contents(self, prompt, prefix):
+        """The model to call and the text to send, using a context cache for the prefix if possible"""
+        if prefix:
+            cached = self._cached_content(prefix)
+            if cached is not None:
+                return self._genai.GenerativeModel.from_cached_content(cached_content=cached), prompt
+        return self._get_model(), join_prompt(prefix, prompt)
+
+    def _generate_content(self, prompt, temperature, schema, prefix=None, **kwargs):
+        """Call generate_content, retrying once without the schema if it is rejected"""
+        model, contents = self._model_and_contents(prompt, prefix)
+        try:
+            return model.generate_content(
+                contents, generation_config=self._generation_config(temperature, schema), **kwargs)
+        except Exception as e:
+            # The client library raises ValueError for schemas it cannot convert; the API answers 400
+            rejected = isinstance(e, (ValueError, TypeError)) or getattr(e, "code", None) == 400
+            if schema is None or not self.schema_supported or not rejected:
+                raise
+            response = model.generate_content(
+                contents, generation_config=self._generation_config(temperature, schema, use_schema=False), **kwargs)
+            # Only a request that works without the schema shows the schema was the problem
+            print(f"Gemini rejected the response schema, using plain JSON mode: {e}")
+            self.schema_supported = False
+            return response
+
+    def generate_with_usage(self, prompt, temperature=0.0, schema=None, prefix=None):
+        try:
+            response = self._generate_content(prompt, temperature, schema, prefix)
+            text = response.text
+        except Exception as e:
+            raise self._to_llm_error(e) from e
+
+        usage = self._usage_from(response)
+        if usage is not None:
+            return text, usage
+        return text, make_usage(estimate_tokens(join_prompt(prefix, prompt)), estimate_tokens(text), estimated=True)
+
+    def generate_stream(self, prompt, temperature=0.0, schema=None, prefix=None):
+        def chunks():
+            try:
+                response = self._generate_content(prompt, temperature, schema, prefix, stream=True)
+                for chunk in response:
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks carrying only the finish reason or usage have no text
+                        text = ""
+                    yield text, self._usage_from(chunk)
+            except Exception as e:
+                raise self._to_llm_error(e) from e
+        # Closing the generator stops reading; the client library drops the rest of the stream
+        return ResponseStream(chunks(), join_prompt(prefix, prompt))
+
+    def _usage_from(self, response):
+        """Token usage reported with a response or response chunk, or None"""
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is not None and getattr(metadata, "prompt_token_count", None):
+            return make_usage(metadata.prompt_token_count, getattr(metadata, "candidates_token_count", 0),
+                              estimated=False, cached_tokens=getattr(metadata, "cached_content_token_count", 0))
+        return None
+
+    async def generate_async(self, prompt, temperature=0.0):
+        try:
+            response = await self._get_model().generate_content_async(
+                prompt,
+                generation_config={"temperature": temperature}
+            )
+            return response.text
+        except Exception as e:
+            raise self._to_llm_error(e) from e
+
+    def _to_llm_error(self, error):
+        """
+        Convert a google-api-core (or other) exception into a typed LLMError
+
+        google.api_core exceptions carry the HTTP status in .code; quota errors
+        include the server's suggested retry delay in their message.
+        """
+        message = f"Gemini API call failed: {error}"
+        status_code = getattr(error, "code", None)
+        if not isinstance(status_code, int):
+            status_code = None
+
+        error_class = classify_status(status_code)
+        if error_class is None:
+            if isinstance(error, ValueError) and "response.text" in str(error):
+                # Blocked or empty candidate: asking again gives the same answer
+                error_class = ERROR_FATAL
+            elif isinstance(error, (TimeoutError, ConnectionError)):
+                error_class = ERROR_TRANSIENT
+            else:
+                error_class = classify_message(str(error))
+
+        return make_error(error_class, message, status_code, retry_delay_from_message(str(error)))
+
+    def count_tokens(self, text):
+        try:
+            return self._get_model().count_tokens(text).total_tokens
+        except Exception as e:
+            print(f"Gemini token count failed, estimating instead: {e}")
+            return super().count_tokens(text)
+
+class LocalHTTPBackend(LLMBackend):
+    """
+    A model served over HTTP on the same machine
+
+    POST {url}/generate with {"prompt": ..., "temperature": ..., "schema": ..., "prefix": ...}
+    returns {"text": ...}
+    and optionally {"usage": {"prompt_tokens": ..., "output_tokens": ...}};
+    POST {url}/count_tokens with {"text": ...} returns {"tokens": ...}.
+    POST {url}/generate_stream takes the same body as /generate and answers with
+    newline-delimited JSON: {"text": ...} per chunk, then {"usage": ...}.
+    """
+    name = BACKEND_LOCAL
+
+    def __init__(self, url=DEFAULT_LOCAL_URL, timeout=LOCAL_REQUEST_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _post(self, path, payload):
+        with self._open(path, payload) as response:
+            return json.loads(response.read().decode("utf-8"))
+
+    def _open(self, path, payload):
+        """POST a JSON payload and return the open response, raising typed errors"""
+        import urllib.request
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            message = f"Local LLM server returned {e.code}: {e.read().decode('utf-8', 'replace')[:200]}"
+            error_class = classify_status(e.code) or ERROR_TRANSIENT
+            raise make_error(error_class, message, e.code, parse_retry_after(e.headers.get("Retry-After"))) from e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise TransientError(f"Local LLM server unreachable at {self.url}: {e}") from e
+
+    def generate(self, prompt, temperature=0.0):
+        return self.generate_with_usage(prompt, temperature)[0]
+
+    def generate_with_usage(self, prompt, temperature=0.0, schema=None, prefix=None):
+        response = self._post("/generate", {"prompt": prompt, "temperature": temperature, "schema": schema,
+                                            "prefix": prefix})
+        text = response["text"]
+        usage = response.get("usage")
+        if usage:
+            return text, make_usage(usage.get("prompt_tokens"), usage.get("output_tokens"),
+                                    usage.get("estimated", False), usage.get("cached_tokens"))
+        return text, make_usage(estimate_tokens(join_prompt(prefix, prompt)), estimate_tokens(text), estimated=True)
+
+    def generate_stream(self, prompt, temperature=0.0, schema=None, prefix=None):
+        def chunks():
+            response = self._open("/generate_stream", {"prompt": prompt, "temperature": temperature,
+                                                       "schema": schema, "prefix": prefix})
+            # Closing the response on an early stop drops the connection, which ends generation
+            with response:
+                for line in response:
+                    if not line.strip():
+                        continue
+                    message = json.loads(line)
+                    if "error" in message:
+                        raise TransientError(f"Local LLM server stream failed: {message['error']}")
+                    usage = message.get("usage")
+                    if usage:
+                        usage = make_usage(usage.get("prompt_tokens"), usage.get("output_tokens"),
+                                           usage.get("estimated", False), usage.get("cached_tokens"))
+                    yield message.get("text", ""), usage
+        return ResponseStream(chunks(), join_prompt(prefix, prompt))
+
+    def count_tokens(self, text):
+        try:
+            return self._post("/count_tokens", {"text": text})["tokens"]
+        except Exception:
+            return super().count_tokens(text)
+
+def _gemini_schema(schema):
+    """Copy of a schema with only the keywords Gemini's response_schema accepts"""
+    converted = {key: value for key, value in schema.items() if key in GEMINI_SCHEMA_KEYS}
+    if "properties" in converted:
+        converted["properties"] = {name: _gemini_schema(value) for name, value in converted["properties"].items()}
+    if "items" in converted:
+        converted["items"] = _gemini_schema(converted["items"])
+    return converted
+
+def streaming_enabled():
+    """Whether responses should be streamed (RESUME_PARSER_LLM_STREAMING, on by default)"""
+    return os.environ.get(STREAMING_ENV_VAR, "1").strip().lower() not in ("0", "false", "no", "off")
+
+def get_backend_name():
+    """Name of the backend selected through the environment"""
+    return os.environ.get(BACKEND_ENV_VAR, BACKEND_GEMINI).strip().lower() or BACKEND_GEMINI
+
+def get_backend(api_key=None, model=DEFAULT_MODEL, name=None):
+    """
+    Create the configured LLM backend
+
+    Parameters:
+    - api_key: Gemini API key (ignored by the other backends)
+    - model: Gemini model name
+    - name: Backend name; defaults to RESUME_PARSER_LLM_BACKEND, then "gemini"
+
+    Returns:
+    - LLMBackend instance
+    """
+    name = name or get_backend_name()
+    if name == BACKEND_GEMINI:
+        backend = GeminiBackend(api_key, model)
+    elif name == BACKEND_LOCAL:
+        backend = LocalHTTPBackend(os.environ.get(URL_ENV_VAR, DEFAULT_LOCAL_URL))
+    elif name == BACKEND_SIMULATED:
+        from utils.simulated_backend import SimulatedGemini
+        backend = SimulatedGemini()
+    else:
+        raise ValueError(f"Unknown LLM backend '{name}' (expected gemini, local or simulated)")
+    
+    # Record or replay the backend's calls if a cassette is configured
+    from utils.cassette import wrap_with_cassette
+    return wrap_with_cassette(backend)
@@ -0,0 +1,161 @@
+"""
+Local stand-in LLM server for Resume Parser application.
+Serves the LocalHTTPBackend protocol from utils.llm_backend on this machine,
+answering with the simulated backend, so the full app, throughput tests and CI
+can run air-gapped.
+
+Usage:
+    python -m utils.local_llm_server --port 8765 --latency-mean 0.5
+    RESUME_PARSER_LLM_BACKEND=local streamlit run app.py
+"""
+
+import sys
+import json
+import math
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from utils.simulated_backend import LATENCY_DISTRIBUTIONS, SimulatedGemini
+
+class LLMRequestHandler(BaseHTTPRequestHandler):
+    """Answers /generate, /generate_stream and /count_tokens with the server's backend"""
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status_code, payload, retry_after=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        if retry_after is not None:
+            self.send_header("Retry-After", str(int(math.ceil(retry_after))))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload):
+        """Write one newline-delimited JSON message as an HTTP chunk"""
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, backend, payload):
+        """Answer /generate_stream; errors before the first chunk still get a proper status"""
+        stream = backend.generate_stream(payload["prompt"], payload.get("temperature", 0.0), payload.get("schema"),
+                                         payload.get("prefix"))
+        chunks = iter(stream)
+        first = next(chunks, None)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            try:
+                if first is not None:
+                    self._send_chunk({"text": first})
+                for chunk in chunks:
+                    self._send_chunk({"text": chunk})
+                self._send_chunk({"usage": stream.usage})
+            except (BrokenPipeError, ConnectionResetError):
+                # The client stopped reading early
+                self.close_connection = True
+                return
+            except Exception as e:
+                self._send_chunk({"error": str(e)})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            stream.close()
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "backend": self.server.backend.name})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+
+        backend = self.server.backend
+        try:
+            if self.path == "/generate":
+                text, usage = backend.generate_with_usage(payload["prompt"], payload.get("temperature", 0.0),
+                                                          payload.get("schema"), payload.get("prefix"))
+                self._send_json(200, {"text": text, "usage": usage})
+            elif self.path == "/generate_stream":
+                self._stream(backend, payload)
+            elif self.path == "/count_tokens":
+                self._send_json(200, {"tokens": backend.count_tokens(payload["text"])})
+            else:
+                self._send_json(404, {"error": "not found"})
+        except KeyError as e:
+            self._send_json(400, {"error": f"missing field {e}"})
+        except Exception as e:
+            # Pass the backend's own status and retry delay (e.g. a simulated 429) through to the client
+            self._send_json(getattr(e, "status_code", None) or 500, {"error": str(e)},
+                            getattr(e, "retry_after", None))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+def start_server(backend=None, host="127.0.0.1", port=8765, verbose=False):
+    """
+    Start the server in a daemon thread
+
+    Args:
+        backend: LLMBackend answering the requests; defaults to a SimulatedGemini
+        host: Interface to bind
+        port: Port to bind, or 0 for any free port
+
+    Returns:
+        The running ThreadingHTTPServer; its URL is http://host:server.server_port
+    """
+    server = ThreadingHTTPServer((host, port), LLMRequestHandler)
+    server.daemon_threads = True
+    server.backend = backend or SimulatedGemini()
+    server.verbose = verbose
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in LLM server")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", type=int, default=8765, help="Port to bind")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Latency distribution")
+    parser.add_argument("--latency-mean", type=float, default=1.5, help="Mean response latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Spread of the latency distribution")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After seconds sent with each 429")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of responses with invalid JSON")
+    parser.add_argument("--max-concurrent", type=int, default=None,
+                        help="Requests served at once; further ones get a 429")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the simulator")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    backend = SimulatedGemini(latency=args.latency, latency_mean=args.latency_mean,
+                              latency_sigma=args.latency_sigma, rate_limit_rate=args.rate_limit_rate,
+                              malformed_rate=args.malformed_rate, seed=args.seed,
+                              retry_after=args.retry_after, server_error_rate=args.server_error_rate,
+                              max_concurrent=args.max_concurrent)
+    server = start_server(backend, args.host, args.port, args.verbose)
+    print(f"Local LLM server listening on http://{args.host}:{server.server_port}")
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
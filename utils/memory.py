@@ -0,0 +1,47 @@
+"""
+Memory accounting for Resume Parser application.
+Estimates how much memory result entries and Streamlit session state hold, so
+retention can be reported per session.
+"""
+
+import sys
+
+def deep_sizeof(obj, seen=None):
+    """
+    Approximate size in bytes of an object and the containers and strings it holds
+
+    Objects referenced more than once are counted once. Slotted records count
+    what their slots hold; other objects (e.g. a processor kept in session
+    state) count only their own size, since they are shared rather than owned.
+
+    Parameters:
+    - obj: Object to measure
+    - seen: Set of object IDs already counted, shared across calls to sum several objects
+
+    Returns:
+    - Size in bytes
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    else:
+        # Slotted records (e.g. ResumeRecord) own what their slots hold
+        for name in getattr(type(obj), "__slots__", ()):
+            size += deep_sizeof(getattr(obj, name, None), seen)
+    return size
+
+def format_bytes(size):
+    """Human-readable size, e.g. 1.5 MB"""
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} GB"
@@ -0,0 +1,348 @@
+"""
+Pipeline metrics for Resume Parser application.
+Every stage (upload save, text extraction, prompt build, rate-limiter wait, API
+call, response parse, filtering) records its duration in a histogram, and calls,
+retries and errors are counted. Metrics live in a process-wide registry, are served
+in Prometheus text format by a small local HTTP listener and are summarised in
+the Streamlit diagnostics panel.
+"""
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+METRICS_PORT_ENV_VAR = "RESUME_PARSER_METRICS_PORT"
+DEFAULT_METRICS_PORT = 9464
+METRICS_PREFIX = "resume_parser_"
+
+# Seconds; covers sub-millisecond parses up to multi-minute OCR and backoff waits
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_UPLOAD_SAVE = "upload_save"
+STAGE_EXTRACTION = "extraction"
+STAGE_PROMPT_BUILD = "prompt_build"
+STAGE_CONCURRENCY_WAIT = "concurrency_wait"
+STAGE_RATE_LIMIT_WAIT = "rate_limit_wait"
+STAGE_API_CALL = "api_call"
+STAGE_RESPONSE_PARSE = "response_parse"
+STAGE_FILTERING = "filtering"
+
+def _label_key(labelnames, labels):
+    """Order label values by the metric's label names"""
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {sorted(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonically increasing count, one series per label combination"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def total(self, **labels):
+        """Sum of every series whose labels include the given values"""
+        wanted = {name: str(value) for name, value in labels.items()}
+        with self.lock:
+            return sum(value for key, value in self.values.items()
+                       if all(dict(zip(self.labelnames, key)).get(name) == value for name, value in wanted.items()))
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name + "_total", self.labelnames, key, None, value
+
+class Gauge:
+    """Value that can go up and down, one series per label combination"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def get(self, **labels):
+        with self.lock:
+            return self.values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            yield self.name, self.labelnames, key, None, value
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, one series per label combination"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def summary(self, **labels):
+        """
+        Count, sum and bucket-interpolated percentiles of one series
+
+        Returns:
+        - Dictionary with count, sum, mean, p50 and p95 (None when nothing was observed)
+        """
+        with self.lock:
+            series = self.series.get(_label_key(self.labelnames, labels))
+            series = list(series) if series else None
+        if not series:
+            return None
+
+        counts = series[:-1]
+        count = sum(counts)
+        total = series[-1]
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0.0,
+            "p50": self._quantile(counts, count, 0.5),
+            "p95": self._quantile(counts, count, 0.95),
+        }
+
+    def _quantile(self, counts, count, quantile):
+        """Estimate a quantile by linear interpolation within its bucket"""
+        rank = quantile * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    # Beyond the largest bucket: report its upper bound
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def label_sets(self):
+        """Label dictionaries of every series observed so far"""
+        with self.lock:
+            keys = sorted(self.series)
+        return [dict(zip(self.labelnames, key)) for key in keys]
+
+    def samples(self):
+        with self.lock:
+            items = sorted((key, list(series)) for key, series in self.series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += bucket_count
+                yield self.name + "_bucket", self.labelnames, key, ("le", _format_value(float(bound))), cumulative
+            yield self.name + "_count", self.labelnames, key, None, cumulative
+            yield self.name + "_sum", self.labelnames, key, None, series[-1]
+
+class MetricsRegistry:
+    """Named collection of metrics, rendered together"""
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        name = METRICS_PREFIX + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample_name, labelnames, values, extra, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(labelnames, values, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram("stage_seconds", "Time spent in each pipeline stage", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("stage_errors", "Pipeline stage runs that raised an exception", ["stage"])
+EXTRACTION_SECONDS = REGISTRY.histogram("extraction_seconds", "Text extraction time per engine", ["engine"])
+API_CALLS = REGISTRY.counter("api_calls", "LLM API calls by backend and outcome", ["backend", "outcome"])
+RETRIES = REGISTRY.counter("retries", "LLM API retries by error class", ["error_class"])
+UPLOADS = REGISTRY.counter("uploads", "Uploaded files by outcome", ["outcome"])
+TOKENS = REGISTRY.counter("tokens", "LLM tokens used by kind of call and direction", ["kind", "direction"])
+BUDGET_REFUSALS = REGISTRY.counter("budget_refusals", "LLM calls refused by a token budget", ["scope"])
+RATE_LIMIT_DELAY = REGISTRY.gauge("rate_limit_delay_seconds", "Current delay enforced between API calls")
+FIRST_FIELD_SECONDS = REGISTRY.histogram("first_field_seconds",
+                                         "Time from API call start to the first streamed response field", ["backend"])
+STREAMS_STOPPED_EARLY = REGISTRY.counter("streams_stopped_early",
+                                         "Streamed responses cut short once every required field had arrived",
+                                         ["backend"])
+RESPONSE_PARSES = REGISTRY.counter("response_parses",
+                                   "LLM responses by how their JSON was recovered (json, repaired, partial)", ["outcome"])
+FOLLOW_UPS = REGISTRY.counter("follow_up_requests", "Follow-up requests for fields a response lacked", ["outcome"])
+CIRCUIT_OPEN = REGISTRY.gauge("circuit_open", "1 while the LLM API circuit breaker is open")
+ROUTED_CALLS = REGISTRY.counter("routed_calls", "LLM calls by kind of call and model tier", ["kind", "tier"])
+ESCALATIONS = REGISTRY.counter("escalations", "Responses redone on the large model tier, by reason", ["reason"])
+CONCURRENCY_LIMIT = REGISTRY.gauge("concurrency_limit", "Current adaptive limit on concurrent LLM API calls")
+IN_FLIGHT_CALLS = REGISTRY.gauge("in_flight_calls", "LLM API calls currently in flight")
+CONCURRENCY_DECREASES = REGISTRY.counter("concurrency_decreases",
+                                         "Cuts of the concurrency limit by cause (rate_limit, latency)", ["reason"])
+TASKS_CANCELLED = REGISTRY.counter("tasks_cancelled",
+                                   "Tasks cancelled or past their deadline, by reason and the status they were in",
+                                   ["reason", "stage"])
+QUEUE_DEPTH = REGISTRY.gauge("queue_depth", "Tasks waiting in each priority lane of the processing queue", ["lane"])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("queue_wait_seconds", "Time tasks waited in the processing queue", ["lane"])
+STARVATION_PROMOTIONS = REGISTRY.counter("starvation_promotions",
+                                         "Tasks served ahead of higher lanes because their lane was starving",
+                                         ["lane"])
+RETAINED_RESULTS = REGISTRY.gauge("retained_results", "Task result entries held in memory by the processing queue")
+RESULTS_EVICTED = REGISTRY.counter("results_evicted",
+                                   "Finished results dropped from memory, by cause (ttl, capacity)", ["reason"])
+
+@contextmanager
+def time_stage(stage):
+    """Record the duration of a pipeline stage, and count it as an error if it raises"""
+    start_time = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start_time, stage=stage)
+
+def stage_summaries():
+    """
+    Summaries of every stage and extraction engine observed so far
+
+    Returns:
+    - List of dictionaries with the stage name, call count, error count and timings in seconds
+    """
+    rows = []
+    for labels in STAGE_SECONDS.label_sets():
+        summary = STAGE_SECONDS.summary(**labels)
+        rows.append(dict(stage=labels["stage"], errors=STAGE_ERRORS.get(stage=labels["stage"]), **summary))
+    for labels in EXTRACTION_SECONDS.label_sets():
+        summary = EXTRACTION_SECONDS.summary(**labels)
+        rows.append(dict(stage=f"{STAGE_EXTRACTION}:{labels['engine']}", errors=0, **summary))
+    for labels in FIRST_FIELD_SECONDS.label_sets():
+        summary = FIRST_FIELD_SECONDS.summary(**labels)
+        rows.append(dict(stage=f"first_field:{labels['backend']}", errors=0, **summary))
+    return rows
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serve /metrics in Prometheus text format from a daemon thread
+
+    Only one listener is started per process; later calls return the running one.
+
+    Args:
+        port: Port to listen on; defaults to RESUME_PARSER_METRICS_PORT, then 9464
+        host: Interface to bind; local only by default
+
+    Returns:
+        The running HTTP server, or None if the port could not be bound
+    """
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        if port is None:
+            port = int(os.environ.get(METRICS_PORT_ENV_VAR, DEFAULT_METRICS_PORT))
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Could not start metrics listener on {host}:{port}: {e}")
+            return None
+        server.daemon_threads = True
+
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        print(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        _server = server
+        return _server
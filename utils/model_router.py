@@ -0,0 +1,165 @@
+"""
+Model routing for Resume Parser application.
+Each kind of LLM call (resume extraction, NLP query parsing, custom columns) is
+sent to a model tier: a fast, cheap model or a large one. Resume extraction
+starts on the fast tier and is escalated to the large tier only when the fast
+model's answer fails validation or looks unreliable, so most resumes never
+touch the slower, more expensive model.
+
+Models are configured with RESUME_PARSER_MODEL_FAST and RESUME_PARSER_MODEL_LARGE;
+RESUME_PARSER_ROUTE_<KIND>=fast|large (e.g. RESUME_PARSER_ROUTE_RESUME=large)
+overrides the tier of one kind of call.
+"""
+
+import os
+import re
+from utils.llm_backend import BACKEND_GEMINI, DEFAULT_MODEL, get_backend, get_backend_name
+from utils.token_ledger import KIND_CUSTOM_COLUMN, KIND_NLP_QUERY, KIND_RESUME
+
+TIER_FAST = "fast"
+TIER_LARGE = "large"
+TIERS = (TIER_FAST, TIER_LARGE)
+
+DEFAULT_FAST_MODEL = "gemini-1.5-flash"
+DEFAULT_LARGE_MODEL = DEFAULT_MODEL
+
+MODEL_ENV_PREFIX = "RESUME_PARSER_MODEL_"
+ROUTE_ENV_PREFIX = "RESUME_PARSER_ROUTE_"
+
+DEFAULT_ROUTES = {
+    KIND_RESUME: TIER_FAST,
+    KIND_NLP_QUERY: TIER_FAST,
+    KIND_CUSTOM_COLUMN: TIER_FAST,
+}
+
+# A response missing this many required fields is redone on the large tier rather than patched
+ESCALATE_MISSING_FIELDS = 4
+
+ESCALATION_VALIDATION = "validation"
+ESCALATION_LOW_CONFIDENCE = "low_confidence"
+
+_EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+def _normalize(text):
+    return re.sub(r"\s+", "", str(text)).lower()
+
+def confidence_issues(data, resume_text, name_hint=None):
+    """
+    Signs that an extraction is unreliable: values not grounded in the resume text
+
+    Parameters:
+    - data: Validated response fields
+    - resume_text: The resume text the response was extracted from
+    - name_hint: Candidate name guessed from the filename, which the prompt offers as a hint
+
+    Returns:
+    - List of short descriptions; empty if nothing looks wrong
+    """
+    issues = []
+    text = resume_text.lower()
+    compact_text = _normalize(resume_text)
+
+    name = str(data.get("name") or "").strip()
+    if not name:
+        issues.append("no name")
+    else:
+        sources = text + " " + (name_hint or "").lower()
+        tokens = [token for token in re.split(r"\W+", name.lower()) if len(token) > 1]
+        if tokens and not any(token in sources for token in tokens):
+            issues.append("name not in resume")
+
+    email = str(data.get("email") or "").strip()
+    if email and _normalize(email) not in compact_text and _EMAIL_PATTERN.search(resume_text):
+        # A different address than the one(s) in the resume is likely invented
+        issues.append("email not in resume")
+
+    experience = data.get("experience")
+    if isinstance(experience, (int, float)) and not 0 <= experience <= 60:
+        issues.append("implausible experience")
+
+    if not data.get("skills") and len(resume_text) > 500:
+        issues.append("no skills")
+
+    return issues
+
+class ModelRouter:
+    """
+    Map kinds of calls to model tiers and tiers to backends
+
+    Args:
+        backends: Dictionary mapping each tier in TIERS to its LLMBackend
+        routes: Dictionary mapping a call kind to its tier; defaults to DEFAULT_ROUTES
+        escalation_tier: Tier that hard cases are escalated to
+    """
+    def __init__(self, backends, routes=None, escalation_tier=TIER_LARGE):
+        missing = set(TIERS) - set(backends)
+        if missing:
+            raise ValueError(f"No backend for tiers: {', '.join(sorted(missing))}")
+        self.backends = dict(backends)
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+        unknown = set(self.routes.values()) - set(TIERS)
+        if unknown:
+            raise ValueError(f"Unknown tiers: {', '.join(sorted(unknown))}")
+        self.escalation_tier = escalation_tier
+
+    @classmethod
+    def from_env(cls, api_key, model=None, backend=None):
+        """
+        Build the router from the environment
+
+        Parameters:
+        - api_key: API key for the Gemini backends
+        - model: Use this one model for every tier (disables routing)
+        - backend: Use this one backend for every tier (e.g. a simulator in benchmarks)
+
+        Returns:
+        - ModelRouter
+        """
+        routes = {}
+        for kind in DEFAULT_ROUTES:
+            tier = os.environ.get(ROUTE_ENV_PREFIX + kind.upper())
+            if tier:
+                routes[kind] = tier.strip().lower()
+
+        if backend is None and model is None and get_backend_name() == BACKEND_GEMINI:
+            models = {
+                TIER_FAST: os.environ.get(MODEL_ENV_PREFIX + "FAST", DEFAULT_FAST_MODEL),
+                TIER_LARGE: os.environ.get(MODEL_ENV_PREFIX + "LARGE", DEFAULT_LARGE_MODEL),
+            }
+            return cls({tier: get_backend(api_key, name) for tier, name in models.items()}, routes)
+
+        # One model, or a backend without model choice: both tiers share it
+        backend = backend or get_backend(api_key, model or DEFAULT_LARGE_MODEL)
+        return cls({tier: backend for tier in TIERS}, routes)
+
+    def tier_for(self, kind):
+        """Tier that serves a kind of call"""
+        return self.routes.get(kind, TIER_FAST)
+
+    def backend(self, tier):
+        """Backend of a tier"""
+        return self.backends[tier]
+
+    def model_name(self, tier):
+        """Model behind a tier, for recording which one served a result"""
+        backend = self.backends[tier]
+        return getattr(backend, "model", None) or backend.name
+
+    def can_escalate(self, tier):
+        """Whether escalating from this tier would reach a different backend"""
+        return tier != self.escalation_tier and self.backends[tier] is not self.backends[self.escalation_tier]
+
+    def escalation_reason(self, tier, data, missing, resume_text, name_hint=None):
+        """
+        Decide whether a response from a tier should be redone on the escalation tier
+
+        Returns:
+        - ESCALATION_VALIDATION, ESCALATION_LOW_CONFIDENCE or None
+        """
+        if not self.can_escalate(tier):
+            return None
+        if not data or len(missing) >= ESCALATE_MISSING_FIELDS:
+            return ESCALATION_VALIDATION
+        if confidence_issues(data, resume_text, name_hint):
+            return ESCALATION_LOW_CONFIDENCE
+        return None
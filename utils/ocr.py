@@ -0,0 +1,133 @@
+"""
+OCR stage for scanned resumes.
+Pages are rendered with PyMuPDF and recognised with tesseract in the shared process
+pool, one wave of pages at a time, with a timeout per page. Results are cached on
+disk by file content hash so a scan is only ever OCR'd once; only complete runs are
+cached, so a timed-out page or an early stop at the character budget is retried later.
+"""
+
+import os
+import shutil
+import concurrent.futures
+import concurrent.futures.process
+from pathlib import Path
+from utils.file_handler import get_file_hash
+from utils.pdf_extractor import (MAX_TEXT_CHARS, PDF_PARALLEL_WORKERS,
+                                 get_process_pool, reset_process_pool)
+
+OCR_DPI = 300
+OCR_LANG = "eng"
+OCR_PAGE_TIMEOUT = 30
+OCR_MAX_PAGES = 10
+OCR_CACHE_DIR = Path("data/processed/ocr_cache")
+
+def is_ocr_available():
+    """Check that pytesseract and the tesseract binary are both installed"""
+    try:
+        import pytesseract
+    except ImportError:
+        return False
+    return shutil.which(pytesseract.pytesseract.tesseract_cmd) is not None
+
+def ocr_page(file_path, page_number, dpi=OCR_DPI, lang=OCR_LANG, timeout=OCR_PAGE_TIMEOUT):
+    """
+    Render one PDF page and run tesseract on it
+
+    Runs inside pool workers, so it opens its own document.
+
+    Returns:
+        Recognised text, or None if tesseract timed out
+    """
+    import io
+    import fitz  # PyMuPDF
+    import pytesseract
+    from PIL import Image
+
+    with fitz.open(file_path) as pdf:
+        pixmap = pdf[page_number].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+
+    try:
+        return pytesseract.image_to_string(image, lang=lang, timeout=timeout)
+    except RuntimeError as e:
+        # pytesseract raises RuntimeError when the per-page timeout kills tesseract
+        print(f"OCR of page {page_number + 1} in {file_path} failed: {e}")
+        return None
+
+def _cache_path(file_path, dpi, lang):
+    """Location of the cached OCR text for a file's content and OCR settings"""
+    return OCR_CACHE_DIR / f"{get_file_hash(file_path)}-{dpi}-{lang}.txt"
+
+def ocr_pdf(file_path, max_chars=MAX_TEXT_CHARS, dpi=OCR_DPI, lang=OCR_LANG, page_timeout=OCR_PAGE_TIMEOUT,
+            pdf=None):
+    """
+    Extract text from a scanned PDF with OCR
+
+    Args:
+        file_path: Path to the PDF file
+        max_chars: Stop once this many characters were recognised (None for no limit)
+        dpi: Rendering resolution passed to PyMuPDF
+        lang: Tesseract language code(s)
+        page_timeout: Seconds tesseract may spend on a single page
+        pdf: Optional document already opened by the caller, to read the page count from
+
+    Returns:
+        Recognised text content
+    """
+    if not is_ocr_available():
+        print(f"{file_path} needs OCR but tesseract is not installed")
+        return ""
+
+    cache_path = _cache_path(file_path, dpi, lang)
+    if cache_path.exists():
+        text = cache_path.read_text(encoding="utf-8")
+        return text[:max_chars] if max_chars is not None else text
+
+    if pdf is None:
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            page_count = min(pdf.page_count, OCR_MAX_PAGES)
+    else:
+        page_count = min(pdf.page_count, OCR_MAX_PAGES)
+
+    pages = []
+    total = 0
+    # Cleared when a page times out or the budget stops OCR early; partial text is not cached
+    complete = True
+    pool = get_process_pool()
+
+    try:
+        for wave_start in range(0, page_count, PDF_PARALLEL_WORKERS):
+            futures = [
+                pool.submit(ocr_page, file_path, page_number, dpi, lang, page_timeout)
+                for page_number in range(wave_start, min(wave_start + PDF_PARALLEL_WORKERS, page_count))
+            ]
+
+            # Collect in page order; the extra margin covers rendering time
+            for future in futures:
+                try:
+                    page_text = future.result(timeout=page_timeout + 10)
+                except concurrent.futures.TimeoutError:
+                    print(f"OCR page timed out in {file_path}")
+                    page_text = None
+                if page_text is None:
+                    complete = False
+                    page_text = ""
+                pages.append(page_text)
+                total += len(page_text)
+
+            if max_chars is not None and total >= max_chars:
+                complete = wave_start + PDF_PARALLEL_WORKERS >= page_count and complete
+                break
+    except concurrent.futures.process.BrokenProcessPool as e:
+        print(f"OCR worker pool failed ({e}) for {file_path}")
+        reset_process_pool()
+        return ""
+
+    text = "\n".join(pages).strip()
+
+    if text and complete:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        cache_path.write_text(text, encoding="utf-8")
+
+    return text[:max_chars] if max_chars is not None else text
@@ -0,0 +1,356 @@
+"""
+PDF text extraction engines for Resume Parser application.
+A cheap classification pass looks at the first pages of each file and routes it to
+a single engine up front. PyMuPDF is the primary engine: pages are extracted in
+parallel worker processes and extraction stops as soon as the character budget is
+met. Scans go to the OCR stage in utils.ocr. pdfplumber and PyPDF2 remain as
+fallbacks for files PyMuPDF cannot read, and for scans when tesseract is not
+installed.
+"""
+
+import time
+import threading
+from collections import deque
+from utils.metrics import EXTRACTION_SECONDS
+
+MAX_TEXT_CHARS = 30000
+CHARS_PER_TOKEN = 4
+
+# Documents with fewer pages are extracted in-process; the pool only pays off for long files
+PDF_PARALLEL_MIN_PAGES = 16
+PDF_PARALLEL_WORKERS = 4
+PDF_PAGES_PER_CHUNK = 4
+
+# Pages whose content stream is larger than this are drawings or scans, not resume text
+PDF_MAX_PAGE_CONTENT_BYTES = 2 * 1024 * 1024
+
+# Number of leading pages inspected when classifying a PDF
+CLASSIFY_SAMPLE_PAGES = 3
+
+# Extractable characters a page needs for its text layer to count; less is stray marks on a scan
+MIN_TEXT_LAYER_CHARS = 20
+
+ENGINE_PYMUPDF = "pymupdf"
+ENGINE_FALLBACK = "fallback"
+ENGINE_OCR = "ocr"
+
+# Recent routing decisions and timings, newest last
+extraction_log = deque(maxlen=1000)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """
+    Get the shared process pool used for page-parallel work
+
+    PyMuPDF is not thread-safe, so pages are extracted in separate processes.
+    The pool uses the spawn start method to stay safe inside threaded servers.
+    """
+    # Deferred: multiprocessing and the executor would add ~20 ms to importing file_handler
+    import multiprocessing
+    import concurrent.futures
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=PDF_PARALLEL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+def reset_process_pool():
+    """Discard the shared process pool, e.g. after a worker crashed"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def char_budget(max_chars=MAX_TEXT_CHARS, max_tokens=None):
+    """Convert an optional token budget into a character budget"""
+    if max_tokens is not None:
+        token_chars = max_tokens * CHARS_PER_TOKEN
+        return token_chars if max_chars is None else min(max_chars, token_chars)
+    return max_chars
+
+def extract_page_range(file_path, start, stop, max_chars=None, pdf=None):
+    """
+    Extract text from a range of pages with PyMuPDF
+
+    Runs in pool workers as well as in-process; pool workers open their own document.
+
+    Args:
+        file_path: Path to the PDF file
+        start: First page index (inclusive)
+        stop: Last page index (exclusive)
+        max_chars: Stop early once this many characters were collected
+        pdf: Optional document already opened by the caller's process
+
+    Returns:
+        Tuple of (list of page texts, number of skipped oversized pages)
+    """
+    if pdf is None:
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            return extract_page_range(file_path, start, stop, max_chars, pdf)
+
+    pages = []
+    skipped = 0
+    total = 0
+
+    for page_number in range(start, min(stop, pdf.page_count)):
+        page = pdf[page_number]
+        if len(page.read_contents()) > PDF_MAX_PAGE_CONTENT_BYTES:
+            skipped += 1
+            continue
+
+        page_text = page.get_text("text")
+        pages.append(page_text)
+        total += len(page_text)
+        if max_chars is not None and total >= max_chars:
+            break
+
+    return pages, skipped
+
+def extract_with_pymupdf(file_path, max_chars=MAX_TEXT_CHARS, pdf=None):
+    """
+    Extract text with PyMuPDF, in parallel for long documents
+
+    Pages are processed in waves of PDF_PARALLEL_WORKERS chunks; no further wave is
+    started once the character budget is reached.
+
+    Args:
+        file_path: Path to the PDF file
+        max_chars: Character budget, or None to read the whole document
+        pdf: Optional document already opened by the caller, used for in-process extraction
+
+    Returns:
+        Extracted text content
+    """
+    if pdf is None:
+        import fitz  # PyMuPDF
+        with fitz.open(file_path) as pdf:
+            return extract_with_pymupdf(file_path, max_chars, pdf)
+
+    page_count = pdf.page_count
+
+    pages = None
+    if page_count >= PDF_PARALLEL_MIN_PAGES:
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            pages, skipped = _extract_pages_in_parallel(file_path, page_count, max_chars)
+        except BrokenProcessPool as e:
+            print(f"PDF worker pool failed ({e}); extracting {file_path} in-process")
+            reset_process_pool()
+
+    if pages is None:
+        pages, skipped = extract_page_range(file_path, 0, page_count, max_chars, pdf)
+
+    if skipped:
+        print(f"Skipped {skipped} oversized page(s) in {file_path}")
+
+    text = "\n".join(pages)
+    return text[:max_chars] if max_chars is not None else text
+
+def _extract_pages_in_parallel(file_path, page_count, max_chars):
+    """Extract page chunks in the process pool, one wave at a time, until the budget is met"""
+    pool = get_process_pool()
+    pages = []
+    skipped = 0
+    total = 0
+    wave_size = PDF_PARALLEL_WORKERS * PDF_PAGES_PER_CHUNK
+
+    for wave_start in range(0, page_count, wave_size):
+        wave_stop = min(wave_start + wave_size, page_count)
+        futures = [
+            pool.submit(extract_page_range, file_path, start, min(start + PDF_PAGES_PER_CHUNK, wave_stop))
+            for start in range(wave_start, wave_stop, PDF_PAGES_PER_CHUNK)
+        ]
+
+        # Collect in page order
+        for future in futures:
+            chunk_pages, chunk_skipped = future.result()
+            pages.extend(chunk_pages)
+            skipped += chunk_skipped
+            total += sum(len(page_text) for page_text in chunk_pages)
+
+        if max_chars is not None and total >= max_chars:
+            break
+
+    return pages, skipped
+
+def extract_with_pdfplumber(file_path, max_chars=MAX_TEXT_CHARS):
+    """Extract text with pdfplumber, stopping once the budget is reached"""
+    import pdfplumber
+
+    pages = []
+    total = 0
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            # extract_text() returns None for pages without a text layer
+            page_text = page.extract_text() or ""
+            pages.append(page_text)
+            total += len(page_text)
+            if max_chars is not None and total >= max_chars:
+                break
+
+    text = "\n".join(pages)
+    return text[:max_chars] if max_chars is not None else text
+
+def extract_with_pypdf2(file_path, max_chars=MAX_TEXT_CHARS):
+    """Extract text with PyPDF2, stopping once the budget is reached"""
+    import PyPDF2
+
+    pages = []
+    total = 0
+    with open(file_path, "rb") as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            page_text = page.extract_text() or ""
+            pages.append(page_text)
+            total += len(page_text)
+            if max_chars is not None and total >= max_chars:
+                break
+
+    text = "\n".join(pages)
+    return text[:max_chars] if max_chars is not None else text
+
+# Engines tried, in order, for files PyMuPDF cannot open
+FALLBACK_ENGINES = [
+    ("pdfplumber", extract_with_pdfplumber),
+    ("pypdf2", extract_with_pypdf2),
+]
+
+def _open_pdf(file_path):
+    """Open a PDF with PyMuPDF, or return None if it is not installed or cannot read the file"""
+    try:
+        import fitz  # PyMuPDF
+        return fitz.open(file_path)
+    except Exception:
+        return None
+
+def classify_pdf(file_path, sample_pages=CLASSIFY_SAMPLE_PAGES, pdf=None):
+    """
+    Decide which engine should extract a PDF by inspecting its first pages
+
+    A page has a usable text layer when it references fonts and PyMuPDF extracts
+    at least MIN_TEXT_LAYER_CHARS characters from it. Pages with images but no text layer
+    are scans and need OCR. Files PyMuPDF cannot open go to the fallback engines.
+
+    Args:
+        file_path: Path to the PDF file
+        sample_pages: Number of leading pages to inspect
+        pdf: Optional document already opened by the caller
+
+    Returns:
+        Dictionary with the chosen engine, the reason and the time spent classifying
+    """
+    start_time = time.perf_counter()
+
+    if pdf is None:
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            return {"engine": ENGINE_FALLBACK, "reason": "PyMuPDF not installed",
+                    "seconds": time.perf_counter() - start_time}
+        try:
+            with fitz.open(file_path) as pdf:
+                return classify_pdf(file_path, sample_pages, pdf)
+        except Exception as e:
+            return {"engine": ENGINE_FALLBACK, "reason": f"PyMuPDF could not open file: {e}",
+                    "seconds": time.perf_counter() - start_time}
+
+    try:
+        has_images = False
+        for page_number in range(min(sample_pages, pdf.page_count)):
+            page = pdf[page_number]
+            # Pages without fonts cannot hold text; skipping get_text spares decoding their images
+            if page.get_fonts() and len(page.get_text("text").strip()) >= MIN_TEXT_LAYER_CHARS:
+                engine, reason = ENGINE_PYMUPDF, f"text layer on page {page_number + 1}"
+                break
+            has_images = has_images or bool(page.get_images())
+        else:
+            if has_images:
+                engine, reason = ENGINE_OCR, "no text layer, images only"
+            else:
+                engine, reason = ENGINE_OCR, "no text layer"
+    except Exception as e:
+        engine, reason = ENGINE_FALLBACK, f"PyMuPDF could not read file: {e}"
+
+    return {"engine": engine, "reason": reason, "seconds": time.perf_counter() - start_time}
+
+def extract_pdf_text(file_path, max_chars=MAX_TEXT_CHARS):
+    """
+    Classify a PDF and extract its text with the engine chosen for it
+
+    Each file is parsed by a single engine instead of trying every engine in turn.
+    The document is opened once and shared by classification, in-process
+    extraction and the OCR stage. The decision and its timings are appended to
+    extraction_log.
+
+    Args:
+        file_path: Path to the PDF file
+        max_chars: Character budget, or None to read the whole document
+
+    Returns:
+        Extracted text content
+    """
+    pdf = _open_pdf(file_path)
+    try:
+        return _extract_pdf_text(file_path, max_chars, pdf)
+    finally:
+        if pdf is not None:
+            pdf.close()
+
+def _extract_pdf_text(file_path, max_chars, pdf):
+    classification = classify_pdf(file_path, pdf=pdf)
+    engine = classification["engine"]
+    reason = classification["reason"]
+    start_time = time.perf_counter()
+    text = ""
+
+    if engine == ENGINE_PYMUPDF:
+        try:
+            text = extract_with_pymupdf(file_path, max_chars, pdf)
+            if not text.strip():
+                # Fonts but no extractable text (e.g. an invisible OCR layer that is empty)
+                engine = ENGINE_OCR
+        except Exception as e:
+            print(f"PyMuPDF failed: {e}")
+            engine = ENGINE_FALLBACK
+
+    if engine == ENGINE_OCR:
+        from utils.ocr import is_ocr_available
+        if not is_ocr_available():
+            # The other libraries may still find text PyMuPDF did not; better than parsing nothing
+            reason += "; OCR unavailable (tesseract not installed), trying fallback engines"
+            print(f"{file_path} needs OCR but tesseract is not installed; trying fallback engines")
+            engine = ENGINE_FALLBACK
+
+    if engine == ENGINE_FALLBACK:
+        for engine_name, extract in FALLBACK_ENGINES:
+            try:
+                text = extract(file_path, max_chars)
+                if text.strip():
+                    engine = engine_name
+                    break
+            except Exception as e:
+                print(f"{engine_name} failed: {e}")
+    if engine == ENGINE_OCR:
+        from utils.ocr import ocr_pdf
+        text = ocr_pdf(file_path, max_chars, pdf=pdf)
+
+    EXTRACTION_SECONDS.observe(classification["seconds"] + time.perf_counter() - start_time, engine=engine)
+    extraction_log.append({
+        "file_path": file_path,
+        "engine": engine,
+        "reason": reason,
+        "classify_seconds": classification["seconds"],
+        "extract_seconds": time.perf_counter() - start_time,
+        "chars": len(text)
+    })
+    print(f"Extracted {len(text)} chars from {file_path} with {engine} ({reason})")
+
+    return text.strip()
@@ -0,0 +1,222 @@
+"""
+Compact record type for parsed resumes.
+A parsed resume used to be a plain dict holding some data twice: work history,
+match reasons and gap analysis as lists with joined display strings beside
+them. ResumeRecord stores each field once in __slots__, keeps skills as a tuple
+of interned strings (shared by every candidate listing the same skill) and
+derives the display strings when they are read, which cuts the memory held per
+candidate in large pools severalfold.
+
+Item access returns exactly what the old dict held (skills as a joined string,
+the *_text keys, lists as lists), so existing callers keep working; attributes
+give the compact form (record.skills is a tuple).
+"""
+
+import sys
+from collections.abc import MutableMapping
+
+# Fields with a slot of their own, in the order the old dict listed them
+FIELDS = (
+    'name', 'email', 'phone', 'location', 'experience', 'skills', 'work_history', 'education',
+    'linkedin', 'github', 'languages', 'certifications', 'match_score', 'match_reasons', 'gap_analysis',
+    'filename', 'file_path', 'model_tier', 'model',
+)
+
+# Display strings derived from the fields above when read
+DERIVED_FIELDS = ('work_history_summary', 'match_reasons_text', 'gap_analysis_text')
+
+# Fields held as tuples and read back as lists
+LIST_FIELDS = ('work_history', 'match_reasons', 'gap_analysis')
+
+# Short strings repeated across many candidates
+INTERNED_FIELDS = ('location', 'education', 'languages', 'certifications', 'model_tier', 'model')
+
+# Keys of a work history entry that are packed into a tuple
+JOB_FIELDS = ('company', 'position', 'dates', 'responsibilities')
+
+SKILLS_SEPARATOR = ', '
+
+_FIELD_SET = frozenset(FIELDS)
+_DERIVED_SET = frozenset(DERIVED_FIELDS)
+_JOB_FIELD_SET = frozenset(JOB_FIELDS)
+
+class _Absent:
+    """Marks a JOB_FIELDS key that a work history entry did not have"""
+    __slots__ = ()
+
+    def __reduce__(self):
+        # Unpickles as the module's single instance, so identity checks keep working
+        return '_ABSENT'
+
+_ABSENT = _Absent()
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+class _Job(tuple):
+    """Work history entry packed as its JOB_FIELDS values; a quarter of the size of the dict"""
+    __slots__ = ()
+
+def _pack_job(job):
+    if not isinstance(job, dict):
+        return job
+    if not _JOB_FIELD_SET.issuperset(job):
+        # Unusual keys: keep the dictionary, sharing its key strings across candidates
+        return {sys.intern(key): value for key, value in job.items()}
+    values = []
+    for key in JOB_FIELDS:
+        value = job.get(key, _ABSENT)
+        if key == 'responsibilities' and isinstance(value, list):
+            value = tuple(value)
+        values.append(value if key == 'responsibilities' else _intern(value))
+    return _Job(values)
+
+def _unpack_job(job):
+    if type(job) is not _Job:
+        return job
+    return {key: list(value) if key == 'responsibilities' and type(value) is tuple else value
+            for key, value in zip(JOB_FIELDS, job) if value is not _ABSENT}
+
+class ResumeRecord(MutableMapping):
+    """
+    Parsed resume with dict-style access and one stored copy of every field
+
+    Keys outside FIELDS (e.g. budget_degraded) and values written to a derived
+    key are kept in a small overflow dict, created only when needed.
+    """
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, data=None, **fields):
+        self.extra = None
+        if data:
+            self.update(data)
+        if fields:
+            self.update(fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a parsed resume dictionary, e.g. one read back from the job store
+
+        Derived display strings are dropped unless they differ from what the
+        record would derive, so a dict -> record -> dict round trip is exact.
+        """
+        record = cls()
+        for key, value in data.items():
+            if key not in _DERIVED_SET:
+                record[key] = value
+        for key in DERIVED_FIELDS:
+            if key in data and data[key] != record[key]:
+                record[key] = data[key]
+        return record
+
+    def to_dict(self):
+        """Plain dict with the same content as the old resume dictionaries"""
+        return dict(self)
+
+    def __getitem__(self, key):
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        if key in _FIELD_SET:
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            if key == 'skills' and type(value) is tuple:
+                return SKILLS_SEPARATOR.join(value)
+            if key == 'work_history' and type(value) is tuple:
+                return [_unpack_job(job) for job in value]
+            if key in LIST_FIELDS and type(value) is tuple:
+                return list(value)
+            return value
+        if key == 'work_history_summary':
+            return self._work_history_summary()
+        if key == 'match_reasons_text':
+            reasons = getattr(self, 'match_reasons', None)
+            return "- " + "\n- ".join(reasons) if isinstance(reasons, tuple) else ""
+        if key == 'gap_analysis_text':
+            gaps = getattr(self, 'gap_analysis', None)
+            if isinstance(gaps, tuple) and gaps:
+                return "Areas for improvement:\n- " + "\n- ".join(gaps)
+            return "No significant gaps identified."
+        raise KeyError(key)
+
+    def _work_history_summary(self):
+        jobs = getattr(self, 'work_history', None)
+        if not isinstance(jobs, tuple):
+            return ""
+        parts = []
+        for job in map(_unpack_job, jobs):
+            if isinstance(job, dict):
+                job_str = job.get('position') or ""
+                if 'company' in job:
+                    if job_str:
+                        job_str += " at "
+                    job_str += job['company'] or ""
+                if 'dates' in job:
+                    job_str += f" ({job['dates']})"
+                parts.append(job_str)
+        return "; ".join(parts)
+
+    def __setitem__(self, key, value):
+        if key not in _FIELD_SET:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+            return
+        if key == 'skills':
+            if isinstance(value, str):
+                value = value.split(SKILLS_SEPARATOR) if value else []
+            if isinstance(value, (list, tuple)):
+                value = tuple(_intern(str(skill)) for skill in value)
+        elif key == 'work_history' and isinstance(value, (list, tuple)):
+            value = tuple(_pack_job(job) for job in value)
+        elif key in LIST_FIELDS and isinstance(value, list):
+            value = tuple(value)
+        elif key in INTERNED_FIELDS:
+            value = _intern(value)
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if self.extra is not None and key in self.extra:
+            del self.extra[key]
+            return
+        if key not in _FIELD_SET:
+            raise KeyError(key)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __iter__(self):
+        for key in FIELDS:
+            if hasattr(self, key):
+                yield key
+        for key in DERIVED_FIELDS:
+            yield key
+        if self.extra is not None:
+            for key in self.extra:
+                if key not in _DERIVED_SET:
+                    yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        if key in _FIELD_SET:
+            return hasattr(self, key)
+        return key in _DERIVED_SET or (self.extra is not None and key in self.extra)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+def compact(data):
+    """
+    Turn a parsed resume dictionary into a ResumeRecord
+
+    Error records and other values are returned unchanged; a parsed resume is
+    recognised by its derived display strings.
+    """
+    if type(data) is dict and 'gap_analysis_text' in data and 'error' not in data:
+        return ResumeRecord.from_dict(data)
+    return data
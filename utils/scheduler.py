@@ -0,0 +1,182 @@
+"""
+Fair task scheduling for the Resume Parser processing queue.
+Tasks wait in one of three priority lanes: interactive work (a query, a handful
+of uploaded resumes), normal batches and background work (re-scoring, tasks
+recovered after a restart). Lanes are served in priority order, except that a
+lane left unserved for longer than its starvation timeout gets the next task
+regardless, so bulk work still moves while interactive work keeps arriving.
+
+Within a lane, tasks are kept in one FIFO per session (or tenant) and sessions
+are served by weighted fair queuing: each session advances a virtual clock by
+1/weight per task served and the session furthest behind goes next, so a
+session that queues a large batch cannot starve the others sharing the same
+workers, and a session with weight 2 gets twice the share of one with weight 1.
+"""
+
+import time
+import threading
+from collections import OrderedDict, deque
+from utils.metrics import QUEUE_DEPTH, QUEUE_WAIT_SECONDS, STARVATION_PROMOTIONS
+
+DEFAULT_SESSION_ID = "default"
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_NORMAL = "normal"
+PRIORITY_BACKGROUND = "background"
+
+# Highest priority first
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BACKGROUND)
+
+# Seconds a lane with pending tasks may go unserved before it is served ahead of higher lanes
+STARVATION_TIMEOUTS = {
+    PRIORITY_NORMAL: 30.0,
+    PRIORITY_BACKGROUND: 120.0,
+}
+
+def priority_rank(priority):
+    """Position of a priority in PRIORITIES; lower is served first"""
+    try:
+        return PRIORITIES.index(priority)
+    except ValueError:
+        raise ValueError(f"Unknown priority '{priority}' (expected one of {', '.join(PRIORITIES)})")
+
+class _Lane:
+    """Pending tasks of one priority, one FIFO per session"""
+    def __init__(self):
+        self.sessions = OrderedDict()  # session_id -> deque of (queued_at, item)
+        self.finish = {}               # session_id -> virtual time after its last served task
+        self.virtual_time = 0.0
+        self.served_at = 0.0
+        self.size = 0
+
+    def waiting_since(self):
+        """Time since when the lane has had tasks but no service, or None if it is empty"""
+        if not self.size:
+            return None
+        oldest = min(items[0][0] for items in self.sessions.values())
+        return max(oldest, self.served_at)
+
+class FairQueue:
+    """
+    Thread-safe priority queue with weighted fair sharing between sessions
+
+    Args:
+        starvation_timeouts: Optional dictionary overriding STARVATION_TIMEOUTS
+    """
+    def __init__(self, starvation_timeouts=None):
+        self.lanes = {priority: _Lane() for priority in PRIORITIES}
+        self.starvation_timeouts = {**STARVATION_TIMEOUTS, **(starvation_timeouts or {})}
+        self.weights = {}              # session_id -> weight, 1 if unset
+        self.condition = threading.Condition()
+        self.unfinished_tasks = 0
+
+    def set_weight(self, session_id, weight):
+        """Give a session (or tenant) a larger or smaller share of the workers"""
+        if weight <= 0:
+            raise ValueError("Session weight must be positive")
+        with self.condition:
+            self.weights[session_id or DEFAULT_SESSION_ID] = weight
+
+    def put(self, item, session_id=None, priority=PRIORITY_NORMAL):
+        """Add an item to the end of its session's queue in the given priority lane"""
+        priority_rank(priority)
+        session_id = session_id or DEFAULT_SESSION_ID
+        with self.condition:
+            lane = self.lanes[priority]
+            if session_id not in lane.sessions:
+                # A session joining the lane starts level with the others rather than ahead of them
+                lane.finish[session_id] = lane.virtual_time
+                lane.sessions[session_id] = deque()
+            lane.sessions[session_id].append((time.time(), item))
+            lane.size += 1
+            self.unfinished_tasks += 1
+            QUEUE_DEPTH.set(lane.size, lane=priority)
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Remove and return the next item, blocking until one is available
+
+        The highest non-empty lane is served, unless a lower lane has gone unserved
+        past its starvation timeout. Within the lane, the session with the
+        lowest virtual time goes next; ties go to the session waiting longest.
+
+        Returns:
+        - The next item, or None if the timeout expired
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self.condition:
+            while not self._size():
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+            priority = self._next_lane()
+            lane = self.lanes[priority]
+            session_id = min(lane.sessions, key=lambda session: lane.finish[session])
+            items = lane.sessions.pop(session_id)
+            queued_at, item = items.popleft()
+            if items:
+                # Back of the line among sessions with equal virtual time
+                lane.sessions[session_id] = items
+            lane.virtual_time = lane.finish[session_id]
+            lane.finish[session_id] += 1.0 / self.weights.get(session_id, 1)
+            if not items:
+                # An idle session keeps no credit: it re-enters at the lane's virtual time
+                del lane.finish[session_id]
+            lane.size -= 1
+            lane.served_at = time.time()
+
+            QUEUE_DEPTH.set(lane.size, lane=priority)
+            QUEUE_WAIT_SECONDS.observe(time.time() - queued_at, lane=priority)
+            return item
+
+    def _next_lane(self):
+        """Lane to serve next (caller holds the lock and has checked the queue is not empty)"""
+        now = time.time()
+        for priority in reversed(PRIORITIES):
+            timeout = self.starvation_timeouts.get(priority)
+            waiting_since = self.lanes[priority].waiting_since()
+            if timeout is not None and waiting_since is not None and now - waiting_since > timeout:
+                if any(self.lanes[higher].size for higher in PRIORITIES[:priority_rank(priority)]):
+                    STARVATION_PROMOTIONS.inc(lane=priority)
+                return priority
+        return next(priority for priority in PRIORITIES if self.lanes[priority].size)
+
+    def _size(self):
+        return sum(lane.size for lane in self.lanes.values())
+
+    def task_done(self):
+        """Mark a previously fetched item as fully processed"""
+        with self.condition:
+            self.unfinished_tasks -= 1
+
+    def empty(self):
+        """Check whether there are no pending items"""
+        with self.condition:
+            return not self._size()
+
+    def qsize(self):
+        """Number of pending items across all lanes and sessions"""
+        with self.condition:
+            return self._size()
+
+    def is_idle(self):
+        """Check whether every item put so far has been processed"""
+        with self.condition:
+            return self.unfinished_tasks == 0
+
+    def depth_by_session(self):
+        """Number of pending items for each session, across lanes"""
+        with self.condition:
+            depths = {}
+            for lane in self.lanes.values():
+                for session_id, items in lane.sessions.items():
+                    depths[session_id] = depths.get(session_id, 0) + len(items)
+            return depths
+
+    def depth_by_lane(self):
+        """Number of pending items in each priority lane"""
+        with self.condition:
+            return {priority: lane.size for priority, lane in self.lanes.items()}
@@ -0,0 +1,206 @@
+"""
+Simulated Gemini backend for offline load testing.
+Stands in for the real API with configurable latency, rate-limit (429),
+server-error (503) and malformed-response behaviour, and returns resume JSON shaped like real responses.
+A concurrency quota answers calls beyond a number in flight with 429s, like a
+per-key limit on concurrent requests.
+"""
+
+import re
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from utils.llm_backend import (BACKEND_SIMULATED, LLMBackend, ResponseStream, RateLimitError, TransientError,
+                               join_prompt)
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+FIRST_NAMES = ["Asha", "Ben", "Chen", "Dana", "Emeka", "Farah", "Goran", "Hana", "Ivan", "Julia"]
+LAST_NAMES = ["Patel", "Smith", "Li", "Garcia", "Okafor", "Khan", "Novak", "Sato", "Petrov", "Rossi"]
+# Share of the latency spent before the first streamed chunk, and chunk size in characters
+TIME_TO_FIRST_CHUNK = 0.2
+STREAM_CHUNK_CHARS = 40
+
+SKILLS = ["Python", "Java", "SQL", "React", "Docker", "Kubernetes", "AWS", "Go", "Spark", "TypeScript"]
+
+class SimulatedRateLimitError(RateLimitError):
+    """Raised by the simulator in place of an HTTP 429 from the API"""
+
+class SimulatedServerError(TransientError):
+    """Raised by the simulator in place of an HTTP 503 from the API"""
+
+class SimulatedGemini(LLMBackend):
+    """
+    LLM backend that stands in for Gemini in load tests
+
+    Args:
+        latency: Latency distribution, one of LATENCY_DISTRIBUTIONS
+        latency_mean: Mean response time in seconds
+        latency_sigma: Spread; sigma of the lognormal, or relative half-width of the uniform
+        rate_limit_rate: Fraction of calls that fail with a 429
+        retry_after: Delay in seconds suggested with each 429, or None for none
+        server_error_rate: Fraction of calls that fail with a 503
+        malformed_rate: Fraction of calls that return truncated, invalid JSON
+        seed: Seed for reproducible runs
+        max_concurrent: Calls allowed in flight at once; further calls get a 429. None for no quota
+    """
+    name = BACKEND_SIMULATED
+
+    def __init__(self, latency="lognormal", latency_mean=1.5, latency_sigma=0.5,
+                 rate_limit_rate=0.05, malformed_rate=0.02, seed=None, retry_after=None,
+                 server_error_rate=0.0, max_concurrent=None):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency must be one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+        self.latency = latency
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.server_error_rate = server_error_rate
+        self.max_concurrent = max_concurrent
+        self.in_flight = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "rate_limited": 0, "server_errors": 0, "malformed": 0, "over_quota": 0,
+                      "max_in_flight": 0}
+
+    def _sample_latency(self):
+        """Draw one response latency in seconds"""
+        with self.lock:
+            if self.latency == "fixed":
+                return self.latency_mean
+            if self.latency == "uniform":
+                spread = self.latency_sigma * self.latency_mean
+                return max(0.0, self.random.uniform(self.latency_mean - spread, self.latency_mean + spread))
+            if self.latency_mean <= 0:
+                return 0.0
+            # Lognormal with the requested mean: mean = exp(mu + sigma^2 / 2)
+            mu = math.log(self.latency_mean) - self.latency_sigma ** 2 / 2
+            return self.random.lognormvariate(mu, self.latency_sigma)
+
+    def _roll(self, probability):
+        with self.lock:
+            return self.random.random() < probability
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def generate(self, prompt, temperature=0.0):
+        self._enter()
+        try:
+            self._fail_or_wait(self._sample_latency())
+            return self._respond(prompt)
+        finally:
+            self._exit()
+
+    def generate_stream(self, prompt, temperature=0.0, schema=None, prefix=None):
+        """Stream the response in small chunks, spreading the latency over them"""
+        prompt = join_prompt(prefix, prompt)
+        def chunks():
+            self._enter()
+            try:
+                latency = self._sample_latency()
+                self._fail_or_wait(latency * TIME_TO_FIRST_CHUNK)
+                text = self._respond(prompt)
+                pieces = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+                for index, piece in enumerate(pieces):
+                    if index:
+                        time.sleep(latency * (1 - TIME_TO_FIRST_CHUNK) / max(len(pieces) - 1, 1))
+                    yield piece, None
+            finally:
+                self._exit()
+        return ResponseStream(chunks(), prompt)
+
+    def _enter(self):
+        """Start a call, refusing it with a 429 if the concurrency quota is used up"""
+        with self.lock:
+            if self.max_concurrent is not None and self.in_flight >= self.max_concurrent:
+                self.stats["calls"] += 1
+                self.stats["rate_limited"] += 1
+                self.stats["over_quota"] += 1
+                refused = True
+            else:
+                self.in_flight += 1
+                self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+                refused = False
+        if refused:
+            raise SimulatedRateLimitError("429 Too many concurrent requests.", status_code=429,
+                                          retry_after=self.retry_after)
+
+    def _exit(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _fail_or_wait(self, latency):
+        """Count a call, raise a simulated error or sleep for the latency"""
+        self._count("calls")
+
+        if self._roll(self.rate_limit_rate):
+            # Quota errors come back quickly
+            time.sleep(self._sample_latency() * 0.1)
+            self._count("rate_limited")
+            raise SimulatedRateLimitError("429 Resource has been exhausted (e.g. check quota).",
+                                          status_code=429, retry_after=self.retry_after)
+
+        if self._roll(self.server_error_rate):
+            time.sleep(self._sample_latency() * 0.1)
+            self._count("server_errors")
+            raise SimulatedServerError("503 The service is currently unavailable.", status_code=503)
+
+        time.sleep(latency)
+
+    def _respond(self, prompt):
+        """Answer a prompt, occasionally with malformed text"""
+        response = self.build_response(prompt)
+        if self._roll(self.malformed_rate):
+            self._count("malformed")
+            # Like a response cut off by the output limit: chatter, then part of the JSON
+            with self.lock:
+                cut = self.random.randint(len(response) // 4, len(response) * 3 // 4)
+            return "Here is the extracted information:\n" + response[:cut]
+
+        return response
+
+    def build_response(self, prompt):
+        """Build a plausible JSON answer for a resume or query prompt"""
+        # Seeded from the prompt so the same resume always gets the same answer
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+
+        if '"match_score"' not in prompt and "RESUME TEXT" not in prompt:
+            # NLP query parsing or custom column prompts
+            if "JSON" in prompt:
+                return json.dumps({"skills": [rng.choice(SKILLS)], "experience_years": rng.randint(0, 5),
+                                   "education": None, "job_titles": [], "location": None, "keywords": []})
+            return rng.choice(["3 years", "Not found in resume", "Yes"])
+
+        hint = re.search(r"name might be '([^']+)'", prompt)
+        name = hint.group(1).title() if hint else f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        # Use the address in the resume when there is one, as a model would
+        resume_text = prompt.split("RESUME TEXT", 1)[-1]
+        address = re.search(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+", resume_text)
+        response = {
+            "name": name,
+            "email": address.group() if address else name.lower().replace(" ", ".") + "@example.com",
+            "phone": f"+1 555 {rng.randint(100, 999)} {rng.randint(1000, 9999)}",
+            "location": rng.choice(["Pune, India", "Berlin, Germany", "Austin, USA"]),
+            "experience": rng.randint(0, 15),
+            "work_history": [{"company": "Acme Corp", "position": "Engineer", "dates": "2019 - 2023",
+                              "responsibilities": ["Built services"]}],
+            "education": [{"degree": "B.Tech", "institution": "State University", "year": "2018",
+                           "field": "Computer Science"}],
+            "skills": rng.sample(SKILLS, 4),
+            "linkedin": "",
+            "github": "",
+            "languages": [{"name": "English", "proficiency": "Fluent"}],
+            "certifications": [],
+        }
+        if '"match_score"' in prompt:
+            response["match_score"] = rng.randint(0, 100)
+            response["match_reasons"] = ["Relevant experience"]
+            response["gap_analysis"] = ["No cloud certification"]
+        return "```json\n" + json.dumps(response) + "\n```"
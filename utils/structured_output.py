@@ -0,0 +1,170 @@
+"""
+Schema-constrained JSON output for Resume Parser application.
+Defines the JSON schemas of the resume and match responses (passed to backends
+that support a JSON response mode), repairs almost-JSON responses and validates
+them field by field, so that a response with a few missing or invalid fields can
+be completed with a small follow-up request instead of being thrown away.
+
+Schemas use the JSON Schema subset Gemini accepts: object, array, string,
+integer and number types, properties, items, required and nullable.
+"""
+
+import re
+import json
+from utils.json_stream import IncrementalJSONParser
+
+STRING = {"type": "string"}
+STRING_LIST = {"type": "array", "items": STRING}
+
+RESUME_PROPERTIES = {
+    "name": STRING,
+    "email": STRING,
+    "phone": STRING,
+    "location": STRING,
+    "experience": {"type": "integer"},
+    "work_history": {"type": "array", "items": {"type": "object", "properties": {
+        "company": STRING, "position": STRING, "dates": STRING, "responsibilities": STRING_LIST}}},
+    "education": {"type": "array", "items": {"type": "object", "properties": {
+        "degree": STRING, "institution": STRING, "year": STRING, "field": STRING}}},
+    "skills": STRING_LIST,
+    "linkedin": STRING,
+    "github": STRING,
+    "languages": {"type": "array", "items": {"type": "object", "properties": {
+        "name": STRING, "proficiency": STRING}}},
+    "certifications": STRING_LIST,
+}
+
+MATCH_PROPERTIES = {
+    "match_score": {"type": "integer", "minimum": 0, "maximum": 100},
+    "match_reasons": STRING_LIST,
+    "gap_analysis": STRING_LIST,
+}
+
+def object_schema(properties):
+    """Schema of an object that must have every one of the given properties"""
+    return {"type": "object", "properties": dict(properties), "required": list(properties)}
+
+RESUME_SCHEMA = object_schema(RESUME_PROPERTIES)
+MATCH_SCHEMA = object_schema({**RESUME_PROPERTIES, **MATCH_PROPERTIES})
+
+def subschema(schema, fields):
+    """Schema restricted to some of its fields, e.g. for a follow-up request"""
+    return object_schema({field: schema["properties"][field] for field in fields if field in schema["properties"]})
+
+# Python-style literals and trailing commas that models sometimes emit
+_TRAILING_COMMA = re.compile(r",(\s*[}\]])")
+_PYTHON_LITERALS = ((re.compile(r"(?<![\w\"])None(?![\w\"])"), "null"),
+                    (re.compile(r"(?<![\w\"])True(?![\w\"])"), "true"),
+                    (re.compile(r"(?<![\w\"])False(?![\w\"])"), "false"))
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+def parse_json_object(text):
+    """
+    Parse the JSON object in a model response, repairing it where possible
+
+    Tries, in order: the text between the outer braces as is; the same with
+    trailing commas, smart quotes and Python literals fixed; and finally every
+    complete top-level field of a truncated object.
+
+    Returns:
+    - Tuple of (dictionary, how it was parsed: "json", "repaired" or "partial");
+      the dictionary is empty if nothing could be recovered
+    """
+    start = text.find("{")
+    if start < 0:
+        return {}, "partial"
+    end = text.rfind("}") + 1
+
+    if end > start:
+        candidate = text[start:end]
+        try:
+            data = json.loads(candidate)
+            if isinstance(data, dict):
+                return data, "json"
+        except ValueError:
+            pass
+
+        repaired = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+        for pattern, replacement in _PYTHON_LITERALS:
+            repaired = pattern.sub(replacement, repaired)
+        try:
+            data = json.loads(repaired)
+            if isinstance(data, dict):
+                return data, "repaired"
+        except ValueError:
+            pass
+
+    # Truncated or otherwise broken: keep the fields that did arrive whole
+    parser = IncrementalJSONParser()
+    parser.feed(text[start:])
+    return dict(parser.fields), "partial"
+
+def _check(value, schema):
+    """
+    Check one value against its schema, coercing where the intent is clear
+
+    Returns:
+    - Tuple of (value, whether it is valid)
+    """
+    expected = schema.get("type")
+    if value is None:
+        return value, bool(schema.get("nullable"))
+
+    if expected == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value), True
+        return value, isinstance(value, str)
+
+    if expected in ("integer", "number"):
+        if isinstance(value, str):
+            match = re.search(r"-?\d+(?:\.\d+)?", value)
+            if not match:
+                return value, False
+            value = float(match.group())
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return value, False
+        if expected == "integer":
+            value = int(round(value))
+        if value < schema.get("minimum", value) or value > schema.get("maximum", value):
+            return value, False
+        return value, True
+
+    if expected == "array":
+        if isinstance(value, (str, dict)):
+            # A single item where a list was expected
+            value = [value]
+        if not isinstance(value, list):
+            return value, False
+        items = schema.get("items")
+        if items is None:
+            return value, True
+        checked = [_check(item, items) for item in value]
+        # Drop invalid items rather than the whole list
+        return [item for item, valid in checked if valid], True
+
+    if expected == "object":
+        return value, isinstance(value, dict)
+
+    return value, True
+
+def validate(data, schema):
+    """
+    Validate a parsed response against an object schema
+
+    Returns:
+    - Tuple of (valid fields, names of required fields that are missing or invalid)
+    """
+    valid = {}
+    problems = []
+    properties = schema.get("properties", {})
+    for field, value in data.items():
+        if field not in properties:
+            valid[field] = value
+            continue
+        value, ok = _check(value, properties[field])
+        if ok:
+            valid[field] = value
+    for field in schema.get("required", ()):
+        if field not in valid:
+            problems.append(field)
+    return valid, problems
@@ -0,0 +1,245 @@
+"""
+Token accounting and budgets for the Resume Parser application.
+Every LLM call's token usage is written to a SQLite ledger together with the task,
+batch, session and kind of call it was made for, so usage can be totalled per
+task, batch, session, day or month. Budgets cap those totals: a call that would go
+over is refused (the batch pauses) or, for resume parsing, retried with a
+shorter prompt first (the batch degrades).
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+KIND_RESUME = "resume"
+KIND_NLP_QUERY = "nlp_query"
+KIND_CUSTOM_COLUMN = "custom_column"
+# Second request for the fields a resume response lacked
+KIND_FOLLOW_UP = "follow_up"
+
+SCOPE_TASK = "task"
+SCOPE_BATCH = "batch"
+SCOPE_SESSION = "session"
+SCOPE_DAY = "day"
+SCOPE_MONTH = "month"
+BUDGET_SCOPES = (SCOPE_BATCH, SCOPE_SESSION, SCOPE_DAY, SCOPE_MONTH)
+
+ACTION_PAUSE = "pause"
+ACTION_DEGRADE = "degrade"
+
+# Budgets are configured in tokens, e.g. RESUME_PARSER_TOKEN_BUDGET_MONTH=5000000
+BUDGET_ENV_PREFIX = "RESUME_PARSER_TOKEN_BUDGET_"
+BUDGET_ACTION_ENV_VAR = "RESUME_PARSER_TOKEN_BUDGET_ACTION"
+
+# Output tokens assumed for a call when checking a budget before making it
+EXPECTED_OUTPUT_TOKENS = 1000
+
+_context = threading.local()
+
+@contextmanager
+def accounting(**fields):
+    """
+    Attribute LLM calls made by this thread inside the block
+
+    Fields (task_id, batch_id, session_id, kind) override those of an enclosing block.
+    """
+    previous = getattr(_context, "fields", {})
+    _context.fields = {**previous, **{key: value for key, value in fields.items() if value is not None}}
+    try:
+        yield
+    finally:
+        _context.fields = previous
+
+def current_accounting():
+    """Fields set by the innermost accounting() block of this thread"""
+    return dict(getattr(_context, "fields", {}))
+
+class BudgetExceededError(Exception):
+    """A call was refused because it would take a budget over its limit"""
+    def __init__(self, scope, key, used, needed, limit):
+        super().__init__(f"Token budget for {scope} {key} exhausted: {used} used + {needed} needed > {limit}")
+        self.scope = scope
+        self.key = key
+        self.used = used
+        self.needed = needed
+        self.limit = limit
+
+class TokenBudget:
+    """
+    Token limits per batch, session, day and month
+
+    Args:
+        limits: Dictionary mapping a scope in BUDGET_SCOPES to its token limit
+        action: ACTION_PAUSE to refuse calls over budget, ACTION_DEGRADE to shorten
+            resume prompts first and only refuse if that is not enough
+    """
+    def __init__(self, limits=None, action=ACTION_PAUSE):
+        limits = limits or {}
+        unknown = set(limits) - set(BUDGET_SCOPES)
+        if unknown:
+            raise ValueError(f"Unknown budget scopes: {', '.join(sorted(unknown))}")
+        if action not in (ACTION_PAUSE, ACTION_DEGRADE):
+            raise ValueError(f"Budget action must be '{ACTION_PAUSE}' or '{ACTION_DEGRADE}'")
+        self.limits = {scope: int(limit) for scope, limit in limits.items() if limit}
+        self.action = action
+
+    @classmethod
+    def from_env(cls):
+        """Read limits from RESUME_PARSER_TOKEN_BUDGET_<SCOPE> environment variables"""
+        limits = {}
+        for scope in BUDGET_SCOPES:
+            value = os.environ.get(BUDGET_ENV_PREFIX + scope.upper())
+            if value:
+                limits[scope] = int(value)
+        action = os.environ.get(BUDGET_ACTION_ENV_VAR, ACTION_PAUSE).strip().lower()
+        return cls(limits, action)
+
+    def __bool__(self):
+        return bool(self.limits)
+
+def _day(timestamp):
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+class TokenLedger:
+    """
+    Durable record of token usage backed by SQLite
+
+    Shares the job store's database file when given its path.
+    """
+    def __init__(self, path=":memory:"):
+        self.path = str(path)
+        self.lock = threading.Lock()
+
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self._create_schema()
+
+    def _create_schema(self):
+        """Create the usage table if it does not exist yet"""
+        with self.lock:
+            if self.path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS token_usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_id TEXT,
+                    batch_id TEXT,
+                    session_id TEXT,
+                    kind TEXT NOT NULL,
+                    backend TEXT,
+                    prompt_tokens INTEGER NOT NULL,
+                    output_tokens INTEGER NOT NULL,
+                    cached_tokens INTEGER NOT NULL DEFAULT 0,
+                    estimated INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    at REAL NOT NULL
+                )
+            """)
+            # Ledgers created before context caching lack the cached_tokens column
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(token_usage)")}
+            if "cached_tokens" not in columns:
+                self.conn.execute("ALTER TABLE token_usage ADD COLUMN cached_tokens INTEGER NOT NULL DEFAULT 0")
+            for column in ("task_id", "batch_id", "session_id", "day"):
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_token_usage_{column} ON token_usage ({column})")
+
+    def record(self, usage, backend=None, **fields):
+        """
+        Record the usage of one call
+
+        Parameters:
+        - usage: Usage dictionary from LLMBackend.generate_with_usage()
+        - backend: Name of the backend that served the call
+        - fields: task_id, batch_id, session_id and kind; defaults come from accounting()
+        """
+        context = {**current_accounting(), **{key: value for key, value in fields.items() if value is not None}}
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO token_usage (task_id, batch_id, session_id, kind, backend, prompt_tokens, "
+                "output_tokens, cached_tokens, estimated, day, at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (context.get("task_id"), context.get("batch_id"), context.get("session_id"),
+                 context.get("kind", KIND_RESUME), backend, usage["prompt_tokens"], usage["output_tokens"],
+                 usage.get("cached_tokens", 0), int(usage["estimated"]), _day(now), now)
+            )
+
+    def total(self, scope, key):
+        """Total tokens (prompt + output) used by one task, batch, session, day (YYYY-MM-DD) or month (YYYY-MM)"""
+        if scope == SCOPE_MONTH:
+            where, value = "day LIKE ?", f"{key}-%"
+        elif scope in (SCOPE_TASK, SCOPE_BATCH, SCOPE_SESSION, SCOPE_DAY):
+            where, value = f"{'day' if scope == SCOPE_DAY else scope + '_id'} = ?", key
+        else:
+            raise ValueError(f"Unknown scope '{scope}'")
+
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT COALESCE(SUM(prompt_tokens + output_tokens), 0) AS tokens FROM token_usage WHERE {where}",
+                (value,)
+            ).fetchone()
+        return row["tokens"]
+
+    def summarize(self, scope, limit=20):
+        """
+        Usage grouped by task, batch, session or day, most recent first
+
+        Returns:
+        - List of dictionaries with the key, call count, prompt/output/cached tokens and whether any were estimated
+        """
+        column = {SCOPE_TASK: "task_id", SCOPE_BATCH: "batch_id", SCOPE_SESSION: "session_id",
+                  SCOPE_DAY: "day"}.get(scope)
+        if column is None:
+            raise ValueError(f"Unknown scope '{scope}'")
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {column} AS key, COUNT(*) AS calls, SUM(prompt_tokens) AS prompt_tokens, "
+                f"SUM(output_tokens) AS output_tokens, SUM(cached_tokens) AS cached_tokens, "
+                f"MAX(estimated) AS estimated, MAX(at) AS last_at "
+                f"FROM token_usage WHERE {column} IS NOT NULL GROUP BY {column} ORDER BY last_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def check(self, budget, needed, **fields):
+        """
+        Check that a call needing this many tokens fits every applicable budget
+
+        Raises:
+        - BudgetExceededError for the first budget the call would exceed
+        """
+        if not budget:
+            return
+        context = {**current_accounting(), **{key: value for key, value in fields.items() if value is not None}}
+        now = time.time()
+        keys = {
+            SCOPE_BATCH: context.get("batch_id"),
+            SCOPE_SESSION: context.get("session_id"),
+            SCOPE_DAY: _day(now),
+            SCOPE_MONTH: _day(now)[:7],
+        }
+        for scope, limit in budget.limits.items():
+            key = keys.get(scope)
+            if key is None:
+                continue
+            used = self.total(scope, key)
+            if used + needed > limit:
+                raise BudgetExceededError(scope, key, used, needed, limit)
+
+    def fits(self, budget, needed, **fields):
+        """Whether a call needing this many tokens fits every applicable budget"""
+        try:
+            self.check(budget, needed, **fields)
+            return True
+        except BudgetExceededError:
+            return False
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self.lock:
+            self.conn.close()